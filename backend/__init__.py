@@ -1 +1,4 @@
-"""Backend package for Intelligent Shopping Assistant.""" 
\ No newline at end of file
+"""Backend package for Intelligent Shopping Assistant."""
+
+# Read .env before any module reads its os.getenv() constants.
+from . import config  # noqa: F401
@@ -0,0 +1,76 @@
+"""Process-wide configuration, loaded once.
+
+``.env`` at the project root is read a single time, when the `backend`
+package is first imported, so every module sees the same environment
+whatever the import order; variables already set in the real environment
+win. Credentials and upstream endpoints are collected in the frozen
+`settings` object. Per-module tunables stay ``os.getenv`` constants next to
+the code that uses them.
+
+`settings.workers` is the number of worker processes serving the app on this
+host (WEB_CONCURRENCY, as read by uvicorn; ``auto`` = one per CPU), which
+per-process limits such as upstream quotas divide by.
+
+Nothing here fails on a missing credential: each service checks its own
+settings when first used and degrades (fallback data, fallback intent).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import os
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ENV_FILE = PROJECT_ROOT / ".env"
+
+_env_loaded = False
+
+
+def load_env(path: Path = ENV_FILE) -> None:
+    """Load *path* into ``os.environ`` (once per process, no overrides)."""
+    global _env_loaded  # noqa: PLW0603
+    if _env_loaded:
+        return
+    _env_loaded = True
+    if path.is_file():
+        from dotenv import load_dotenv
+
+        load_dotenv(dotenv_path=path, override=False)
+
+
+def _workers(value: Optional[str]) -> int:
+    if value == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(value or 1))
+
+
+@dataclass(frozen=True)
+class Settings:
+    openrouter_api_key: Optional[str]
+    openai_api_base: str
+    llm_model: str
+    daji_api_key: Optional[str]
+    daji_api_secret: Optional[str]
+    daji_api_base_url: str
+    rapidapi_key: Optional[str]
+    weidian_api_base_url: str
+    workers: int = 1
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            openrouter_api_key=os.getenv("OPENROUTER_API_KEY") or None,
+            openai_api_base=os.getenv("OPENAI_API_BASE", "https://openrouter.ai/api/v1"),
+            llm_model=os.getenv("LLM_MODEL", "anthropic/claude-3-haiku"),
+            daji_api_key=os.getenv("DAJI_API_KEY") or None,
+            daji_api_secret=os.getenv("DAJI_API_SECRET") or None,
+            daji_api_base_url=os.getenv("DAJI_API_BASE_URL", "https://openapi.dajisaas.com/"),
+            rapidapi_key=os.getenv("RAPIDAPI_KEY") or None,
+            weidian_api_base_url=os.getenv("WEIDIAN_API_BASE_URL", "https://weidian-api2.p.rapidapi.com/"),
+            workers=_workers(os.getenv("WEB_CONCURRENCY")),
+        )
+
+
+load_env()
+settings = Settings.from_env()
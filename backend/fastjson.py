@@ -0,0 +1,54 @@
+"""JSON encoding/decoding with an optional fast backend.
+
+Uses `orjson` when it is installed (JSON_BACKEND=json forces the stdlib).
+Both backends emit compact UTF-8 with non-ASCII text (product titles) kept
+as-is rather than \\u-escaped, and both raise `json.JSONDecodeError` (orjson's
+error subclasses it) on malformed input.
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+import os
+from typing import Any, Union
+
+from starlette.responses import JSONResponse
+
+JSONDecodeError = json.JSONDecodeError
+
+BACKEND = (
+    "orjson"
+    if os.getenv("JSON_BACKEND", "orjson") != "json" and importlib.util.find_spec("orjson") is not None
+    else "json"
+)
+
+if BACKEND == "orjson":
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize *obj* to compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Parse JSON from bytes or str."""
+        return orjson.loads(data)
+
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize *obj* to compact UTF-8 JSON bytes."""
+        return _encoder.encode(obj).encode("utf-8")
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Parse JSON from bytes or str."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """`JSONResponse` rendered with the module's backend."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
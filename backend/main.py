@@ -1,47 +1,79 @@
 """Main entrypoint for Intelligent Shopping Assistant backend service."""
+import asyncio
+import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-import yaml
-from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRoute
-from dotenv import load_dotenv
 import os
 
+from backend.fastjson import FastJSONResponse, dumps
+from backend.middleware import AdmissionMiddleware, MetricsMiddleware, StandardJSONResponseMiddleware
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 OPENAPI_FILE = BASE_DIR / "openapi.yml"
 
-app = FastAPI(title="Intelligent Shopping Assistant API")
+from backend.services import http_clients, product_store, refresher
+from backend.services.admission import RateLimitedError
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open pooled upstream connections, warm the product cache from the
+    persistent store and start the background refresher on startup, and train
+    the fast-path intent model off the event loop; stop them (and the image
+    decode pool, if image search was used) on shutdown."""
+    await http_clients.startup()
+    await product_store.startup()
+    await refresher.startup()
+    warmup = asyncio.create_task(asyncio.to_thread(_train_intent_model))
+    try:
+        yield
+    finally:
+        await warmup
+        await refresher.shutdown()
+        await http_clients.shutdown()
+        await product_store.shutdown()
+        image_search = sys.modules.get("backend.services.image_search")
+        if image_search is not None:
+            image_search.shutdown()
+
 
-# Load environment variables from .env if present
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
-load_dotenv(dotenv_path=PROJECT_ROOT / ".env", override=False)
+def _train_intent_model() -> None:
+    # numpy-backed: imported here rather than at module load
+    from backend.services import intent_classifier
 
-API_KEY = os.getenv("DAJI_API_KEY", "not-set")  # Example usage
+    intent_classifier.get_model()
+
+
+app = FastAPI(
+    title="Intelligent Shopping Assistant API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+
+PARSE_BATCH_MAX_ITEMS = int(os.getenv("PARSE_BATCH_MAX_ITEMS", "500"))
+PARSE_BATCH_LLM_CONCURRENCY = int(os.getenv("PARSE_BATCH_LLM_CONCURRENCY", "8"))
 
 # ---------------------------------------------------------------------------
-# Standardized JSON response middleware
+# Admission control (rate limits, load shedding), the standardized JSON
+# response middleware and request metrics. The envelope wraps 429 / 503
+# rejections; metrics are outermost so they time everything.
 # ---------------------------------------------------------------------------
 
-@app.middleware("http")
-async def standard_json_response(request: Request, call_next):
-    response = await call_next(request)
-
-    # If running in test mode, return original response to avoid body consumption issues
-    if getattr(app.state, "testing", False) or isinstance(response, JSONResponse):
-        return response
-
-    # Otherwise wrap in standard structure
-    body = None
-    if response.body_iterator:
-        body = b"".join([chunk async for chunk in response.body_iterator])
-    return JSONResponse(
-        status_code=response.status_code,
-        content={
-            "status": "success" if response.status_code < 400 else "error",
-            "data": body.decode() if body else None,
-        },
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(StandardJSONResponseMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(RateLimitedError)
+async def rate_limited_handler(request: Request, exc: RateLimitedError):
+    """Upstream quota spent (e.g. OpenRouter): tell the client when to retry."""
+    return FastJSONResponse(
+        {"detail": str(exc)}, status_code=429, headers={"Retry-After": exc.retry_after_header}
     )
 
 # ---------------------------------------------------------------------------
@@ -49,8 +81,15 @@ async def standard_json_response(request: Request, call_next):
 # ---------------------------------------------------------------------------
 from fastapi import APIRouter
 from backend.services.preprocessor import preprocess_input
-from backend.services.llm_service import get_shopping_intent
-from backend.services import daji_service, weidian_service
+from backend.services.llm_service import normalize_text
+from backend.services.product_lookup import fetch_products, fetch_products_many, iter_products
+from backend.services.product_model import Product, ProductLike, parse_fields, serialize
+from backend.services.preprocessor import product_link
+from backend.services.resilience import mark_fallback
+from backend.services import qc_gallery
+from backend import metrics
+from backend.services import admission, llm_service, resilience
+from backend.services.cache import product_cache
 
 health_router = APIRouter()
 
@@ -58,63 +97,354 @@ health_router = APIRouter()
 async def health_check() -> Dict[str, str]:
     return {"message": "ok"}
 
+
+# Point-in-time state read when /metrics is scraped
+_CACHES = {
+    "product": product_cache,
+    "intent": llm_service.intent_cache,
+    "qc_gallery": qc_gallery.gallery_cache,
+}
+metrics.Gauge(
+    "shopping_cache_entries",
+    "Entries in in-process caches.",
+    ("cache",),
+    collect=lambda: {(name,): len(c) for name, c in _CACHES.items()},
+)
+metrics.Gauge(
+    "shopping_cache_lookups",
+    "Cache lookups since start by result.",
+    ("cache", "result"),
+    collect=lambda: {
+        (name, result): value
+        for name, c in _CACHES.items()
+        for result, value in (("hit", c.hits), ("miss", c.misses))
+    },
+)
+metrics.Gauge(
+    "shopping_upstream_circuit_open",
+    "1 while an upstream's circuit breaker is open.",
+    ("upstream",),
+    collect=lambda: {
+        (name,): float(snap["state"] == "open") for name, snap in resilience.guard_snapshots().items()
+    },
+)
+metrics.Gauge(
+    "shopping_admission_inflight",
+    "Requests currently holding an admission slot.",
+    collect=lambda: {(): admission.load_shedder.inflight},
+)
+
+
+@health_router.get("/metrics", summary="Prometheus metrics")
+async def prometheus_metrics() -> Response:
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 app.include_router(health_router)
 
 intent_router = APIRouter(prefix="/api/v1/intent")
 
+
+async def detect_shopping_intent(text: str) -> Dict[str, Any]:
+    """`intent_classifier.detect_shopping_intent`, imported on first text input (numpy)."""
+    from backend.services import intent_classifier
+
+    return await intent_classifier.detect_shopping_intent(text)
+
+
+async def _text_intent_result(content: str) -> Dict[str, Any]:
+    """Build the ParsedIntentResponse for input without supported URLs."""
+    return _text_result(await detect_shopping_intent(content))
+
+
+def _text_result(llm_intent: Any) -> Dict[str, Any]:
+    shopping = False
+    if isinstance(llm_intent, dict):
+        shopping = bool(llm_intent.get("shopping_intent", False))
+
+    message = (
+        "请点击联系我们进行人工购物帮助！" if shopping else "我们仅支持专业的代购需求，谢谢您的使用！"
+    )
+
+    result = {
+        "hasUrls": False,
+        "urls": [],
+        "products": [],
+        "llmAnalysis": message,
+        "shopping_intent": shopping,
+    }
+    if isinstance(llm_intent, dict) and llm_intent.get("fallback"):
+        # The LLM could not be consulted; the answer is a default, not a verdict.
+        result["fallback"] = True
+        if "error" in llm_intent:
+            result["error"] = llm_intent["error"]
+    return result
+
+
+def _fields(spec: Optional[str]) -> Tuple[str, ...]:
+    """Validate the optional ``fields=`` projection (extra Product fields)."""
+    try:
+        return parse_fields(spec)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+
+def _needs_llm(preprocessed_data: Dict[str, Any]) -> bool:
+    return preprocessed_data["type"] == "text" or not preprocessed_data["skip_llm"]
+
+
 @intent_router.post("/parse", summary="Parse user input and detect shopping intent")
-async def parse_intent(payload: Dict[str, str]):
+async def parse_intent(payload: Dict[str, str], fields: Optional[str] = None):
     """Endpoint implementing contract-driven intent parsing.
 
-    Expected JSON body: { "userInput": "..." }
+    Expected JSON body: { "userInput": "..." }. ``?fields=image,shopName``
+    adds optional fields to each product.
     """
+    projection = _fields(fields)
     text: str = payload.get("userInput", "") if isinstance(payload, dict) else ""
 
     preprocessed_data = preprocess_input(text)
 
     # Decide whether to call LLM
-    if preprocessed_data["type"] == "text" or not preprocessed_data["skip_llm"]:
-        llm_intent = await get_shopping_intent(preprocessed_data["content"])
+    if _needs_llm(preprocessed_data):
+        return FastJSONResponse(await _text_intent_result(preprocessed_data["content"]))
 
-        shopping = False
-        if isinstance(llm_intent, dict):
-            shopping = bool(llm_intent.get("shopping_intent", False))
+    # URLs were found – look them up concurrently, keeping input order
+    products = await fetch_products(preprocessed_data["links"])
 
-        message = (
-            "请点击联系我们进行人工购物帮助！" if shopping else "我们仅支持专业的代购需求，谢谢您的使用！"
-        )
+    # Built from plain JSON types, so rendered directly (no jsonable_encoder pass)
+    return FastJSONResponse(_url_result(preprocessed_data, products, projection))
 
-        return {
-            "hasUrls": False,
-            "urls": [],
-            "products": [],
-            "llmAnalysis": message,
-            "shopping_intent": shopping,
-        }
-
-    # URLs were found
-    products = []
-    for platform, urls in preprocessed_data["platform_map"].items():
-        for u in urls:
-            if platform == "taobao":
-                prod = await daji_service.fetch_product_detail(u)
-            elif platform == "weidian":
-                prod = await weidian_service.fetch_product_detail(u)
-            else:
-                prod = None
-            if prod:
-                products.append(prod)
 
+def _url_result(
+    preprocessed_data: Dict[str, Any], products: List[ProductLike], fields: Tuple[str, ...]
+) -> Dict[str, Any]:
     return {
         "hasUrls": True,
         "urls": preprocessed_data["urls"],
         "platform_map": preprocessed_data["platform_map"],
-        "products": products,
+        "products": [serialize(p, fields) for p in products],
         "llmAnalysis": None,
     }
 
+
+@intent_router.post("/parse:batch", summary="Parse many user inputs in one call")
+async def parse_intent_batch(payload: Dict[str, Any], fields: Optional[str] = None):
+    """Batch variant of /parse.
+
+    Expected JSON body: { "items": [{ "userInput": "..." }, ...] }. Returns
+    { "results": [...] } in item order. Product lookups are de-duplicated
+    across the whole batch and identical texts are classified once, at most
+    PARSE_BATCH_LLM_CONCURRENCY at a time. A text that can't be classified
+    because the LLM quota is spent or its circuit is open gets a fallback
+    result with an ``error`` (status, detail, retryAfter) instead of failing
+    the whole batch.
+    """
+    projection = _fields(fields)
+    items = payload.get("items") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        raise HTTPException(status_code=422, detail="'items' must be a list")
+    if len(items) > PARSE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {PARSE_BATCH_MAX_ITEMS} items per batch"
+        )
+
+    preprocessed = [
+        preprocess_input(item.get("userInput", "") if isinstance(item, dict) else "")
+        for item in items
+    ]
+    url_items = [p for p in preprocessed if not _needs_llm(p)]
+    text_keys: Dict[str, str] = {}
+    for p in preprocessed:
+        if _needs_llm(p):
+            text_keys.setdefault(normalize_text(p["content"]), p["content"])
+
+    llm_slots = asyncio.Semaphore(max(1, PARSE_BATCH_LLM_CONCURRENCY))
+
+    async def classify(content: str) -> Dict[str, Any]:
+        async with llm_slots:
+            try:
+                intent = await detect_shopping_intent(content)
+            except RateLimitedError as exc:
+                error = {"status": 429, "detail": str(exc), "retryAfter": int(exc.retry_after_header)}
+                return {"shopping_intent": False, "fallback": True, "error": error}
+        if isinstance(intent, dict) and intent.get("fallback_reason") == "circuit_open":
+            # llm_service answers an open circuit with a default rather than raising
+            intent = {**intent, "error": {"status": 503, "detail": intent.get("reason", "")}}
+        return intent
+
+    product_lists, intents = await asyncio.gather(
+        fetch_products_many([p["links"] for p in url_items]),
+        asyncio.gather(*(classify(content) for content in text_keys.values())),
+    )
+    intent_by_key = dict(zip(text_keys, intents))
+    products_iter = iter(product_lists)
+
+    results = []
+    for p in preprocessed:
+        if _needs_llm(p):
+            key = normalize_text(p["content"])
+            results.append(_text_result(intent_by_key[key]))
+        else:
+            results.append(_url_result(p, next(products_iter), projection))
+    return FastJSONResponse({"results": results})
+
+
+def _encode_event(event: str, data: Dict[str, Any], sse: bool) -> bytes:
+    body = dumps({"event": event, **data})
+    if sse:
+        return b"event: " + event.encode() + b"\ndata: " + body + b"\n\n"
+    return body + b"\n"
+
+
+@intent_router.post("/parse:stream", summary="Parse user input, streaming products as they resolve")
+async def parse_intent_stream(
+    payload: Dict[str, str], request: Request, fields: Optional[str] = None
+):
+    """Streaming variant of /parse.
+
+    Emits a ``preprocess`` event right away, then one ``product`` event per
+    lookup as it completes (``index`` gives its position in input order) or a
+    single ``intent`` event for text input, and finally a ``summary`` event.
+    If the LLM quota is spent, a final ``error`` event (status 429) replaces
+    ``intent``. NDJSON by default; Server-Sent Events when the client accepts
+    ``text/event-stream``.
+    """
+    projection = _fields(fields)
+    text: str = payload.get("userInput", "") if isinstance(payload, dict) else ""
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    async def events():
+        preprocessed_data = preprocess_input(text)
+        yield _encode_event(
+            "preprocess",
+            {
+                "hasUrls": not _needs_llm(preprocessed_data),
+                "urls": preprocessed_data["urls"],
+                "platform_map": preprocessed_data["platform_map"],
+            },
+            sse,
+        )
+
+        if _needs_llm(preprocessed_data):
+            try:
+                result = await _text_intent_result(preprocessed_data["content"])
+            except RateLimitedError as exc:
+                # Headers are already sent; report the 429 in-band.
+                yield _encode_event(
+                    "error",
+                    {"status": 429, "detail": str(exc), "retryAfter": int(exc.retry_after_header)},
+                    sse,
+                )
+                return
+            yield _encode_event(
+                "intent",
+                {"llmAnalysis": result["llmAnalysis"], "shopping_intent": result["shopping_intent"]},
+                sse,
+            )
+            yield _encode_event("summary", {"hasUrls": False, "productCount": 0}, sse)
+            return
+
+        count = 0
+        async for index, product in iter_products(preprocessed_data["links"]):
+            count += 1
+            yield _encode_event(
+                "product", {"index": index, "product": serialize(product, projection)}, sse
+            )
+        yield _encode_event("summary", {"hasUrls": True, "productCount": count}, sse)
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
 app.include_router(intent_router)
 
+product_router = APIRouter(prefix="/api/v1/products")
+
+
+@product_router.get("/qc", summary="Get QC (Quality Control) image gallery for a product")
+async def get_qc_gallery(platform: str, product_id: str, fields: Optional[str] = None):
+    """Return ``{"product": ..., "images": [...]}`` for a product with QC photos.
+
+    Galleries come from the QC index (memory, then disk, then the remote QC
+    source); the product detail is looked up like a pasted link.
+    """
+    projection = _fields(fields)
+    link = product_link(platform, product_id)
+    if link is None:
+        raise HTTPException(status_code=404, detail="Gallery not found")
+
+    try:
+        images = await qc_gallery.get_gallery(link.platform, link.product_id)
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=503, detail="QC source unavailable") from exc
+    if not images:
+        raise HTTPException(status_code=404, detail="Gallery not found")
+
+    products = await fetch_products([link])
+    product = products[0] if products else mark_fallback(
+        Product(link.platform, link.product_id, "", None, link.canonical_url), "timeout"
+    )
+    return FastJSONResponse({"product": serialize(product, projection), "images": list(images)})
+
+app.include_router(product_router)
+
+search_router = APIRouter(prefix="/api/v1/search")
+
+
+async def _read_image_upload(request: Request) -> bytes:
+    """Return the uploaded image from a multipart ``file`` field or a raw image body."""
+    from backend.services import image_search
+
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > image_search.IMAGE_MAX_BYTES + 4096:
+        raise HTTPException(status_code=413, detail="Image too large")
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=1, max_fields=10)
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing 'file' field")
+        data = await upload.read()
+    elif content_type.startswith(("image/", "application/octet-stream")):
+        data = await request.body()
+    else:
+        raise HTTPException(status_code=400, detail="Send multipart/form-data with a 'file' field")
+
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty image")
+    if len(data) > image_search.IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    return data
+
+
+@search_router.post("/image", summary="Search products by image across multiple platforms")
+async def search_by_image(
+    request: Request, limit: int = 20, fields: Optional[str] = None, profile: Optional[str] = None
+):
+    """Return ``{"results": [ProductSearchResult, ...]}``, best finalScore first.
+
+    Accepts multipart/form-data (``file``) or a raw ``image/*`` body.
+    *profile* selects the ranking weight profile.
+    """
+    from backend.services import image_search, ranking  # numpy-backed, loaded on first use
+
+    projection = _fields(fields)
+    try:
+        weights = ranking.get_profile(profile)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    data = await _read_image_upload(request)
+    try:
+        hits = await image_search.search(data, limit=image_search.IMAGE_SEARCH_CANDIDATES)
+    except image_search.ImageDecodeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    ranked = ranking.rank(
+        [h.product for h in hits], [h.similarity for h in hits], k=max(1, min(limit, 100)), profile=weights
+    )
+    return FastJSONResponse({"results": [ranking.to_result(r, projection) for r in ranked]})
+
+app.include_router(search_router)
+
 # ---------------------------------------------------------------------------
 # Custom OpenAPI that loads spec from openapi.yml so FastAPI docs reflect the
 # contract defined by the project.
@@ -123,6 +453,8 @@ app.include_router(intent_router)
 def load_openapi_spec() -> Dict[str, Any]:
     """Load the OpenAPI YAML file and return as dict."""
     if OPENAPI_FILE.exists():
+        import yaml  # only needed when the docs are first requested
+
         with OPENAPI_FILE.open("r", encoding="utf-8") as fh:
             return yaml.safe_load(fh)
     raise FileNotFoundError("openapi.yml not found at project root")
@@ -0,0 +1,187 @@
+"""ASGI middleware shared by the backend application."""
+from __future__ import annotations
+
+import time
+from typing import Any, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.fastjson import FastJSONResponse, dumps
+from backend.metrics import HTTP_REQUEST_SECONDS, MIDDLEWARE_SECONDS
+from backend.services import admission
+
+# Content types that are delivered incrementally and must never be buffered.
+STREAMING_CONTENT_TYPES = (b"text/event-stream", b"application/x-ndjson")
+_NO_BODY_STATUSES = (204, 304)
+
+
+def build_envelope(status_code: int, body: bytes, content_type: bytes) -> bytes:
+    """Return the standard envelope bytes around *body* without re-parsing it.
+
+    JSON bodies are spliced in verbatim as ``data``; any other body is embedded
+    as a JSON string; an empty body becomes ``null``.
+    """
+    status = b'"success"' if status_code < 400 else b'"error"'
+    if not body:
+        data = b"null"
+    elif content_type.startswith(b"application/json"):
+        data = body
+    else:
+        data = dumps(body.decode("utf-8", errors="replace"))
+    return b'{"status":' + status + b',"data":' + data + b"}"
+
+
+class StandardJSONResponseMiddleware:
+    """Wrap complete responses in ``{"status": ..., "data": ...}``.
+
+    Single-message responses are enveloped as they are sent. Responses that
+    stream (``more_body``) or declare a streaming content type are passed
+    through untouched, as are bodiless responses, HEAD requests and
+    *exclude_paths* (the Prometheus ``/metrics`` page). Setting
+    ``app.state.testing`` disables wrapping.
+    """
+
+    def __init__(self, app: ASGIApp, exclude_paths: Tuple[str, ...] = ("/metrics",)) -> None:
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("method") == "HEAD" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        app = scope.get("app")
+        if app is not None and getattr(app.state, "testing", False):
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def wrapped_send(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start = message
+                content_type = _header(message["headers"], b"content-type")
+                if message["status"] in _NO_BODY_STATUSES or content_type.startswith(
+                    STREAMING_CONTENT_TYPES
+                ):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Streaming response: release the held start and stop wrapping.
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            with MIDDLEWARE_SECONDS.time("envelope"):
+                headers: List[Any] = start["headers"]
+                body = build_envelope(start["status"], message.get("body", b""), _header(headers, b"content-type"))
+                headers = _rewrite_headers(headers, len(body))
+            await send({"type": "http.response.start", "status": start["status"], "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped_send)
+
+
+class AdmissionMiddleware:
+    """Rate-limit and load-shed requests under *path_prefixes*.
+
+    Clients over their token bucket get 429; requests that would queue past
+    the latency target get 503. Both carry ``Retry-After``. The concurrency
+    slot is held until the response (including a stream) has been sent.
+    """
+
+    def __init__(self, app: ASGIApp, path_prefixes: Tuple[str, ...] = ("/api/",)) -> None:
+        self.app = app
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        entered = time.perf_counter()
+        try:
+            if admission.RATE_LIMIT_ENABLED:
+                headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+                client = scope.get("client")
+                admission.client_limiter.check(admission.client_key(headers, client[0] if client else None))
+            shedder = admission.load_shedder
+            await shedder.acquire()
+        except admission.RateLimitedError as exc:
+            MIDDLEWARE_SECONDS.observe(time.perf_counter() - entered, "admission")
+            status = 503 if isinstance(exc, admission.OverloadedError) else 429
+            response = FastJSONResponse(
+                {"detail": str(exc)}, status_code=status, headers={"Retry-After": exc.retry_after_header}
+            )
+            await response(scope, receive, send)
+            return
+
+        MIDDLEWARE_SECONDS.observe(time.perf_counter() - entered, "admission")
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            shedder.release(time.monotonic() - start)
+
+
+class MetricsMiddleware:
+    """Record the duration of every HTTP request by route, method and status.
+
+    The route is the matched path template (``/api/v1/intent/parse``), so
+    label cardinality stays bounded; unmatched paths share one series.
+    Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def wrapped_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                getattr(route, "path", "unmatched"),
+                scope.get("method", ""),
+                str(status),
+            )
+
+
+def _header(headers: List[Any], name: bytes) -> bytes:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.lower()
+    return b""
+
+
+def _rewrite_headers(headers: List[Any], content_length: int) -> List[Any]:
+    out = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type")]
+    out.append((b"content-length", str(content_length).encode()))
+    out.append((b"content-type", b"application/json"))
+    return out
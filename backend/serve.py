@@ -0,0 +1,36 @@
+"""Production entrypoint: ``python -m backend.serve``.
+
+Runs `backend.main:app` under uvicorn with WEB_CONCURRENCY worker processes
+(``auto`` = one per CPU, default 1) on HOST:PORT (0.0.0.0:8000), logging at
+LOG_LEVEL (info). The resolved
+count is exported back to WEB_CONCURRENCY before the workers start, so every
+worker's `settings.workers` agrees with the number actually running.
+
+Workers on one host share the product store file (PRODUCT_STORE_DB): stored
+products and intent answers, cross-process single-flight for upstream calls
+and a single compaction loop. Per-client rate limits, circuit breakers and
+the in-process caches stay per worker, and so do the `/metrics` counters:
+each scrape is answered by whichever worker accepts it, so Prometheus sees
+counters jump and reset. The images default to one worker; scale out with
+replicas when the service is scraped.
+"""
+import os
+
+import uvicorn
+
+from backend.config import settings
+
+
+def main() -> None:
+    os.environ["WEB_CONCURRENCY"] = str(settings.workers)
+    uvicorn.run(
+        "backend.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=settings.workers,
+        log_level=os.getenv("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
-from . import daji_service, weidian_service, llm_service, preprocessor  # noqa: F401 
\ No newline at end of file
+"""Backend services. Submodules are imported where they are used, so the
+numpy-backed ones (intent_classifier, image_search, ranking) load lazily."""
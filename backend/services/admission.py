@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+"""Admission control: per-client rate limits, upstream quotas, load shedding.
+
+- With RATE_LIMIT_ENABLED=1 (off by default) every client (``X-API-Key``
+  header, else the peer IP) gets a token bucket refilled at RATE_LIMIT_RPS up
+  to RATE_LIMIT_BURST; requests beyond it are rejected with 429 and a
+  ``Retry-After``. Behind a reverse proxy or ingress the peer IP is the
+  proxy's, so every client would share one bucket: set
+  RATE_LIMIT_TRUST_FORWARDED=1 to key on the first ``X-Forwarded-For``
+  address instead (only when the proxy sets or overwrites that header, as
+  clients can forge it otherwise). Limits are per worker process.
+- Upstream quotas are tracked with global buckets per provider
+  (UPSTREAM_BUDGET_RPS_OPENROUTER / _DAJI / _WEIDIAN, unlimited when 0).
+  The budgets are for the whole host: with several worker processes each
+  one gets an equal share.
+  `UpstreamGuard` draws one token per call and raises `QuotaExceededError`
+  instead of sending a request the provider would refuse.
+- At most ADMISSION_MAX_INFLIGHT requests run at once; the rest queue. A
+  request whose expected queueing delay already exceeds
+  ADMISSION_LATENCY_TARGET is rejected immediately (503 + ``Retry-After``),
+  and one still queued after that long gives up, so a spike degrades into
+  fast rejections rather than every request timing out.
+"""
+
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+import asyncio
+import math
+import os
+import time
+
+from ..config import settings
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "5"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+RATE_LIMIT_KEY_HEADER = os.getenv("RATE_LIMIT_KEY_HEADER", "x-api-key").lower()
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "64"))
+ADMISSION_LATENCY_TARGET = float(os.getenv("ADMISSION_LATENCY_TARGET", "2"))
+MAX_RETRY_AFTER = 3600
+
+
+class RateLimitedError(RuntimeError):
+    """A request was refused; *retry_after* is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(min(self.retry_after, MAX_RETRY_AFTER))))
+
+
+class QuotaExceededError(RateLimitedError):
+    """Raised instead of calling an upstream whose quota budget is spent."""
+
+
+class OverloadedError(RateLimitedError):
+    """Raised when the request queue is beyond the latency target."""
+
+
+class TokenBucket:
+    """Classic token bucket: *rate* tokens/second, holding at most *burst*."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        """Tokens currently in the bucket."""
+        self._refill()
+        return self.tokens
+
+    def try_acquire(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take *cost* tokens if available; else return the seconds until they are."""
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        if self.rate <= 0:
+            return False, math.inf
+        return False, (cost - self.tokens) / self.rate
+
+############################################################
+# Per-client limits
+############################################################
+
+
+class ClientRateLimiter:
+    """Token bucket per client key, keeping the most recent *max_clients*."""
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_RPS,
+        burst: float = RATE_LIMIT_BURST,
+        max_clients: int = RATE_LIMIT_MAX_CLIENTS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, key: str) -> None:
+        """Admit one request from *key* or raise `RateLimitedError`."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self._clock)
+            if len(self._buckets) > self.max_clients:
+                # Evicted clients start over with a full bucket, which errs on the side of admitting.
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        ok, wait = bucket.try_acquire()
+        if not ok:
+            raise RateLimitedError("Rate limit exceeded", wait)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+############################################################
+# Upstream quota budgets
+############################################################
+
+
+def _provider(guard_name: str) -> str:
+    # Guards "<provider>" and "<provider>_<variant>" share the provider's quota
+    return guard_name.split("_", 1)[0]
+
+
+def _budget_from_env(provider: str) -> Optional[TokenBucket]:
+    rate = float(os.getenv(f"UPSTREAM_BUDGET_RPS_{provider.upper()}", "0"))
+    if rate <= 0:
+        return None
+    burst = float(os.getenv(f"UPSTREAM_BUDGET_BURST_{provider.upper()}", rate))
+    workers = settings.workers
+    return TokenBucket(rate / workers, burst / workers)
+
+
+_budgets: Dict[str, Optional[TokenBucket]] = {}
+
+
+def set_upstream_budget(provider: str, bucket: Optional[TokenBucket]) -> None:
+    """Override the quota bucket for *provider* (None = unlimited)."""
+    _budgets[provider] = bucket
+
+
+def _budget(guard_name: str) -> Optional[TokenBucket]:
+    provider = _provider(guard_name)
+    if provider not in _budgets:
+        _budgets[provider] = _budget_from_env(provider)
+    return _budgets[provider]
+
+
+def upstream_budget_headroom(guard_name: str) -> float:
+    """Fraction (0..1) of *guard_name*'s provider quota currently unspent; 1 if unlimited."""
+    bucket = _budget(guard_name)
+    return 1.0 if bucket is None else bucket.available() / bucket.burst
+
+
+def spend_upstream_budget(guard_name: str) -> None:
+    """Draw one call from the quota of *guard_name*'s provider.
+
+    Raises `QuotaExceededError` when the budget is spent.
+    """
+    provider = _provider(guard_name)
+    bucket = _budget(guard_name)
+    if bucket is None:
+        return
+    ok, wait = bucket.try_acquire()
+    if not ok:
+        raise QuotaExceededError(f"{provider} quota exceeded", wait)
+
+############################################################
+# Load shedding
+############################################################
+
+
+class LoadShedder:
+    """Concurrency limit with a FIFO queue bounded by a latency target."""
+
+    def __init__(
+        self,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        latency_target: float = ADMISSION_LATENCY_TARGET,
+    ) -> None:
+        self.max_inflight = max(1, max_inflight)
+        self.latency_target = latency_target
+        self.inflight = 0
+        self.shed = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_time: Optional[float] = None
+
+    def estimated_wait(self) -> float:
+        """Expected queueing delay for a request arriving now."""
+        if self.inflight < self.max_inflight and not self._waiters:
+            return 0.0
+        return (len(self._waiters) + 1) / self.max_inflight * (self._service_time or 0.0)
+
+    async def acquire(self) -> None:
+        """Take a slot, queueing up to the latency target; else `OverloadedError`."""
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            return
+        wait = self.estimated_wait()
+        if wait > self.latency_target:
+            self.shed += 1
+            raise OverloadedError("Server overloaded", wait)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout=self.latency_target)
+        except BaseException as exc:
+            if fut.done() and not fut.cancelled():
+                self._hand_off()  # granted just as we gave up; pass it on
+            else:
+                self._discard(fut)
+            if isinstance(exc, asyncio.TimeoutError):
+                self.shed += 1
+                raise OverloadedError("Server overloaded", self.estimated_wait() or self.latency_target) from None
+            raise
+
+    def release(self, elapsed: float) -> None:
+        """Return a slot held for *elapsed* seconds."""
+        prev = self._service_time
+        self._service_time = elapsed if prev is None else 0.8 * prev + 0.2 * elapsed
+        self._hand_off()
+
+    def _hand_off(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # slot moves to the waiter; inflight unchanged
+                return
+        self.inflight -= 1
+
+    def _discard(self, fut: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+############################################################
+# Public API
+############################################################
+
+client_limiter = ClientRateLimiter()
+load_shedder = LoadShedder()
+
+
+def client_key(headers: Dict[str, str], peer: Optional[str]) -> str:
+    """Rate-limit key for a request: API key header, else client IP."""
+    api_key = headers.get(RATE_LIMIT_KEY_HEADER)
+    if api_key:
+        return f"key:{api_key}"
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = headers.get("x-forwarded-for", "").split(",")[0].strip()
+        if forwarded:
+            return f"ip:{forwarded}"
+    return f"ip:{peer or 'unknown'}"
+
+
+def reset() -> None:
+    """Forget client buckets, upstream budgets and shedding state (tests)."""
+    global load_shedder  # noqa: PLW0603
+    client_limiter.clear()
+    _budgets.clear()
+    load_shedder = LoadShedder()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+"""In-process caches used in front of upstream calls.
+
+`TTLCache` is a bounded LRU mapping whose entries expire after a TTL.
+`AsyncCache` adds `get_or_load`, which coalesces concurrent misses for the same
+key into a single loader call (single-flight) and, within an optional stale
+window after expiry, returns the old value immediately while refreshing it in
+the background (stale-while-revalidate).
+
+Loader failures are never cached: waiters see the exception, and a failed
+background refresh simply leaves the stale value in place.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import os
+import time
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "2048"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "600"))
+PRODUCT_CACHE_STALE_TTL = float(os.getenv("PRODUCT_CACHE_STALE_TTL", "3600"))
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    stale_until: float
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTL."""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        stale_ttl: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, key: Hashable) -> Optional[_Entry]:
+        """Return the entry for *key* (possibly stale), dropping dead ones."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if self._clock() >= entry.stale_until:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entry(key)
+        if entry is not None and self._clock() < entry.expires_at:
+            self.hits += 1
+            return entry.value
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        now = self._clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._data[key] = _Entry(value, expires_at, expires_at + self.stale_ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Seconds until *key* expires (negative while stale); None if absent."""
+        entry = self._data.get(key)
+        now = self._clock()
+        if entry is None or now >= entry.stale_until:
+            return None
+        return entry.expires_at - now
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry.value
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entry(key)
+        return entry is not None and self._clock() < entry.expires_at
+
+
+class AsyncCache(TTLCache):
+    """TTL cache with single-flight loading and stale-while-revalidate."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def get_or_load(self, key: Hashable, loader: Loader) -> Any:
+        """Return the cached value for *key*, calling *loader* on a miss."""
+        entry = self._entry(key)
+        if entry is not None:
+            self.hits += 1
+            if self._clock() >= entry.expires_at:
+                self._start(key, loader)  # stale: refresh in the background
+            return entry.value
+
+        self.misses += 1
+        # Shield the shared load so one cancelled waiter doesn't fail the others.
+        return await asyncio.shield(self._start(key, loader))
+
+    def _start(self, key: Hashable, loader: Loader) -> asyncio.Future:
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._run(key, loader))
+            fut.add_done_callback(_consume_exception)
+            self._inflight[key] = fut
+        return fut
+
+    def ttl_for(self, value: Any) -> float | None:
+        """TTL for a freshly loaded *value*; None means the cache default."""
+        return None
+
+    async def _run(self, key: Hashable, loader: Loader) -> Any:
+        try:
+            value = await loader()
+            self.set(key, value, ttl=self.ttl_for(value))
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        super().clear()
+        self._inflight.clear()
+
+
+def _consume_exception(fut: asyncio.Future) -> None:
+    # Background refreshes may fail with nobody awaiting them; mark as retrieved.
+    if not fut.cancelled():
+        fut.exception()
+
+
+# Shared product-detail cache keyed by (platform, product_id)
+product_cache = AsyncCache(
+    maxsize=PRODUCT_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL, stale_ttl=PRODUCT_CACHE_STALE_TTL
+)
@@ -7,22 +7,25 @@ falls back to deterministic fake data so that the rest of the backend can operat
 without external dependency.
 """
 
-from typing import Any, Dict, Optional
-import os
+from typing import Any, Dict, List, Optional
 import asyncio
 import hashlib
 import base64
 import random
-import re
 
-import httpx
-from dotenv import load_dotenv
+from ..config import settings
+from ..fastjson import loads
+from . import http_clients, product_store
+from .cache import product_cache
+from .preprocessor import ProductLink, parse_product_url, product_link
+from .product_model import Product, normalize
+from .resilience import fallback_reason, get_guard, mark_fallback
 
-load_dotenv()
+DAJI_API_KEY = settings.daji_api_key
+DAJI_API_SECRET = settings.daji_api_secret
+DAJI_API_BASE_URL = settings.daji_api_base_url
 
-DAJI_API_KEY = os.getenv("DAJI_API_KEY")
-DAJI_API_SECRET = os.getenv("DAJI_API_SECRET")
-DAJI_API_BASE_URL = os.getenv("DAJI_API_BASE_URL", "https://openapi.dajisaas.com/")
+http_clients.register("daji", DAJI_API_BASE_URL, warmup=bool(DAJI_API_KEY and DAJI_API_SECRET))
 
 ############################################################
 # Helpers
@@ -40,104 +43,190 @@ def _sign_params(params: Dict[str, Any]) -> Dict[str, Any]:
     md5_hash = hashlib.md5(sign_str.encode()).hexdigest().upper()
     return {**params_with_key, "sign": md5_hash}
 
+############################################################
+# Normalizers
+############################################################
 
-def _parse_taobao_id(url: str) -> Optional[str]:
-    m = re.search(r"[?&]id=(\d+)", url)
-    return m.group(1) if m else None
-
-
-def _parse_1688_id(url: str) -> Optional[str]:
-    # Example: https://detail.1688.com/offer/123456.html
-    m = re.search(r"offer/(\d+)", url)
-    return m.group(1) if m else None
+_TAOBAO_PATHS = (("data", "item"), ("data",), ("item",), ())
+_TAOBAO_KEYS = {
+    "title": ("title", "itemTitle"),
+    "price": ("promotionPrice", "promotion_price", "price", "reservePrice"),
+    "image": ("mainImageUrl", "picUrl", "pic_url", "mainImage"),
+    "images": ("images", "itemImages", "item_imgs"),
+    "shop": ("shopName", "shop_name", "sellerNick", "nick"),
+    "sales": ("sales", "soldQuantity", "sold_quantity", "volume"),
+}
+
+_1688_PATHS = (("data", "productInfo"), ("data",), ("result",), ())
+_1688_KEYS = {
+    "title": ("subjectTrans", "subject", "title"),
+    "price": ("price", "priceInfo", "referencePrice"),
+    "image": ("mainImage", "imageUrl"),
+    "images": ("productImage", "images"),
+    "shop": ("companyName", "sellerName"),
+    "sales": ("soldOut", "saleCount", "sales"),
+}
+
+
+def normalize_taobao(raw: Any, link: ProductLink) -> Product:
+    """Reduce a Daji taobao item payload to a `Product`."""
+    return normalize(raw, link, _TAOBAO_PATHS, _TAOBAO_KEYS)
+
+
+def normalize_1688(raw: Any, link: ProductLink) -> Product:
+    """Reduce a Daji 1688 offer payload to a `Product`."""
+    return normalize(raw, link, _1688_PATHS, _1688_KEYS)
+
+
+_IMAGE_SEARCH_PATHS = {
+    "taobao": "taobao/traffic/item/imageSearch",
+    "1688": "alibaba/product/imageQuery",
+}
+_ITEM_ID_KEYS = ("itemId", "item_id", "offerId", "num_iid", "id")
+_SEARCH_KEYS = {"taobao": _TAOBAO_KEYS, "1688": _1688_KEYS}
+
+
+def parse_image_search(raw: Any, platform: str) -> List[Product]:
+    """Reduce a Daji image-search payload to Products, in upstream rank order."""
+    data = raw.get("data") if isinstance(raw, dict) else None
+    items = (data.get("items") or data.get("list")) if isinstance(data, dict) else data
+    products: List[Product] = []
+    for item in items if isinstance(items, list) else ():
+        if not isinstance(item, dict):
+            continue
+        item_id = next((str(item[k]) for k in _ITEM_ID_KEYS if item.get(k)), None)
+        link = product_link(platform, item_id) if item_id else None
+        if link is None:
+            continue
+        try:
+            products.append(normalize(item, link, ((),), _SEARCH_KEYS[platform]))
+        except ValueError:
+            continue
+    return products
 
 ############################################################
 # Real API calls
 ############################################################
 
-async def _fetch_taobao(product_id: str) -> Dict[str, Any]:
+async def _fetch_taobao(link: ProductLink) -> Product:
     params = {
-        "item_id": product_id,
+        "item_id": link.product_id,
         "language": "en",
     }
     signed = _sign_params(params)
     url = f"{DAJI_API_BASE_URL}taobao/traffic/item/get"
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.get(url, params=signed)
-        r.raise_for_status()
-        return r.json()
+    r = await http_clients.get_client("daji").get(url, params=signed)
+    r.raise_for_status()
+    return normalize_taobao(loads(r.content), link)
 
 
-async def _fetch_1688(product_id: str) -> Dict[str, Any]:
+async def _search_image(platform: str, image: bytes) -> List[Product]:
+    params = {"imageBase64": base64.b64encode(image).decode("ascii"), "language": "en"}
+    signed = _sign_params(params)
+    url = f"{DAJI_API_BASE_URL}{_IMAGE_SEARCH_PATHS[platform]}"
+    r = await http_clients.get_client("daji").post(url, data=signed)
+    r.raise_for_status()
+    return parse_image_search(loads(r.content), platform)
+
+
+async def _fetch_1688(link: ProductLink) -> Product:
     params = {
-        "offerId": product_id,
+        "offerId": link.product_id,
         "country": "en",
     }
     signed = _sign_params(params)
     url = f"{DAJI_API_BASE_URL}alibaba/product/queryProductDetail"
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.get(url, params=signed)
-        r.raise_for_status()
-        return r.json()
+    r = await http_clients.get_client("daji").get(url, params=signed)
+    r.raise_for_status()
+    return normalize_1688(loads(r.content), link)
 
 ############################################################
 # Public helper used by backend.main
 ############################################################
 
 _FAKE_PRODUCTS = [
-    {
-        "platform": "taobao",
-        "productId": "123456",
-        "title": "耐克 Air Zoom Pegasus 40 跑鞋",
-        "price": 699.0,
-        "url": "https://item.taobao.com/item.htm?id=123456",
-    },
-    {
-        "platform": "1688",
-        "productId": "890123",
-        "title": "阿迪达斯 运动衫",
-        "price": 299.0,
-        "url": "https://detail.1688.com/offer/890123.html",
-    },
+    Product(
+        platform="taobao",
+        product_id="123456",
+        title="耐克 Air Zoom Pegasus 40 跑鞋",
+        price=699.0,
+        url="https://item.taobao.com/item.htm?id=123456",
+    ),
+    Product(
+        platform="1688",
+        product_id="890123",
+        title="阿迪达斯 运动衫",
+        price=299.0,
+        url="https://detail.1688.com/offer/890123.html",
+    ),
 ]
 
 
-async def fetch_product_detail(url: str) -> Dict[str, Any]:
+def _fake_for(platform: str | None) -> Product:
+    for prod in _FAKE_PRODUCTS:
+        if prod.platform == platform:
+            return prod
+    return random.choice(_FAKE_PRODUCTS)
+
+
+async def search_by_image(image: bytes, platform: str = "taobao") -> List[Product]:
+    """Search *platform* (taobao / 1688) for products matching *image*.
+
+    Returns an empty list without credentials or when the upstream fails;
+    calls go through the "daji_<platform>" circuit breaker.
+    """
+    if platform not in _IMAGE_SEARCH_PATHS or not DAJI_API_KEY or not DAJI_API_SECRET:
+        return []
+    try:
+        return await get_guard(f"daji_{platform}").call(_search_image, platform, image)
+    except Exception:  # noqa: BLE001
+        return []
+
+
+async def fetch_product_detail(url: str) -> Product:
     """Return product detail for Taobao / 1688 URL.
 
-    Fallback: when keys missing / API error, return static fake product so that
-    the rest of the flow doesn't break.
+    Upstream payloads are normalized to a compact `Product` before they are
+    cached in `product_cache` and the persistent `product_store`; calls go through the "daji_taobao" /
+    "daji_1688" circuit breakers and are hedged when HEDGE_ENABLED=1.
+    Fallback: when keys missing / API error, return static fake product (flagged
+    with ``fallback`` and a ``fallback_reason``) so that the rest of the flow
+    doesn't break.
     """
-    platform: str | None = None
-    product_id: Optional[str] = None
-    if "taobao.com" in url or "tb.cn" in url:
-        platform = "taobao"
-        product_id = _parse_taobao_id(url)
-    elif "1688.com" in url:
-        platform = "1688"
-        product_id = _parse_1688_id(url)
-
-    if not platform or not product_id:
-        return random.choice(_FAKE_PRODUCTS)
+    link = parse_product_url(url)
+    if link is None or link.platform not in ("taobao", "1688") or not link.product_id:
+        return mark_fallback(random.choice(_FAKE_PRODUCTS), "unparsed_url")
+    platform = link.platform
 
     # If credentials missing, return fake matching platform
     if not DAJI_API_KEY or not DAJI_API_SECRET:
         await asyncio.sleep(0.05)
-        for prod in _FAKE_PRODUCTS:
-            if prod["platform"] == platform:
-                return prod
-        return random.choice(_FAKE_PRODUCTS)
+        return mark_fallback(_fake_for(platform), "no_credentials")
 
+    fetch = _fetch_taobao if platform == "taobao" else _fetch_1688
+    guard = get_guard(f"daji_{platform}")
     try:
-        if platform == "taobao":
-            return await _fetch_taobao(product_id)
-        if platform == "1688":
-            return await _fetch_1688(product_id)
-    except Exception as exc:  # pragma: no cover
-        # network error or invalid response → return fake data matching platform if possible
-        for prod in _FAKE_PRODUCTS:
-            if prod["platform"] == platform:
-                return prod
-        return random.choice(_FAKE_PRODUCTS)
-
-    return random.choice(_FAKE_PRODUCTS) 
\ No newline at end of file
+        return await product_cache.get_or_load(
+            (platform, link.product_id),
+            lambda: product_store.read_through(
+                platform, link.product_id, lambda: guard.call_hedged(fetch, link)
+            ),
+        )
+    except Exception as exc:  # noqa: BLE001
+        # network error, timeout, open circuit or invalid response
+        return mark_fallback(_fake_for(platform), fallback_reason(exc))
+
+
+async def refresh_product(link: ProductLink) -> Optional[Product]:
+    """Re-fetch *link* upstream, bypassing the caches, and update them.
+
+    Used by the background refresher; returns None without credentials and
+    lets upstream errors (including spent quotas) propagate.
+    """
+    if not DAJI_API_KEY or not DAJI_API_SECRET or link.platform not in ("taobao", "1688"):
+        return None
+    fetch = _fetch_taobao if link.platform == "taobao" else _fetch_1688
+    product = await get_guard(f"daji_{link.platform}").call(fetch, link)
+    await product_store.save(product)
+    product_cache.set(link.key, product)
+    return product
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+"""Long-lived, pooled HTTP clients for upstream APIs.
+
+Each upstream (Daji, Weidian RapidAPI, ...) registers itself once at import
+time and then borrows a shared `httpx.AsyncClient` per call instead of opening
+a fresh connection every time. `startup()` / `shutdown()` are wired into the
+FastAPI lifespan hook; clients are also created lazily on first use so the
+services work outside the app (scripts, tests).
+
+Pool sizes can be tuned globally (HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE,
+HTTP_KEEPALIVE_EXPIRY) or per upstream, e.g. HTTP_MAX_CONNECTIONS_DAJI=100.
+HTTP/2 is used when the optional `h2` package is installed (disable with
+HTTP2_ENABLED=0).
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+import asyncio
+import importlib.util
+import os
+import ssl
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+HTTP_WARMUP_TIMEOUT = float(os.getenv("HTTP_WARMUP_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") != "0" and importlib.util.find_spec("h2") is not None
+
+
+@dataclass
+class Upstream:
+    name: str
+    base_url: str
+    warmup: bool = False
+    max_redirects: int = 20
+
+
+_upstreams: Dict[str, Upstream] = {}
+_clients: Dict[str, httpx.AsyncClient] = {}
+_ssl_context: Optional[ssl.SSLContext] = None
+
+############################################################
+# Helpers
+############################################################
+
+
+def _env_override(key: str, name: str, default: float) -> float:
+    return float(os.getenv(f"{key}_{name.upper()}", default))
+
+
+def _ssl() -> ssl.SSLContext:
+    # Loading the CA bundle costs tens of ms; do it once, not per client.
+    global _ssl_context  # noqa: PLW0603
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context(http2=HTTP2_ENABLED)
+    return _ssl_context
+
+
+def _build_client(upstream: Upstream) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=int(_env_override("HTTP_MAX_CONNECTIONS", upstream.name, HTTP_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(_env_override("HTTP_MAX_KEEPALIVE", upstream.name, HTTP_MAX_KEEPALIVE)),
+        keepalive_expiry=_env_override("HTTP_KEEPALIVE_EXPIRY", upstream.name, HTTP_KEEPALIVE_EXPIRY),
+    )
+    return httpx.AsyncClient(
+        timeout=_env_override("HTTP_TIMEOUT", upstream.name, HTTP_TIMEOUT),
+        limits=limits,
+        http2=HTTP2_ENABLED,
+        verify=_ssl(),
+        max_redirects=upstream.max_redirects,
+    )
+
+
+async def _warm(upstream: Upstream) -> None:
+    """Open a pooled connection (DNS + TCP + TLS) ahead of the first real call."""
+    try:
+        await get_client(upstream.name).head(upstream.base_url, timeout=HTTP_WARMUP_TIMEOUT)
+    except httpx.HTTPError:
+        # Warm-up is best effort; the first real request will retry the connect.
+        pass
+
+############################################################
+# Public API
+############################################################
+
+
+def register(name: str, base_url: str, warmup: bool = False, max_redirects: int = 20) -> None:
+    """Declare an upstream; *warmup* pre-connects to *base_url* at startup."""
+    _upstreams[name] = Upstream(
+        name=name, base_url=base_url, warmup=warmup, max_redirects=max_redirects
+    )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Return the shared client for upstream *name*, creating it if needed."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        upstream = _upstreams.get(name) or Upstream(name=name, base_url="")
+        client = _build_client(upstream)
+        _clients[name] = client
+    return client
+
+
+async def startup() -> None:
+    """Create all registered clients and warm up their connection pools."""
+    for name in _upstreams:
+        get_client(name)
+    await asyncio.gather(*(_warm(u) for u in _upstreams.values() if u.warmup))
+
+
+async def shutdown() -> None:
+    """Close every client, releasing pooled connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+"""Search products by image.
+
+Uploads are decoded and hashed off the event loop in a process pool
+(IMAGE_DECODE_WORKERS; 0 uses a thread instead): the image is reduced to a
+32×32 grayscale thumbnail and a 64-bit DCT perceptual hash is taken of it
+and of its mirror image. Only the two hashes travel back from the worker.
+
+Hashes are matched against `index`, an in-process NumPy array of known
+product-image hashes (IMAGE_INDEX_PATH, loaded on first use), by Hamming
+distance computed for all entries and both query variants in one batch.
+When fewer than IMAGE_SEARCH_MIN_LOCAL local matches are found, the Daji
+image-search APIs (IMAGE_SEARCH_PLATFORMS) fill the gap. The candidates are
+then ordered by `ranking`.
+"""
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import asyncio
+import io
+import os
+import threading
+
+import numpy as np
+
+from ..fastjson import dumps, loads
+from . import daji_service
+from .product_model import Product
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+IMAGE_INDEX_PATH = os.getenv("IMAGE_INDEX_PATH", str(BASE_DIR / "data" / "image_index.npz"))
+IMAGE_DECODE_WORKERS = int(os.getenv("IMAGE_DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "40000000"))
+IMAGE_SEARCH_MAX_DISTANCE = int(os.getenv("IMAGE_SEARCH_MAX_DISTANCE", "12"))
+IMAGE_SEARCH_MIN_LOCAL = int(os.getenv("IMAGE_SEARCH_MIN_LOCAL", "5"))
+# Candidates handed to the ranking step per request
+IMAGE_SEARCH_CANDIDATES = int(os.getenv("IMAGE_SEARCH_CANDIDATES", "200"))
+IMAGE_SEARCH_PLATFORMS = tuple(
+    p.strip() for p in os.getenv("IMAGE_SEARCH_PLATFORMS", "taobao,1688").split(",") if p.strip()
+)
+# Upstream matches carry no distance; they rank by position below this score
+IMAGE_SEARCH_REMOTE_SIMILARITY = float(os.getenv("IMAGE_SEARCH_REMOTE_SIMILARITY", "0.6"))
+
+HASH_BITS = 64
+_THUMB = 32
+
+
+class ImageDecodeError(ValueError):
+    """The upload is not an image we can decode."""
+
+
+class SearchHit(NamedTuple):
+    product: Product
+    similarity: float
+    source: str  # "local" or "remote"
+
+############################################################
+# Hashing (runs in worker processes)
+############################################################
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+_DCT = _dct_matrix(_THUMB)
+
+
+def phash(gray: np.ndarray) -> int:
+    """64-bit perceptual hash of a 32×32 grayscale array."""
+    coeffs = (_DCT @ gray @ _DCT.T)[:8, :8].ravel()
+    bits = coeffs > np.median(coeffs[1:])  # DC term excluded from the median
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def thumbnail(data: bytes) -> np.ndarray:
+    """Decode *data* to a 32×32 float32 grayscale array."""
+    from PIL import Image  # imported in the worker; only needed for uploads
+
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("L", (_THUMB * 2, _THUMB * 2))  # JPEG: decode at reduced scale
+            small = img.convert("L").resize((_THUMB, _THUMB), Image.BILINEAR)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise ImageDecodeError(f"Unsupported or corrupt image: {exc}") from None
+    return np.asarray(small, dtype=np.float32)
+
+
+def image_hashes(data: bytes) -> Tuple[int, int]:
+    """Perceptual hashes of an encoded image and of its mirror image."""
+    gray = thumbnail(data)
+    return phash(gray), phash(gray[:, ::-1])
+
+############################################################
+# Decode pool
+############################################################
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> Optional[Executor]:
+    global _pool  # noqa: PLW0603
+    if IMAGE_DECODE_WORKERS <= 0:
+        return None  # loop's default thread pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_DECODE_WORKERS)
+        return _pool
+
+
+async def hash_upload(data: bytes) -> Tuple[int, int]:
+    """Hash an uploaded image without blocking the event loop."""
+    global _pool  # noqa: PLW0603
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor(), image_hashes, data)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a hostile upload); start a fresh pool once.
+        with _pool_lock:
+            _pool = None
+        return await loop.run_in_executor(_executor(), image_hashes, data)
+
+
+def shutdown() -> None:
+    global _pool  # noqa: PLW0603
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+############################################################
+# Index
+############################################################
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_lut(x: np.ndarray) -> np.ndarray:
+    return _POPCOUNT8[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+# numpy >= 2.0 has a native popcount; older versions use a byte lookup table
+_popcount = getattr(np, "bitwise_count", _popcount_lut)
+
+
+class ImageIndex:
+    """Perceptual hashes of known product images, several per product allowed."""
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._owners = np.zeros(capacity, dtype=np.int32)
+        self._size = 0
+        self.products: List[Product] = []
+        self._product_slot: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, product: Product, image_hash: int) -> None:
+        key = (product.platform, product.product_id)
+        slot = self._product_slot.get(key)
+        if slot is None:
+            slot = self._product_slot[key] = len(self.products)
+            self.products.append(product)
+        else:
+            self.products[slot] = product
+        if self._size == len(self._hashes):
+            self._hashes = np.resize(self._hashes, 2 * self._size)
+            self._owners = np.resize(self._owners, 2 * self._size)
+        self._hashes[self._size] = image_hash
+        self._owners[self._size] = slot
+        self._size += 1
+
+    def distances(self, queries: Sequence[int]) -> np.ndarray:
+        """Hamming distance of every entry to each query, shape (len(queries), len(self))."""
+        q = np.asarray(queries, dtype=np.uint64)
+        return _popcount(self._hashes[: self._size][None, :] ^ q[:, None])
+
+    def search(self, queries: Sequence[int], k: int, max_distance: int) -> List[Tuple[Product, int]]:
+        """Up to *k* products nearest to any query, best image per product."""
+        if not self._size or k <= 0:
+            return []
+        dist = self.distances(queries).min(axis=0)
+        cand = np.flatnonzero(dist <= max_distance)
+        if len(cand) > 4 * k:
+            # Partial selection; the margin leaves room for products with several images.
+            cand = cand[np.argpartition(dist[cand], 4 * k)[: 4 * k]]
+        cand = cand[np.argsort(dist[cand], kind="stable")]
+        hits: List[Tuple[Product, int]] = []
+        seen = set()
+        for i in cand:
+            owner = int(self._owners[i])
+            if owner in seen:
+                continue
+            seen.add(owner)
+            hits.append((self.products[owner], int(dist[i])))
+            if len(hits) == k:
+                break
+        return hits
+
+    def save(self, path: str) -> None:
+        meta = [[p.platform, p.product_id, p.title, p.price, p.url, p.image] for p in self.products]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            path,
+            hashes=self._hashes[: self._size],
+            owners=self._owners[: self._size],
+            meta=np.frombuffer(dumps(meta), dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ImageIndex":
+        with np.load(path, allow_pickle=False) as data:
+            hashes, owners = data["hashes"], data["owners"]
+            meta = loads(data["meta"].tobytes())
+        index = cls(capacity=max(1024, len(hashes)))
+        index.products = [
+            Product(platform=m[0], product_id=m[1], title=m[2], price=m[3], url=m[4], image=m[5])
+            for m in meta
+        ]
+        index._product_slot = {(p.platform, p.product_id): i for i, p in enumerate(index.products)}
+        index._hashes[: len(hashes)] = hashes
+        index._owners[: len(owners)] = owners
+        index._size = len(hashes)
+        return index
+
+
+index = ImageIndex()
+_loaded = False
+
+
+def load_index(path: str = IMAGE_INDEX_PATH) -> None:
+    """Replace `index` with the one saved at *path*, if any."""
+    global index, _loaded  # noqa: PLW0603
+    if os.path.exists(path):
+        index = ImageIndex.load(path)
+    _loaded = True
+
+############################################################
+# Public API
+############################################################
+
+
+def _remote_similarity(rank: int) -> float:
+    return round(IMAGE_SEARCH_REMOTE_SIMILARITY * 0.98 ** rank, 4)
+
+
+async def search(image: bytes, limit: int = 20) -> List[SearchHit]:
+    """Products looking like *image*, most similar first.
+
+    Raises `ImageDecodeError` for uploads that aren't decodable images.
+    """
+    if not _loaded:
+        await asyncio.to_thread(load_index)
+    hashes = await hash_upload(image)
+    hits = [
+        SearchHit(product, round(1 - distance / HASH_BITS, 4), "local")
+        for product, distance in index.search(hashes, limit, IMAGE_SEARCH_MAX_DISTANCE)
+    ]
+    if len(hits) >= min(limit, IMAGE_SEARCH_MIN_LOCAL):
+        return hits
+
+    seen = {(h.product.platform, h.product.product_id) for h in hits}
+    remote = await asyncio.gather(
+        *(daji_service.search_by_image(image, platform) for platform in IMAGE_SEARCH_PLATFORMS)
+    )
+    for products in remote:
+        for rank, product in enumerate(products):
+            key = (product.platform, product.product_id)
+            if key not in seen:
+                seen.add(key)
+                hits.append(SearchHit(product, _remote_similarity(rank), "remote"))
+    hits.sort(key=lambda h: h.similarity, reverse=True)
+    return hits[:limit]
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+"""Local fast-path shopping-intent classifier.
+
+Sits in front of `llm_service.get_shopping_intent`: a zh/en shopping lexicon
+plus a hashed character n-gram logistic regression (NumPy) answer obvious
+inputs in-process and only defer ambiguous ones to the LLM.
+
+Modes (INTENT_FASTPATH_MODE):
+- "on": answer locally when confident, otherwise ask the LLM.
+- "shadow" (default): always ask the LLM, compare with the local prediction
+  and report agreement via `shadow_stats()`.
+- "off": LLM only.
+
+The seed corpus is small and the model's probabilities are not calibrated
+("how much do you love me" scores as confidently as "how much is this"), so
+"on" is only worth enabling once the model has been trained on logged LLM
+labels and the shadow agreement rate is high. Inputs containing a negation
+("不想买", "don't want to buy") are never answered locally.
+
+Inputs longer than INTENT_FASTPATH_MAX_CHARS are not featurized (that runs
+on the event loop) and always go to the LLM.
+
+Fresh LLM answers (not cache hits) are appended to INTENT_TRAINING_FILE
+(JSONL, when set) from a worker thread and that file is folded into the
+training set the next time the model is built.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from ..metrics import STAGE_SECONDS
+from . import llm_service
+from .admission import QuotaExceededError
+from .llm_service import normalize_text
+
+INTENT_FASTPATH_MODE = os.getenv("INTENT_FASTPATH_MODE", "shadow")
+INTENT_FASTPATH_THRESHOLD = float(os.getenv("INTENT_FASTPATH_THRESHOLD", "0.9"))
+INTENT_FASTPATH_MAX_CHARS = int(os.getenv("INTENT_FASTPATH_MAX_CHARS", "512"))
+INTENT_TRAINING_FILE = os.getenv("INTENT_TRAINING_FILE")
+
+N_FEATURES = 1 << 12
+NGRAM_RANGE = (1, 3)
+
+############################################################
+# Lexicon & seed corpus
+############################################################
+
+SHOPPING_TERMS = (
+    "代购", "购买", "想买", "要买", "帮我买", "下单", "多少钱", "价格", "价钱", "包邮",
+    "优惠", "打折", "链接", "同款", "正品", "有货", "尺码", "发货", "付款",
+    "buy", "purchase", "order", "price", "how much", "cost", "shop", "cheap",
+    "discount", "deal", "in stock", "shipping",
+)
+NON_SHOPPING_TERMS = (
+    "你好", "您好", "谢谢", "天气", "笑话", "再见", "你是谁", "翻译", "作业",
+    "hello", "hi", "thanks", "thank you", "weather", "joke", "bye", "who are you",
+    "translate", "homework",
+)
+# Bag-of-n-grams can't tell "want to buy" from "don't want to buy"
+NEGATION_TERMS = (
+    "不要", "不想", "不用", "不需要", "不买", "别买", "没打算",
+    "not", "don t", "dont", "doesn t", "won t", "never", "no need",
+)
+
+_SEED_CORPUS: Tuple[Tuple[str, bool], ...] = (
+    ("代购", True),
+    ("帮我代购一双鞋", True),
+    ("我想买一双耐克跑鞋", True),
+    ("想买鞋", True),
+    ("这个多少钱", True),
+    ("多少钱", True),
+    ("这件衣服价格多少", True),
+    ("能帮我下单吗", True),
+    ("包邮吗", True),
+    ("有同款吗 要正品", True),
+    ("这个有货吗 什么时候发货", True),
+    ("我要买一个手机壳", True),
+    ("帮我找一下便宜的卫衣", True),
+    ("有没有优惠 打折吗", True),
+    ("尺码怎么选 我要下单", True),
+    ("怎么付款", True),
+    ("推荐一款跑鞋，想入手", True),
+    ("buy", True),
+    ("I want to buy new shoes", True),
+    ("how much is this", True),
+    ("what's the price", True),
+    ("can you help me order this jacket", True),
+    ("purchase a hoodie", True),
+    ("looking for cheap sneakers", True),
+    ("is this in stock", True),
+    ("any discount on this bag", True),
+    ("how much does shipping cost", True),
+    ("I'd like to shop for a watch", True),
+    ("你好", False),
+    ("您好", False),
+    ("谢谢", False),
+    ("今天天气怎么样", False),
+    ("讲个笑话", False),
+    ("再见", False),
+    ("你是谁", False),
+    ("帮我翻译这句话", False),
+    ("帮我写作业", False),
+    ("今天心情不好", False),
+    ("你叫什么名字", False),
+    ("明天会下雨吗", False),
+    ("hi", False),
+    ("hello", False),
+    ("thanks", False),
+    ("thank you so much", False),
+    ("what's the weather today", False),
+    ("tell me a joke", False),
+    ("bye", False),
+    ("who are you", False),
+    ("translate this sentence", False),
+    ("help me with my homework", False),
+    ("good morning", False),
+    ("what time is it", False),
+)
+
+############################################################
+# Features & model
+############################################################
+
+
+def _lexicon_hits(norm: str, terms: Iterable[str]) -> int:
+    padded = f" {norm} "
+    hits = 0
+    for term in terms:
+        # Latin terms must match whole words ("hi" ≠ "this"); CJK terms are substrings.
+        if term.isascii():
+            hits += f" {term} " in padded
+        else:
+            hits += term in norm
+    return hits
+
+
+def featurize(text: str) -> np.ndarray:
+    """Return the feature vector: hashed char n-grams + lexicon hit counts."""
+    norm = normalize_text(text)
+    vec = np.zeros(N_FEATURES + 2, dtype=np.float64)
+    padded = f" {norm} "
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(padded) - n + 1):
+            idx = zlib.crc32(padded[i : i + n].encode("utf-8")) % N_FEATURES
+            vec[idx] += 1.0
+    norm_len = np.linalg.norm(vec[:N_FEATURES])
+    if norm_len:
+        vec[:N_FEATURES] /= norm_len
+    vec[N_FEATURES] = _lexicon_hits(norm, SHOPPING_TERMS)
+    vec[N_FEATURES + 1] = _lexicon_hits(norm, NON_SHOPPING_TERMS)
+    return vec
+
+
+class IntentModel:
+    """Binary logistic regression trained with full-batch gradient descent."""
+
+    def __init__(self, l2: float = 1e-3, lr: float = 2.0, epochs: int = 300) -> None:
+        self.l2 = l2
+        self.lr = lr
+        self.epochs = epochs
+        self.weights = np.zeros(N_FEATURES + 2)
+        self.bias = 0.0
+
+    def fit(self, samples: List[Tuple[str, bool]]) -> "IntentModel":
+        X = np.stack([featurize(t) for t, _ in samples])
+        y = np.array([1.0 if label else 0.0 for _, label in samples])
+        w = np.zeros(X.shape[1])
+        b = 0.0
+        n = len(y)
+        for _ in range(self.epochs):
+            p = 1.0 / (1.0 + np.exp(-(X @ w + b)))
+            err = p - y
+            w -= self.lr * (X.T @ err / n + self.l2 * w)
+            b -= self.lr * float(err.mean())
+        self.weights, self.bias = w, b
+        return self
+
+    def predict_proba(self, text: str) -> float:
+        z = float(featurize(text) @ self.weights + self.bias)
+        return 1.0 / (1.0 + math.exp(-max(min(z, 50.0), -50.0)))
+
+
+_model: IntentModel | None = None
+_model_lock = threading.Lock()
+
+
+def _load_training_file() -> List[Tuple[str, bool]]:
+    if not INTENT_TRAINING_FILE or not os.path.exists(INTENT_TRAINING_FILE):
+        return []
+    samples: List[Tuple[str, bool]] = []
+    with open(INTENT_TRAINING_FILE, "r", encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                row = json.loads(line)
+                samples.append((str(row["text"]), bool(row["label"])))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return samples
+
+
+def get_model() -> IntentModel:
+    """Return the local model, training it on first use."""
+    global _model  # noqa: PLW0603
+    if _model is None:
+        with _model_lock:  # startup warm-up thread vs. first request
+            if _model is None:
+                _model = IntentModel().fit(list(_SEED_CORPUS) + _load_training_file())
+    return _model
+
+
+def classify(text: str) -> Tuple[Optional[bool], float]:
+    """Return (decision, probability); decision is None when not confident
+    or when *text* contains a negation. Inputs over INTENT_FASTPATH_MAX_CHARS
+    are deferred without being scored (probability 0.5)."""
+    if len(text) > INTENT_FASTPATH_MAX_CHARS:
+        return None, 0.5
+    prob = get_model().predict_proba(text)
+    if _lexicon_hits(normalize_text(text), NEGATION_TERMS):
+        return None, prob
+    if prob >= INTENT_FASTPATH_THRESHOLD:
+        return True, prob
+    if prob <= 1.0 - INTENT_FASTPATH_THRESHOLD:
+        return False, prob
+    return None, prob
+
+############################################################
+# Shadow bookkeeping
+############################################################
+
+_stats = {"local": 0, "deferred": 0, "compared": 0, "agreed": 0}
+
+
+def shadow_stats() -> Dict[str, Any]:
+    """Return fast-path counters and the local/LLM agreement rate."""
+    compared = _stats["compared"]
+    return {**_stats, "agreement_rate": _stats["agreed"] / compared if compared else None}
+
+
+def reset_stats() -> None:
+    for key in _stats:
+        _stats[key] = 0
+
+
+_training_file_lock = threading.Lock()
+
+
+def _append_training_row(path: str, text: str, label: bool) -> None:
+    line = json.dumps({"text": text, "label": label}, ensure_ascii=False) + "\n"
+    with _training_file_lock, open(path, "a", encoding="utf-8") as fh:
+        fh.write(line)
+
+
+async def _record_llm_answer(text: str, label: bool, local: Optional[bool]) -> None:
+    if local is not None:
+        _stats["compared"] += 1
+        _stats["agreed"] += local == label
+    if INTENT_TRAINING_FILE:
+        await asyncio.to_thread(_append_training_row, INTENT_TRAINING_FILE, text, label)
+
+############################################################
+# Public API
+############################################################
+
+
+async def detect_shopping_intent(text: str) -> Dict[str, Any]:
+    """Classify *text*, answering locally when confident and deferring otherwise."""
+    if INTENT_FASTPATH_MODE == "off" or not text or not text.strip():
+        return await llm_service.get_shopping_intent(text)
+
+    start = time.perf_counter()
+    decision, prob = classify(text)
+    STAGE_SECONDS.observe(
+        time.perf_counter() - start, "classify", "deferred" if decision is None else "confident"
+    )
+    if INTENT_FASTPATH_MODE != "shadow" and decision is not None:
+        _stats["local"] += 1
+        return {"shopping_intent": decision, "confidence": round(prob, 4), "source": "local"}
+
+    _stats["deferred"] += decision is None
+    try:
+        result = await llm_service.get_shopping_intent(text)
+    except QuotaExceededError:
+        if decision is None:
+            raise
+        # Shadow mode: skip the comparison, the local answer is still usable.
+        return {"shopping_intent": decision, "confidence": round(prob, 4), "source": "local"}
+    # LLM failures carry a "reason" and repeats come back "cached"; only
+    # fresh answers are useful as labels (and count once towards agreement).
+    if (
+        isinstance(result, dict)
+        and "reason" not in result
+        and not result.get("cached")
+        and "shopping_intent" in result
+    ):
+        await _record_llm_answer(text, bool(result["shopping_intent"]), decision)
+    return result
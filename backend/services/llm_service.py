@@ -1,75 +1,303 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-from typing import Any, Dict
+import re
+import time
+import unicodedata
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from ..config import settings
+from ..metrics import STAGE_SECONDS
+from . import product_store
+from .admission import QuotaExceededError
+from .cache import TTLCache
+from .resilience import fallback_reason, get_guard
 
-# Ensure environment variables are loaded when module imported
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENAI_BASE_URL = os.getenv("OPENAI_API_BASE", "https://openrouter.ai/api/v1")
+OPENROUTER_API_KEY = settings.openrouter_api_key
+OPENAI_BASE_URL = settings.openai_api_base
+LLM_MODEL = settings.llm_model
 
-if OPENROUTER_API_KEY is None:
-    raise RuntimeError(
-        "OPENROUTER_API_KEY not found. Please set it in your .env or system env vars."
+LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED", "0") == "1"
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "16"))
+LLM_BATCH_MAX_WAIT = float(os.getenv("LLM_BATCH_MAX_WAIT", "0.02"))
+
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "4096"))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "86400"))
+
+# Successful classifications keyed by normalize_text(text); hits/misses via stats()
+intent_cache = TTLCache(maxsize=INTENT_CACHE_SIZE, ttl=INTENT_CACHE_TTL)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Fold *text* so trivially different inputs share a cache key.
+
+    Applies NFKC (full-width → half-width), case folding, drops punctuation and
+    collapses whitespace. Falls back to the stripped text if nothing is left.
+    """
+    folded = unicodedata.normalize("NFKC", text).casefold()
+    folded = "".join(
+        " " if unicodedata.category(ch).startswith("P") else ch for ch in folded
     )
+    folded = _WHITESPACE.sub(" ", folded).strip()
+    return folded or text.strip()
 
-client = AsyncOpenAI(base_url=OPENAI_BASE_URL, api_key=OPENROUTER_API_KEY)
+############################################################
+# OpenRouter client
+############################################################
 
+_client: Optional["AsyncOpenAI"] = None
 
-async def get_shopping_intent(text: str) -> Dict[str, Any]:
-    """Determine whether *text* expresses shopping intent.
 
-    Returns a dict like {"shopping_intent": bool, ...optional reason }.
+def get_client() -> "AsyncOpenAI":
+    """Return the shared OpenRouter client, creating it on first use.
+
+    The `openai` SDK is imported here rather than at module import, so
+    processes that only serve product links never load it. Raises
+    RuntimeError when OPENROUTER_API_KEY is not configured; callers treat that
+    like any other LLM failure and answer with the fallback intent.
     """
-    if not text or not text.strip():
-        return {"shopping_intent": False, "reason": "Input text is empty."}
+    global _client  # noqa: PLW0603
+    if _client is None:
+        if not OPENROUTER_API_KEY:
+            raise RuntimeError(
+                "OPENROUTER_API_KEY not found. Please set it in your .env or system env vars."
+            )
+        from openai import AsyncOpenAI
 
-    try:
-        completion = await client.chat.completions.create(
-            model="anthropic/claude-3-haiku",
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "get_shopping_intent",
-                    "strict": True,
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "shopping_intent": {
-                                "type": "boolean",
-                                "description": "True if the user text expresses shopping intent, false otherwise.",
-                            }
-                        },
-                        "required": ["shopping_intent"],
+        _client = AsyncOpenAI(base_url=OPENAI_BASE_URL, api_key=OPENROUTER_API_KEY)
+    return _client
+
+
+def __getattr__(name: str) -> Any:
+    # `llm_service.client` predates get_client(); keep it working, lazily.
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+
+_SYSTEM_PROMPT = (
+    "Analyze the user's text to determine if it expresses a direct or"
+    " indirect intent to purchase an item. Respond with only a JSON"
+    " object containing a single key 'shopping_intent' which is a"
+    " boolean value (true or false)."
+)
+
+_BATCH_SYSTEM_PROMPT = (
+    "You will receive a JSON array of user texts. For each text, determine if"
+    " it expresses a direct or indirect intent to purchase an item. Respond"
+    " with only a JSON object containing a single key 'results': an array of"
+    " booleans with exactly one entry per input text, in the same order."
+)
+
+
+async def _complete_single(text: str) -> Dict[str, Any]:
+    """Classify one text in its own completion. Raises on API / JSON errors."""
+    completion = await get_guard("openrouter").call(
+        get_client().chat.completions.create,
+        model=LLM_MODEL,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "get_shopping_intent",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "shopping_intent": {
+                            "type": "boolean",
+                            "description": "True if the user text expresses shopping intent, false otherwise.",
+                        }
                     },
+                    "required": ["shopping_intent"],
                 },
             },
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Analyze the user's text to determine if it expresses a direct or"
-                        " indirect intent to purchase an item. Respond with only a JSON"
-                        " object containing a single key 'shopping_intent' which is a"
-                        " boolean value (true or false)."
-                    ),
+        },
+        messages=[
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": text},
+        ],
+        temperature=0,
+        max_tokens=50,
+    )
+    response_text = completion.choices[0].message.content
+    return json.loads(response_text)
+
+
+async def _complete_batch(texts: List[str]) -> List[bool]:
+    """Classify *texts* in one completion; raises ValueError on a malformed answer."""
+    completion = await get_guard("openrouter").call(
+        get_client().chat.completions.create,
+        model=LLM_MODEL,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "get_shopping_intents",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "results": {
+                            "type": "array",
+                            "items": {"type": "boolean"},
+                            "description": "Shopping intent per input text, in input order.",
+                        }
+                    },
+                    "required": ["results"],
                 },
-                {"role": "user", "content": text},
-            ],
-            temperature=0,
-            max_tokens=50,
+            },
+        },
+        messages=[
+            {"role": "system", "content": _BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(texts, ensure_ascii=False)},
+        ],
+        temperature=0,
+        max_tokens=20 + 8 * len(texts),
+    )
+    results = json.loads(completion.choices[0].message.content).get("results")
+    if not isinstance(results, list) or len(results) != len(texts):
+        raise ValueError("Batch response does not match the number of inputs.")
+    if not all(isinstance(r, bool) for r in results):
+        raise ValueError("Batch response contains non-boolean entries.")
+    return results
+
+
+class IntentBatcher:
+    """Collects concurrent classifications into one completion.
+
+    Texts submitted within *max_wait* seconds (or until *max_size* are queued)
+    are sent together; each caller gets its own result. If the batched answer
+    can't be used, every text falls back to a single call.
+    """
+
+    def __init__(self, max_size: int, max_wait: float) -> None:
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def submit(self, text: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        if len(batch) > 1:
+            try:
+                results = await _complete_batch(texts)
+            except Exception:  # noqa: BLE001
+                results = None
+            if results is not None:
+                for (_, fut), value in zip(batch, results):
+                    if not fut.done():
+                        fut.set_result({"shopping_intent": value})
+                return
+
+        outcomes = await asyncio.gather(
+            *(_complete_single(text) for text in texts), return_exceptions=True
         )
-        response_text = completion.choices[0].message.content
-        return json.loads(response_text)
+        for (_, fut), outcome in zip(batch, outcomes):
+            if fut.done():
+                continue
+            if isinstance(outcome, BaseException):
+                fut.set_exception(outcome)
+            else:
+                fut.set_result(outcome)
+
+
+_batcher = IntentBatcher(max_size=LLM_BATCH_MAX_SIZE, max_wait=LLM_BATCH_MAX_WAIT)
+
+
+async def get_shopping_intent(text: str) -> Dict[str, Any]:
+    """Determine whether *text* expresses shopping intent.
+
+    Returns a dict like {"shopping_intent": bool, ...optional reason }; when the
+    LLM is unavailable (errors, open "openrouter" circuit) the default answer is
+    flagged with ``fallback: True`` and a ``fallback_reason`` (``circuit_open``,
+    ``timeout``, ``upstream_error``, as for products). A spent OpenRouter quota raises
+    `QuotaExceededError`. Answers that didn't come from a completion made by
+    this call (cache, another worker) are flagged with ``cached: True``.
+    Answers are memoized in `intent_cache` by normalized text and shared with
+    the other worker processes through `product_store` (which also makes sure
+    only one of them asks the LLM about a given text at a time); with
+    LLM_BATCH_ENABLED=1 concurrent misses share micro-batched completions.
+    """
+    if not text or not text.strip():
+        return {"shopping_intent": False, "reason": "Input text is empty."}
+
+    key = normalize_text(text)
+    cached = intent_cache.get(key)
+    if cached is not None:
+        STAGE_SECONDS.observe(0.0, "llm", "cached")
+        return {**cached, "cached": True}
+
+    shared = await product_store.load_intent(key)
+    if shared is not None:
+        STAGE_SECONDS.observe(0.0, "llm", "shared")
+        intent_cache.set(key, shared)
+        return {**shared, "cached": True}
+
+    fresh = False
+
+    async def classify() -> Dict[str, Any]:
+        nonlocal fresh
+        if LLM_BATCH_ENABLED:
+            answer = await _batcher.submit(text)
+        else:
+            answer = await _complete_single(text)
+        await product_store.save_intent(key, answer, INTENT_CACHE_TTL)
+        fresh = True
+        return answer
+
+    start = time.perf_counter()
+    try:
+        result = await product_store.coalesce(f"intent:{key}", lambda: product_store.load_intent(key), classify)
+    except QuotaExceededError:
+        # Surfaced to the client as 429 rather than answered with a default.
+        STAGE_SECONDS.observe(time.perf_counter() - start, "llm", "quota_exceeded")
+        raise
     except json.JSONDecodeError:
-        return {"shopping_intent": False, "reason": "Failed to decode JSON from model response."}
+        STAGE_SECONDS.observe(time.perf_counter() - start, "llm", "fallback")
+        return {
+            "shopping_intent": False,
+            "reason": "Failed to decode JSON from model response.",
+            "fallback": True,
+            "fallback_reason": "upstream_error",
+        }
     except Exception as exc:  # noqa: BLE001
+        STAGE_SECONDS.observe(time.perf_counter() - start, "llm", "fallback")
         return {
             "shopping_intent": False,
             "reason": f"An error occurred while calling LLM: {exc}",
-        } 
\ No newline at end of file
+            "fallback": True,
+            "fallback_reason": fallback_reason(exc),
+        }
+    STAGE_SECONDS.observe(time.perf_counter() - start, "llm", "real")
+
+    # Only well-formed answers are cached; errors fall through uncached.
+    intent_cache.set(key, result)
+    return dict(result) if fresh else {**result, "cached": True}
@@ -1,29 +1,155 @@
+import os
 import re
-from typing import Dict, List
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-URL_REGEX = re.compile(r"https?://[^\s]+", re.IGNORECASE)
+from ..metrics import STAGE_SECONDS
 
-# Supported e-commerce platforms and simple hostname matchers
-PLATFORM_RULES = {
-    "taobao": re.compile(r"(taobao\.com|tb\.cn)", re.IGNORECASE),
-    "1688": re.compile(r"(1688\.com)", re.IGNORECASE),
-    "weidian": re.compile(r"(weidian\.com)", re.IGNORECASE),
+# URLs are runs of printable ASCII, so a link glued to Chinese text or
+# full-width punctuation ("…?id=1。这个") ends where the ASCII run ends.
+URL_REGEX = re.compile(r"https?://[!-~]+", re.IGNORECASE)
+_TRAILING_PUNCT = ".,;:!?)]}>'\""
+
+# Supported e-commerce platforms keyed by registrable host
+PLATFORM_HOSTS = {
+    "taobao.com": "taobao",
+    "tb.cn": "taobao",
+    "tmall.com": "taobao",  # Tmall items share Taobao's ID space and lookup
+    "1688.com": "1688",
+    "weidian.com": "weidian",
+}
+
+# Canonical product page per platform, formatted with the product ID
+CANONICAL_URLS = {
+    "taobao": "https://item.taobao.com/item.htm?id={}",
+    "1688": "https://detail.1688.com/offer/{}.html",
+    "weidian": "https://weidian.com/item.html?itemID={}",
+}
+_PRODUCT_ID_FORMAT = {
+    "taobao": re.compile(r"\d+"),
+    "1688": re.compile(r"\d+"),
+    "weidian": re.compile(r"\w+"),
 }
 
+_TAOBAO_ID = re.compile(r"(?:^|&)id=(\d+)")
+_1688_ID = re.compile(r"offer/(\d+)")
+_WEIDIAN_ID = re.compile(r"(?:^|&)itemid=(\w+)", re.IGNORECASE)
+
+# Query parameters that only carry tracking / share attribution
+_TRACKING_PARAMS = re.compile(
+    r"^(spm|scm|pvid|utparam|ali_trackid|ali_refid|share_crt_v|sp_tk|suid|ut_sk"
+    r"|wxsign|abbucket|utm_\w+)$",
+    re.IGNORECASE,
+)
+
+PREPROCESS_MAX_CHARS = int(os.getenv("PREPROCESS_MAX_CHARS", "20000"))
+PREPROCESS_MAX_LINKS = int(os.getenv("PREPROCESS_MAX_LINKS", "50"))
+
+
+@dataclass(frozen=True)
+class ProductLink:
+    """A supported product URL as found in user input."""
+
+    url: str
+    platform: str
+    product_id: Optional[str]
+    canonical_url: str
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        """De-duplication key: product ID when known, else the canonical URL."""
+        return (self.platform, self.product_id or self.canonical_url)
+
+
+def _platform_for_host(host: str) -> str | None:
+    host = host.lower().rstrip(".")
+    while host:
+        platform = PLATFORM_HOSTS.get(host)
+        if platform:
+            return platform
+        _, _, host = host.partition(".")
+    return None
+
+
+def _strip_tracking(parts) -> str:
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(k)
+    ]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+@lru_cache(maxsize=4096)
+def parse_product_url(url: str) -> Optional[ProductLink]:
+    """Return platform, product ID and canonical URL for *url*, or None if unsupported."""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    platform = _platform_for_host(parts.hostname or "")
+    if platform is None:
+        return None
+
+    if platform == "taobao":
+        m = _TAOBAO_ID.search(parts.query)
+    elif platform == "1688":
+        m = _1688_ID.search(parts.path)
+    else:
+        m = _WEIDIAN_ID.search(parts.query)
+    product_id = m.group(1) if m else None
+
+    return ProductLink(
+        url=url,
+        platform=platform,
+        product_id=product_id,
+        canonical_url=CANONICAL_URLS[platform].format(product_id) if product_id else _strip_tracking(parts),
+    )
+
+
+def product_link(platform: str, product_id: str) -> Optional[ProductLink]:
+    """Return the canonical link for a known product, or None if unsupported/malformed."""
+    id_format = _PRODUCT_ID_FORMAT.get(platform)
+    if id_format is None or not id_format.fullmatch(product_id or ""):
+        return None
+    url = CANONICAL_URLS[platform].format(product_id)
+    return ProductLink(url=url, platform=platform, product_id=product_id, canonical_url=url)
+
+
+def scan(text: str) -> Tuple[List[str], Dict[str, List[str]], List[ProductLink]]:
+    """Single pass over *text* returning ``(urls, platform_map, links)``.
+
+    *links* holds one ProductLink per unique supported product in input order,
+    capped at PREPROCESS_MAX_LINKS.
+    """
+    urls: List[str] = []
+    platform_map: Dict[str, List[str]] = {}
+    links: Dict[Tuple[str, str], ProductLink] = {}
+    for m in URL_REGEX.finditer(text):
+        url = m.group(0).rstrip(_TRAILING_PUNCT)
+        urls.append(url)
+        link = parse_product_url(url)
+        if link is None:
+            continue
+        platform_map.setdefault(link.platform, []).append(url)
+        if len(links) < PREPROCESS_MAX_LINKS:
+            links.setdefault(link.key, link)
+    return urls, platform_map, list(links.values())
+
 
 def extract_urls(text: str) -> List[str]:
     """Return all URLs found in *text*."""
     if not text:
         return []
-    return URL_REGEX.findall(text)
+    return scan(text)[0]
 
 
 def detect_platform(url: str) -> str | None:
     """Return platform key if URL matches our supported platforms, else None."""
-    for name, pattern in PLATFORM_RULES.items():
-        if pattern.search(url):
-            return name
-    return None
+    link = parse_product_url(url)
+    return link.platform if link else None
 
 
 def preprocess_input(text: str) -> Dict[str, object]:
@@ -33,26 +159,24 @@ def preprocess_input(text: str) -> Dict[str, object]:
     - type: "url" | "text"
     - urls: list[str] of extracted URLs (may be empty)
     - platform_map: mapping of platform name -> list[urls]
+    - links: list[ProductLink], one per unique supported product, in input order
     - content: Original text (trimmed)
     - skip_llm: bool – True when we can bypass LLM because at least one supported URL exists.
     """
     if text is None:
         text = ""
-    text = text.strip()
-
-    urls = extract_urls(text)
-    platform_map: dict[str, list[str]] = {}
-    for u in urls:
-        platform = detect_platform(u)
-        if platform:
-            platform_map.setdefault(platform, []).append(u)
+    # Guard against pathological pastes: only the first PREPROCESS_MAX_CHARS count.
+    text = text.strip()[:PREPROCESS_MAX_CHARS]
 
+    with STAGE_SECONDS.time("preprocess", "ok"):
+        urls, platform_map, links = scan(text)
     has_supported_urls = bool(platform_map)
 
     return {
         "type": "url" if has_supported_urls else "text",
         "urls": urls,
         "platform_map": platform_map,
+        "links": links,
         "content": text,
         "skip_llm": has_supported_urls,
-    } 
\ No newline at end of file
+    }
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+"""Concurrent product lookups for URLs found in user input.
+
+Fans the per-link `fetch_product_detail` calls out across the platform
+services with a concurrency cap per platform and bounds the whole batch by an
+overall deadline. Links arrive de-duplicated from `preprocess_input`; results
+come back in the order the links appeared in the user's text. Every lookup is
+counted for the background `refresher`.
+"""
+
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+import time
+
+from ..metrics import PRODUCT_FETCH_SECONDS
+from . import daji_service, refresher, short_links, weidian_service
+from .preprocessor import ProductLink
+from .product_model import Product, ProductLike
+
+PRODUCT_LOOKUP_DEADLINE = float(os.getenv("PRODUCT_LOOKUP_DEADLINE", "25"))
+PRODUCT_LOOKUP_CONCURRENCY = int(os.getenv("PRODUCT_LOOKUP_CONCURRENCY", "4"))
+
+# Per-platform caps, e.g. PRODUCT_LOOKUP_CONCURRENCY_WEIDIAN=2
+PLATFORM_CONCURRENCY: Dict[str, int] = {
+    platform: int(
+        os.getenv(f"PRODUCT_LOOKUP_CONCURRENCY_{platform.upper()}", PRODUCT_LOOKUP_CONCURRENCY)
+    )
+    for platform in ("taobao", "1688", "weidian")
+}
+
+Fetcher = Callable[[str], Awaitable[ProductLike]]
+
+############################################################
+# Helpers
+############################################################
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+_semaphore_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _semaphore(platform: str) -> asyncio.Semaphore:
+    """Return the semaphore capping lookups for *platform* on the running loop."""
+    global _semaphore_loop  # noqa: PLW0603
+    loop = asyncio.get_running_loop()
+    if loop is not _semaphore_loop:
+        # asyncio primitives are bound to one loop; start afresh on a new one.
+        _semaphores.clear()
+        _semaphore_loop = loop
+    sem = _semaphores.get(platform)
+    if sem is None:
+        sem = asyncio.Semaphore(max(1, PLATFORM_CONCURRENCY.get(platform, PRODUCT_LOOKUP_CONCURRENCY)))
+        _semaphores[platform] = sem
+    return sem
+
+
+def _fetcher(platform: str) -> Optional[Fetcher]:
+    # Resolved at call time so the service functions can be swapped in tests.
+    if platform in ("taobao", "1688"):
+        return daji_service.fetch_product_detail
+    if platform == "weidian":
+        return weidian_service.fetch_product_detail
+    return None
+
+
+async def _lookup(link: ProductLink) -> Optional[ProductLike]:
+    if short_links.is_short_link(link):
+        # Without resolution the services could only guess a product.
+        try:
+            resolved = await short_links.resolve(link)
+        except Exception:  # noqa: BLE001
+            resolved = None
+        if resolved is None:
+            return None
+        link = resolved
+    fetch = _fetcher(link.platform)
+    if fetch is None:
+        return None
+    refresher.record(link.platform, link.product_id)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        async with _semaphore(link.platform):
+            product = await fetch(link.canonical_url)
+        outcome = "fallback" if _is_fallback(product) else "real"
+        return product
+    except asyncio.CancelledError:
+        outcome = "cancelled"  # batch deadline passed
+        raise
+    finally:
+        PRODUCT_FETCH_SECONDS.observe(time.perf_counter() - start, link.platform, outcome)
+
+
+def _is_fallback(product: Optional[ProductLike]) -> bool:
+    if isinstance(product, Product):
+        return product.fallback
+    return not product or bool(product.get("fallback"))
+
+############################################################
+# Public API
+############################################################
+
+
+async def iter_products(
+    links: List[ProductLink],
+    deadline: float | None = None,
+) -> AsyncIterator[Tuple[int, ProductLike]]:
+    """Yield ``(index, product)`` as each lookup completes.
+
+    *links* are the unique product links from `preprocess_input` and *index*
+    is the position of the link in that list. Lookups still running when
+    *deadline* seconds have elapsed (or when the consumer stops iterating) are
+    cancelled.
+    """
+    if not links:
+        return
+
+    tasks = {asyncio.ensure_future(_lookup(link)): i for i, link in enumerate(links)}
+    loop = asyncio.get_running_loop()
+    end = loop.time() + (PRODUCT_LOOKUP_DEADLINE if deadline is None else deadline)
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=tasks.__getitem__):
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                prod = task.result()
+                if prod:
+                    yield tasks[task], prod
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def fetch_products(
+    links: List[ProductLink],
+    deadline: float | None = None,
+) -> List[ProductLike]:
+    """Fetch product details for every link concurrently, in input order.
+
+    Lookups still running when *deadline* seconds have elapsed are cancelled
+    and left out of the result.
+    """
+    return (await fetch_products_many([links], deadline))[0]
+
+
+async def fetch_products_many(
+    inputs: List[List[ProductLink]],
+    deadline: float | None = None,
+) -> List[List[ProductLike]]:
+    """Like `fetch_products` for several inputs at once.
+
+    Every product is looked up once across all *inputs* (sharing concurrency
+    caps and the deadline); each input gets back its own products in its own
+    link order.
+    """
+    unique: Dict[Tuple[str, str], int] = {}
+    plan: List[ProductLink] = []
+    for links in inputs:
+        for link in links:
+            if link.key not in unique:
+                unique[link.key] = len(plan)
+                plan.append(link)
+
+    found: Dict[int, ProductLike] = {}
+    async for index, prod in iter_products(plan, deadline):
+        found[index] = prod
+
+    results: List[List[ProductLike]] = []
+    for links in inputs:
+        indices = [unique[link.key] for link in links]
+        results.append([found[i] for i in indices if i in found])
+    return results
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+"""Compact product model shared by the platform services.
+
+Upstream payloads (Daji, Weidian RapidAPI) are tens of KB of SKU trees,
+descriptions and image lists; the services reduce them to a `Product` as soon
+as they are decoded, so only these fields are cached and carried through a
+request. `to_dict` renders the contract `Product` schema; optional fields are
+added only when asked for (``fields=image,shopName``).
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+import re
+
+from .preprocessor import ProductLink
+
+# Contract name → attribute for fields rendered only on request
+OPTIONAL_FIELDS = {
+    "image": "image",
+    "images": "images",
+    "shopName": "shop_name",
+    "sales": "sales",
+}
+MAX_IMAGES = 10
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+@dataclass(frozen=True, slots=True)
+class Product:
+    platform: str
+    product_id: str
+    title: str
+    price: Optional[float]
+    url: str
+    image: Optional[str] = None
+    images: Tuple[str, ...] = field(default=())
+    shop_name: Optional[str] = None
+    sales: Optional[int] = None
+    fallback: bool = False
+    fallback_reason: Optional[str] = None
+
+    def to_dict(self, fields: Iterable[str] = ()) -> Dict[str, Any]:
+        """Render as the contract `Product`, plus any requested optional fields."""
+        out: Dict[str, Any] = {
+            "platform": self.platform,
+            "productId": self.product_id,
+            "title": self.title,
+            "price": self.price,
+            "url": self.url,
+        }
+        for name in fields:
+            value = getattr(self, OPTIONAL_FIELDS[name])
+            if value is not None:
+                out[name] = list(value) if isinstance(value, tuple) else value
+        if self.fallback:
+            out["fallback"] = True
+            out["fallbackReason"] = self.fallback_reason
+        return out
+
+
+ProductLike = Union[Product, Mapping[str, Any]]
+
+
+def serialize(product: ProductLike, fields: Iterable[str] = ()) -> Dict[str, Any]:
+    """Render *product*; plain mappings (e.g. from custom fetchers) pass through."""
+    if isinstance(product, Product):
+        return product.to_dict(fields)
+    return dict(product)
+
+
+def parse_fields(spec: Optional[str]) -> Tuple[str, ...]:
+    """Parse a ``fields=`` query value. Raises ValueError on unknown names."""
+    if not spec:
+        return ()
+    names = tuple(f.strip() for f in spec.split(",") if f.strip())
+    unknown = [n for n in names if n not in OPTIONAL_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(OPTIONAL_FIELDS)}"
+        )
+    return names
+
+############################################################
+# Normalization of upstream payloads
+############################################################
+
+
+class UnrecognisedPayloadError(ValueError):
+    """A successful upstream answer that holds no product (delisted item,
+    ``{"code": 4004, "msg": "item not found"}``).
+
+    ``status_code`` makes circuit breakers treat it like a 4xx: the upstream
+    is healthy, the item just isn't there.
+    """
+
+    status_code = 404
+
+
+def normalize(
+    raw: Any,
+    link: ProductLink,
+    paths: Sequence[Sequence[str]],
+    keys: Mapping[str, Sequence[str]],
+) -> Product:
+    """Pick the `Product` fields out of an upstream payload.
+
+    *paths* lists the nested objects to look in (most specific first) and
+    *keys* the candidate keys for each of title, price, image, images, shop
+    and sales. Raises `UnrecognisedPayloadError` when no title can be found.
+    """
+    nodes = _containers(raw, paths)
+    title = _first(nodes, keys["title"])
+    if not isinstance(title, str):
+        raise UnrecognisedPayloadError(f"Unrecognised {link.platform} payload for {link.product_id}")
+    images = _to_images(_first(nodes, keys["images"]))
+    image = _to_images(_first(nodes, keys["image"])) or images
+    shop = _first(nodes, keys["shop"])
+    return Product(
+        platform=link.platform,
+        product_id=link.product_id or "",
+        title=title,
+        price=_to_price(_first(nodes, keys["price"])),
+        url=link.canonical_url,
+        image=image[0] if image else None,
+        images=images,
+        shop_name=shop if isinstance(shop, str) else None,
+        sales=_to_int(_first(nodes, keys["sales"])),
+    )
+
+
+def _containers(raw: Any, paths: Sequence[Sequence[str]]) -> List[Mapping[str, Any]]:
+    """Return the dicts found at each key path of *raw* (missing paths skipped)."""
+    found: List[Mapping[str, Any]] = []
+    for path in paths:
+        node = raw
+        for key in path:
+            node = node.get(key) if isinstance(node, Mapping) else None
+        if isinstance(node, Mapping):
+            found.append(node)
+    return found
+
+
+def _first(nodes: Sequence[Mapping[str, Any]], keys: Sequence[str]) -> Any:
+    """Return the first non-empty value among *keys* across *nodes*."""
+    for node in nodes:
+        for key in keys:
+            value = node.get(key)
+            if value not in (None, "", [], {}):
+                return value
+    return None
+
+
+def _to_price(value: Any) -> Optional[float]:
+    """Parse a price such as 699, "699.00" or a range "10.5-20" (lower bound)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, Mapping):
+        return _to_price(_first([value], ("price", "value", "amount")))
+    if isinstance(value, str):
+        m = _NUMBER.search(value)
+        return float(m.group(0)) if m else None
+    return None
+
+
+def _to_int(value: Any) -> Optional[int]:
+    price = _to_price(value)
+    return int(price) if price is not None else None
+
+
+def _to_images(value: Any) -> Tuple[str, ...]:
+    """Return up to MAX_IMAGES image URLs from a list / string / dict value."""
+    if isinstance(value, str):
+        return (_https(value),)
+    if isinstance(value, Mapping):
+        return _to_images(_first([value], ("images", "url", "imageUrl")))
+    if isinstance(value, list):
+        return tuple(_flatten_images(value))[:MAX_IMAGES]
+    return ()
+
+
+def _flatten_images(items: List[Any]) -> Iterator[str]:
+    for item in items:
+        for url in _to_images(item):
+            yield url
+
+
+def _https(url: str) -> str:
+    return f"https:{url}" if url.startswith("//") else url
@@ -0,0 +1,462 @@
+from __future__ import annotations
+
+"""Persistent product-detail store shared by restarts and local workers.
+
+A SQLite file (PRODUCT_STORE_DB, WAL mode) sits between `product_cache` and
+the upstream APIs: the platform services load misses through `read_through`,
+which serves an unexpired stored product or fetches it and writes it back.
+Stored entries expire PRODUCT_STORE_TTL seconds after they were fetched
+(wall-clock, so every process on the host agrees); fallback data is never
+stored. The TTL defaults to PRODUCT_CACHE_TTL so that when an in-process entry
+goes stale its refresh reaches upstream instead of being answered from an
+older stored row; raise it to trade freshness for fewer upstream calls.
+
+Every store read or write counts towards a row's ``hits``. Reads are plain
+SELECTs: their hits are tallied in memory and written back in one batch
+(after PRODUCT_STORE_HIT_FLUSH distinct keys, at compaction and on close),
+so lookups never queue on SQLite's single writer. `startup()` warms
+`product_cache` with the PRODUCT_STORE_WARM_SIZE hottest unexpired rows and
+starts a compaction loop (every PRODUCT_STORE_COMPACT_INTERVAL seconds) that
+drops expired rows, trims the table to PRODUCT_STORE_MAX_ROWS by hotness,
+halves the hit counts so hotness tracks recent demand, and returns freed
+pages to the OS.
+
+The same file lets worker processes on one host (WEB_CONCURRENCY > 1) share
+work without an external cache:
+
+- `coalesce` is single-flight across processes: the first process to miss a
+  key takes a lease on it (PRODUCT_STORE_LEASE_TTL seconds, by default long
+  enough for the slowest upstream call UPSTREAM_TIMEOUT_MAX allows, so a
+  slow upstream doesn't make waiters give up and call it too) and fetches;
+  the others poll the store every PRODUCT_STORE_LEASE_POLL seconds for its
+  result instead of calling upstream too. A holder whose result isn't stored
+  (fallback data, errors) releases the lease and the next waiter fetches.
+  Leases are on by default only with several workers; set the TTL when
+  separately started servers share one file.
+- LLM intent answers are kept in an ``intent`` table next to the products
+  (`load_intent` / `save_intent`), so every worker reuses them. Like leases
+  this is on by default only with several workers
+  (PRODUCT_STORE_SHARE_INTENTS), sparing a single worker a SQLite round
+  trip per uncached text.
+- Compaction runs in one worker per interval, whichever takes its lease.
+"""
+
+from pathlib import Path
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from ..config import settings
+from ..fastjson import dumps, loads
+from .cache import PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL, TTLCache, product_cache
+from .product_model import Product
+from .resilience import UPSTREAM_TIMEOUT_MAX
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+PRODUCT_STORE_ENABLED = os.getenv("PRODUCT_STORE_ENABLED", "1") == "1"
+PRODUCT_STORE_DB = os.getenv("PRODUCT_STORE_DB", str(BASE_DIR / "data" / "products.sqlite3"))
+PRODUCT_STORE_TTL = float(os.getenv("PRODUCT_STORE_TTL", str(PRODUCT_CACHE_TTL)))
+PRODUCT_STORE_MAX_ROWS = int(os.getenv("PRODUCT_STORE_MAX_ROWS", "200000"))
+PRODUCT_STORE_WARM_SIZE = int(os.getenv("PRODUCT_STORE_WARM_SIZE", str(min(PRODUCT_CACHE_SIZE, 1024))))
+PRODUCT_STORE_COMPACT_INTERVAL = float(os.getenv("PRODUCT_STORE_COMPACT_INTERVAL", "3600"))
+PRODUCT_STORE_HIT_FLUSH = int(os.getenv("PRODUCT_STORE_HIT_FLUSH", "1000"))
+# Longest a lease holder may legitimately take: a guarded upstream call is
+# cut off after UPSTREAM_TIMEOUT_MAX (hedges included), an LLM batch that
+# falls back to single calls makes two, plus time to store the result
+_LEASE_HOLD_MAX = 2 * UPSTREAM_TIMEOUT_MAX + 5
+# Leases only pay off with several processes on the file (0 disables them)
+PRODUCT_STORE_LEASE_TTL = float(
+    os.getenv("PRODUCT_STORE_LEASE_TTL", str(_LEASE_HOLD_MAX) if settings.workers > 1 else "0")
+)
+PRODUCT_STORE_LEASE_POLL = float(os.getenv("PRODUCT_STORE_LEASE_POLL", "0.02"))
+# Likewise intent sharing: a lone worker's intent_cache already holds every answer
+PRODUCT_STORE_SHARE_INTENTS = os.getenv("PRODUCT_STORE_SHARE_INTENTS", "1" if settings.workers > 1 else "0") == "1"
+
+_STORED_FIELDS = ("title", "price", "url", "image", "images", "shop_name", "sales")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS product (
+    platform TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (platform, product_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS intent (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lease (
+    key TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+T = TypeVar("T")
+Fetch = Callable[[], Awaitable[Product]]
+
+
+def _encode(product: Product) -> str:
+    return dumps({name: getattr(product, name) for name in _STORED_FIELDS}).decode("utf-8")
+
+
+def _decode(platform: str, product_id: str, data: str) -> Product:
+    fields = loads(data)
+    fields["images"] = tuple(fields.get("images") or ())
+    return Product(platform=platform, product_id=product_id, **fields)
+
+############################################################
+# On-disk store
+############################################################
+
+
+class ProductStore:
+    """SQLite-backed product table; the file is opened on first use."""
+
+    def __init__(self, path: str, ttl: float = PRODUCT_STORE_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._hits: Dict[Tuple[str, str], int] = {}  # read hits not yet written back
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, platform: str, product_id: str, hit: bool = True) -> Optional[Product]:
+        """Return the stored product unless missing or expired (*hit* counts towards its hotness)."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT data FROM product WHERE platform = ? AND product_id = ? AND expires_at > ?",
+                (platform, product_id, time.time()),
+            ).fetchone()
+            if row and hit:
+                key = (platform, product_id)
+                self._hits[key] = self._hits.get(key, 0) + 1
+                if len(self._hits) >= PRODUCT_STORE_HIT_FLUSH:
+                    self._flush_hits(conn)
+        return _decode(platform, product_id, row[0]) if row else None
+
+    def _flush_hits(self, conn: sqlite3.Connection) -> None:
+        # Caller holds self._lock.
+        if not self._hits:
+            return
+        pending, self._hits = self._hits, {}
+        with conn:
+            conn.executemany(
+                "UPDATE product SET hits = hits + ? WHERE platform = ? AND product_id = ?",
+                [(n, platform, product_id) for (platform, product_id), n in pending.items()],
+            )
+
+    def flush_hits(self) -> None:
+        """Write tallied read hits back to the table."""
+        with self._lock:
+            self._flush_hits(self._connect())
+
+    def put(self, product: Product) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO product (platform, product_id, data, fetched_at, expires_at, hits)"
+                    " VALUES (?, ?, ?, ?, ?, 1)"
+                    " ON CONFLICT (platform, product_id) DO UPDATE SET data = excluded.data,"
+                    " fetched_at = excluded.fetched_at, expires_at = excluded.expires_at, hits = hits + 1",
+                    (product.platform, product.product_id, _encode(product), now, now + self.ttl),
+                )
+
+    def expires_in(self, platform: str, product_id: str) -> Optional[float]:
+        """Seconds until the stored entry expires (negative once expired); None if absent."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT expires_at FROM product WHERE platform = ? AND product_id = ?",
+                (platform, product_id),
+            ).fetchone()
+        return row[0] - time.time() if row else None
+
+    def hottest(self, limit: int) -> List[Tuple[Product, float]]:
+        """The *limit* most-hit unexpired products with their seconds left."""
+        now = time.time()
+        with self._lock:
+            self._flush_hits(self._connect())
+            rows = self._connect().execute(
+                "SELECT platform, product_id, data, expires_at FROM product"
+                " WHERE expires_at > ? ORDER BY hits DESC, fetched_at DESC LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return [(_decode(p, pid, data), expires_at - now) for p, pid, data, expires_at in rows]
+
+    def compact(self, max_rows: int = PRODUCT_STORE_MAX_ROWS) -> int:
+        """Drop expired and surplus cold rows, decay hit counts; returns rows removed."""
+        with self._lock:
+            conn = self._connect()
+            self._flush_hits(conn)
+            with conn:
+                removed = conn.execute("DELETE FROM product WHERE expires_at <= ?", (time.time(),)).rowcount
+                excess = conn.execute("SELECT COUNT(*) FROM product").fetchone()[0] - max_rows
+                if excess > 0:
+                    removed += conn.execute(
+                        "DELETE FROM product WHERE (platform, product_id) IN ("
+                        " SELECT platform, product_id FROM product ORDER BY hits, fetched_at LIMIT ?)",
+                        (excess,),
+                    ).rowcount
+                conn.execute("UPDATE product SET hits = hits / 2 WHERE hits > 0")
+                conn.execute("DELETE FROM intent WHERE expires_at <= ?", (time.time(),))
+                conn.execute("DELETE FROM lease WHERE expires_at <= ?", (time.time(),))
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA incremental_vacuum")
+        return removed
+
+    def get_intent(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT data FROM intent WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return loads(row[0]) if row else None
+
+    def put_intent(self, key: str, result: Dict[str, Any], ttl: float) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO intent (key, data, expires_at) VALUES (?, ?, ?)",
+                    (key, dumps(result).decode("utf-8"), time.time() + ttl),
+                )
+
+    def claim(self, key: str, token: str, ttl: float) -> bool:
+        """Take the lease on *key* for *ttl* seconds unless another holder's is still live."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                return conn.execute(
+                    "INSERT INTO lease (key, token, expires_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT (key) DO UPDATE SET token = excluded.token,"
+                    " expires_at = excluded.expires_at WHERE lease.expires_at <= ?",
+                    (key, token, now + ttl, now),
+                ).rowcount == 1
+
+    def release(self, key: str, token: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM lease WHERE key = ? AND token = ?", (key, token))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM product").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_hits(self._conn)
+                except sqlite3.Error:
+                    logger.warning("product store hit flush failed", exc_info=True)
+                self._conn.close()
+                self._conn = None
+
+
+store = ProductStore(PRODUCT_STORE_DB)
+
+############################################################
+# Public API
+############################################################
+
+
+async def _stored(platform: str, product_id: str, hit: bool = True) -> Optional[Product]:
+    try:
+        return await asyncio.to_thread(store.get, platform, product_id, hit)
+    except sqlite3.Error:
+        logger.warning("product store read failed", exc_info=True)
+        return None
+
+
+async def read_through(platform: str, product_id: str, fetch: Fetch) -> Product:
+    """Return the stored product, else ``await fetch()`` and store the result.
+
+    Concurrent misses in other worker processes wait for this one's fetch
+    (see `coalesce`). Store errors are logged and never fail the lookup.
+    """
+    if not PRODUCT_STORE_ENABLED:
+        return await fetch()
+    stored = await _stored(platform, product_id)
+    if stored is not None:
+        return stored
+
+    async def fetch_and_save() -> Product:
+        product = await fetch()
+        await save(product)
+        return product
+
+    return await coalesce(
+        f"product:{platform}:{product_id}",
+        lambda: _stored(platform, product_id, False),
+        fetch_and_save,
+    )
+
+
+async def save(product: Product) -> None:
+    """Write a freshly fetched product to the store (fallback data is skipped)."""
+    if not PRODUCT_STORE_ENABLED or product.fallback:
+        return
+    try:
+        await asyncio.to_thread(store.put, product)
+    except sqlite3.Error:
+        logger.warning("product store write failed", exc_info=True)
+
+
+async def load_intent(key: str) -> Optional[Dict[str, Any]]:
+    """The intent answer another worker (or an earlier run) stored for *key*."""
+    if not PRODUCT_STORE_ENABLED or not PRODUCT_STORE_SHARE_INTENTS:
+        return None
+    try:
+        return await asyncio.to_thread(store.get_intent, key)
+    except sqlite3.Error:
+        logger.warning("intent store read failed", exc_info=True)
+        return None
+
+
+async def save_intent(key: str, result: Dict[str, Any], ttl: float) -> None:
+    if not PRODUCT_STORE_ENABLED or not PRODUCT_STORE_SHARE_INTENTS:
+        return
+    try:
+        await asyncio.to_thread(store.put_intent, key, result, ttl)
+    except sqlite3.Error:
+        logger.warning("intent store write failed", exc_info=True)
+
+############################################################
+# Cross-process single-flight
+############################################################
+
+
+async def _claim(key: str, token: str, ttl: float = PRODUCT_STORE_LEASE_TTL) -> bool:
+    try:
+        return await asyncio.to_thread(store.claim, key, token, ttl)
+    except sqlite3.Error:
+        logger.warning("lease claim failed", exc_info=True)
+        return True  # no coordination beats no answer
+
+
+@asynccontextmanager
+async def lease(key: str) -> AsyncIterator[bool]:
+    """Hold the cross-process lease on *key* for the block; yields False if another holder has it."""
+    token = uuid.uuid4().hex
+    if not PRODUCT_STORE_ENABLED or PRODUCT_STORE_LEASE_TTL <= 0:
+        yield True
+        return
+    held = await _claim(key, token)
+    try:
+        yield held
+    finally:
+        if held:
+            try:
+                await asyncio.to_thread(store.release, key, token)
+            except sqlite3.Error:
+                logger.warning("lease release failed", exc_info=True)
+
+
+async def coalesce(
+    key: str,
+    lookup: Callable[[], Awaitable[Optional[T]]],
+    fetch: Callable[[], Awaitable[T]],
+) -> T:
+    """``await fetch()`` in one process at a time per *key*; others get ``await lookup()``.
+
+    *fetch* must leave its result where *lookup* finds it. A process that
+    can't take the lease polls *lookup* until it returns something, the lease
+    frees up (then it checks *lookup* once more and fetches itself) or
+    PRODUCT_STORE_LEASE_TTL passes.
+    """
+    if not PRODUCT_STORE_ENABLED or PRODUCT_STORE_LEASE_TTL <= 0:
+        return await fetch()
+    loop = asyncio.get_running_loop()
+    give_up = loop.time() + PRODUCT_STORE_LEASE_TTL
+    waited = False
+    while True:
+        async with lease(key) as held:
+            if held:
+                # The previous holder may have stored its result between our
+                # last poll and its release
+                found = await lookup() if waited else None
+                return found if found is not None else await fetch()
+        waited = True
+        await asyncio.sleep(PRODUCT_STORE_LEASE_POLL)
+        found = await lookup()
+        if found is not None:
+            return found
+        if loop.time() >= give_up:
+            return await fetch()
+
+
+def warm(cache: TTLCache = product_cache, limit: int = PRODUCT_STORE_WARM_SIZE) -> int:
+    """Load the hottest stored products into *cache*; returns how many."""
+    loaded = 0
+    for product, remaining in store.hottest(limit):
+        cache.set((product.platform, product.product_id), product, ttl=min(remaining, cache.ttl))
+        loaded += 1
+    return loaded
+
+
+async def _compact_forever(interval: float) -> None:
+    token = uuid.uuid4().hex
+    while True:
+        try:
+            # Unreleased: the lease keeps the other workers out until the next interval.
+            if await asyncio.to_thread(store.claim, "compact", token, interval * 0.9):
+                removed = await asyncio.to_thread(store.compact)
+                logger.info("product store compacted: %d rows removed", removed)
+        except sqlite3.Error:
+            logger.warning("product store compaction failed", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+_compactor: Optional[asyncio.Task] = None
+
+
+async def startup() -> None:
+    """Warm `product_cache` from the store and start periodic compaction."""
+    global _compactor  # noqa: PLW0603
+    if not PRODUCT_STORE_ENABLED:
+        return
+    try:
+        loaded = await asyncio.to_thread(warm)
+        logger.info("product cache warmed with %d stored products", loaded)
+    except sqlite3.Error:
+        logger.warning("product store warm start failed", exc_info=True)
+    if PRODUCT_STORE_COMPACT_INTERVAL > 0:
+        _compactor = asyncio.create_task(_compact_forever(PRODUCT_STORE_COMPACT_INTERVAL))
+
+
+async def shutdown() -> None:
+    global _compactor  # noqa: PLW0603
+    if _compactor is not None:
+        _compactor.cancel()
+        await asyncio.gather(_compactor, return_exceptions=True)
+        _compactor = None
+    store.close()
+
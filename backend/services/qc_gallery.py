@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+"""QC (quality-control) photo gallery index.
+
+Maps ``(platform, product_id)`` to an ordered tuple of image URLs. Galleries
+live in a SQLite file (QC_GALLERY_DB) and are served from an in-memory hot
+tier (`gallery_cache`, an LRU of QC_HOT_SIZE entries), so repeat lookups of
+popular products never leave the process.
+
+On a miss the store is consulted, then — if QC_SOURCE_URL is configured — the
+remote QC source, whose answer is written back to the store. Concurrent
+misses for one product share a single load; products without photos are
+remembered for QC_NEGATIVE_TTL seconds only. `import_galleries` bulk-loads
+galleries (see scripts/import_qc_gallery.py).
+"""
+
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from ..fastjson import dumps, loads
+from . import http_clients
+from .cache import AsyncCache
+from .resilience import get_guard
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+QC_GALLERY_DB = os.getenv("QC_GALLERY_DB", str(BASE_DIR / "data" / "qc_gallery.sqlite3"))
+QC_HOT_SIZE = int(os.getenv("QC_HOT_SIZE", "20000"))
+QC_HOT_TTL = float(os.getenv("QC_HOT_TTL", "3600"))
+QC_NEGATIVE_TTL = float(os.getenv("QC_NEGATIVE_TTL", "300"))
+# e.g. https://qc.example.com/api/gallery?platform={platform}&id={product_id}
+QC_SOURCE_URL = os.getenv("QC_SOURCE_URL", "")
+QC_MAX_IMAGES = int(os.getenv("QC_MAX_IMAGES", "200"))
+
+Gallery = Tuple[str, ...]
+
+http_clients.register("qc", QC_SOURCE_URL, warmup=bool(QC_SOURCE_URL))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS qc_gallery (
+    platform TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    images TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (platform, product_id)
+) WITHOUT ROWID
+"""
+
+############################################################
+# On-disk store
+############################################################
+
+
+class GalleryStore:
+    """SQLite-backed gallery table; the file is opened on first use."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, platform: str, product_id: str) -> Optional[Gallery]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT images FROM qc_gallery WHERE platform = ? AND product_id = ?",
+                (platform, product_id),
+            ).fetchone()
+        return tuple(loads(row[0])) if row else None
+
+    def put_many(self, rows: Iterable[Tuple[str, str, Gallery]]) -> int:
+        """Insert or replace galleries in one transaction; returns the row count."""
+        now = time.time()
+        params = [(p, pid, dumps(list(images)).decode("utf-8"), now) for p, pid, images in rows]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO qc_gallery (platform, product_id, images, updated_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    params,
+                )
+        return len(params)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM qc_gallery").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class _GalleryCache(AsyncCache):
+    def ttl_for(self, value: Any) -> float | None:
+        return None if value else QC_NEGATIVE_TTL
+
+
+store = GalleryStore(QC_GALLERY_DB)
+gallery_cache = _GalleryCache(maxsize=QC_HOT_SIZE, ttl=QC_HOT_TTL)
+
+############################################################
+# Remote source
+############################################################
+
+
+def clean_images(value: Any) -> Gallery:
+    """Ordered, de-duplicated image URLs from a list of URLs or ``{"url": ...}`` dicts."""
+    if isinstance(value, dict):
+        value = value.get("images") or value.get("data") or value.get("photos")
+        return clean_images(value)
+    if not isinstance(value, list):
+        return ()
+    urls: List[str] = []
+    for item in value:
+        url = item.get("url") if isinstance(item, dict) else item
+        if isinstance(url, str) and url:
+            urls.append(f"https:{url}" if url.startswith("//") else url)
+    return tuple(dict.fromkeys(urls))[:QC_MAX_IMAGES]
+
+
+async def _fetch_remote(platform: str, product_id: str) -> Gallery:
+    url = QC_SOURCE_URL.format(platform=platform, product_id=product_id)
+    resp = await http_clients.get_client("qc").get(url)
+    if resp.status_code == 404:
+        return ()
+    resp.raise_for_status()
+    return clean_images(loads(resp.content))
+
+
+async def _load(platform: str, product_id: str) -> Gallery:
+    images = await asyncio.to_thread(store.get, platform, product_id)
+    if images is not None or not QC_SOURCE_URL:
+        return images or ()
+    images = await get_guard("qc").call(_fetch_remote, platform, product_id)
+    if images:
+        await asyncio.to_thread(store.put_many, [(platform, product_id, images)])
+    return images
+
+############################################################
+# Public API
+############################################################
+
+
+async def get_gallery(platform: str, product_id: str) -> Gallery:
+    """Return the QC images for a product (empty if none are known).
+
+    Remote source errors propagate and are not cached.
+    """
+    return await gallery_cache.get_or_load(
+        (platform, product_id), lambda: _load(platform, product_id)
+    )
+
+
+def import_galleries(rows: Iterable[Tuple[str, str, Any]]) -> int:
+    """Bulk-load ``(platform, product_id, images)`` rows into the store.
+
+    Imported products are dropped from the hot tier so the next lookup sees
+    the new gallery. Returns the number of galleries written.
+    """
+    cleaned = [(p, str(pid), clean_images(images)) for p, pid, images in rows]
+    cleaned = [row for row in cleaned if row[2]]
+    written = store.put_many(cleaned)
+    for platform, product_id, _ in cleaned:
+        gallery_cache.pop((platform, product_id))
+    return written
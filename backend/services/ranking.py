@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+"""Score and order multi-platform search candidates.
+
+All candidates of a request are scored at once with NumPy:
+
+- ``similarityScore``: how closely the candidate matches the query (given by
+  the caller, e.g. image-hash similarity);
+- ``reliabilityScore``: seller reliability from reported sales (saturating at
+  the profile's ``sales_scale``) and a known shop, zero for placeholder data;
+- a price score: log-price min-max normalised within the candidate set,
+  cheaper is better, unknown prices neutral;
+- ``finalScore``: the profile-weighted mean of the three, times the
+  profile's platform weight.
+
+Only the top *k* are ordered (`argpartition`, then a sort of those *k*).
+Profiles are built in (PROFILES) and can be added or overridden with a JSON
+file (RANKING_PROFILES_FILE); RANKING_PROFILE picks the default.
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+import json
+import os
+
+import numpy as np
+
+from .product_model import Product
+
+RANKING_PROFILE = os.getenv("RANKING_PROFILE", "default")
+RANKING_PROFILES_FILE = os.getenv("RANKING_PROFILES_FILE", "")
+
+_UNKNOWN_SALES_RELIABILITY = 0.4
+_NEUTRAL_PRICE = 0.5
+
+
+@dataclass(frozen=True)
+class WeightProfile:
+    similarity: float = 0.6
+    reliability: float = 0.25
+    price: float = 0.15
+    platforms: Mapping[str, float] = field(
+        default_factory=lambda: {"taobao": 1.0, "1688": 0.95, "weidian": 0.9}
+    )
+    sales_scale: float = 500.0
+
+
+PROFILES: Dict[str, WeightProfile] = {
+    "default": WeightProfile(),
+    "visual": WeightProfile(similarity=0.85, reliability=0.1, price=0.05),
+    "cheapest": WeightProfile(similarity=0.35, reliability=0.15, price=0.5),
+    "trusted": WeightProfile(similarity=0.4, reliability=0.5, price=0.1, sales_scale=2000.0),
+}
+
+
+class Ranked(NamedTuple):
+    product: Product
+    final_score: float
+    reliability_score: float
+    similarity_score: float
+
+
+def _load_profiles(path: str) -> None:
+    with open(path, "r", encoding="utf-8") as fh:
+        for name, values in json.load(fh).items():
+            PROFILES[name] = replace(PROFILES.get(name, WeightProfile()), **values)
+
+
+if RANKING_PROFILES_FILE:
+    _load_profiles(RANKING_PROFILES_FILE)
+
+
+def get_profile(name: Optional[str] = None) -> WeightProfile:
+    """Return profile *name* (default RANKING_PROFILE). Raises ValueError if unknown."""
+    name = name or RANKING_PROFILE
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown ranking profile: {name}. Known: {', '.join(PROFILES)}") from None
+
+############################################################
+# Scoring
+############################################################
+
+
+def price_scores(prices: np.ndarray) -> np.ndarray:
+    """Cheaper → closer to 1 on a log scale; NaN / non-positive prices get 0.5."""
+    valid = np.isfinite(prices) & (prices > 0)
+    scores = np.full(prices.shape, _NEUTRAL_PRICE)
+    if not valid.any():
+        return scores
+    logp = np.log(prices[valid])
+    lo, hi = logp.min(), logp.max()
+    scores[valid] = 1.0 if hi == lo else (hi - logp) / (hi - lo)
+    return scores
+
+
+def reliability_scores(
+    sales: np.ndarray, has_shop: np.ndarray, fallback: np.ndarray, sales_scale: float
+) -> np.ndarray:
+    """Seller reliability in [0, 1]; *sales* < 0 means unknown."""
+    known = sales >= 0
+    scores = np.where(
+        known,
+        0.2 + 0.7 * (1.0 - np.exp(-np.maximum(sales, 0) / sales_scale)),
+        _UNKNOWN_SALES_RELIABILITY,
+    )
+    scores = np.minimum(1.0, scores + 0.1 * has_shop)
+    return np.where(fallback, 0.0, scores)
+
+
+def score(
+    products: Sequence[Product], similarity: Sequence[float], profile: WeightProfile
+) -> Dict[str, np.ndarray]:
+    """Score every candidate; returns arrays ``final``, ``reliability``, ``similarity``."""
+    n = len(products)
+    fields = np.array(
+        [
+            (
+                np.nan if p.price is None else p.price,
+                -1.0 if p.sales is None else p.sales,
+                p.shop_name is not None,
+                p.fallback,
+                profile.platforms.get(p.platform, 1.0),
+            )
+            for p in products
+        ],
+        dtype=np.float64,
+    ).reshape(n, 5)
+    sim = np.clip(np.asarray(similarity, dtype=np.float64), 0.0, 1.0)
+    rel = reliability_scores(fields[:, 1], fields[:, 2], fields[:, 3].astype(bool), profile.sales_scale)
+    price = price_scores(fields[:, 0])
+    total = profile.similarity + profile.reliability + profile.price or 1.0
+    final = fields[:, 4] * (
+        profile.similarity * sim + profile.reliability * rel + profile.price * price
+    ) / total
+    return {"final": final, "reliability": rel, "similarity": sim}
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the *k* highest *scores*, best first (ties keep input order)."""
+    n = len(scores)
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.arange(n) if k == n else np.argpartition(-scores, k - 1)[:k]
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+def rank(
+    products: Sequence[Product],
+    similarity: Optional[Sequence[float]] = None,
+    k: int = 20,
+    profile: Optional[WeightProfile] = None,
+) -> List[Ranked]:
+    """Return the *k* best candidates with their scores, best first.
+
+    *similarity* defaults to 1.0 for every candidate (ranking by reliability
+    and price only).
+    """
+    if not products:
+        return []
+    profile = profile or get_profile()
+    if similarity is None:
+        similarity = np.ones(len(products))
+    scores = score(products, similarity, profile)
+    final, rel, sim = scores["final"], scores["reliability"], scores["similarity"]
+    return [
+        Ranked(products[i], round(float(final[i]), 4), round(float(rel[i]), 4), round(float(sim[i]), 4))
+        for i in top_k(final, k)
+    ]
+
+
+def to_result(ranked: Ranked, fields: Sequence[str] = ()) -> Dict[str, Any]:
+    """Render as the contract `ProductSearchResult`."""
+    return {
+        **ranked.product.to_dict(fields),
+        "finalScore": ranked.final_score,
+        "reliabilityScore": ranked.reliability_score,
+        "similarityScore": ranked.similarity_score,
+    }
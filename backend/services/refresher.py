@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+"""Background refresh of popular product details.
+
+Every product lookup is recorded in `tracker`, a Space-Saving top-k counter
+that holds at most REFRESH_TRACK_SIZE keys however many distinct products are
+requested (rare products keep replacing each other in the minimum slot).
+Counts decay by REFRESH_DECAY each tick, so popularity follows recent demand.
+
+Every REFRESH_INTERVAL seconds the REFRESH_TOP_K hottest products with at
+least REFRESH_MIN_HITS recent requests are checked:
+
+- a persistent-store entry (the in-process one when the store is disabled)
+  expiring within REFRESH_AHEAD seconds, or missing, is re-fetched upstream,
+  at most REFRESH_MAX_PER_TICK per tick and only while the provider's quota
+  has REFRESH_MIN_HEADROOM of its burst left, so refreshes never eat the
+  budget user requests need;
+- otherwise an in-process entry about to expire is reloaded from the store.
+
+Several workers can run this side by side: a refresh holds the product's
+cross-process lease (`product_store.lease`), so a product being fetched by
+another worker is skipped, and once one of them has refreshed it the others
+see a fresh store entry and only reload it.
+"""
+
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import heapq
+import logging
+import os
+
+from . import daji_service, product_store, weidian_service
+from .admission import upstream_budget_headroom
+from .cache import product_cache
+from .preprocessor import ProductLink, product_link
+from .product_model import Product
+
+logger = logging.getLogger(__name__)
+
+REFRESH_ENABLED = os.getenv("REFRESH_ENABLED", "1") == "1"
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "30"))
+REFRESH_AHEAD = float(os.getenv("REFRESH_AHEAD", str(2 * REFRESH_INTERVAL)))
+REFRESH_TRACK_SIZE = int(os.getenv("REFRESH_TRACK_SIZE", "2000"))
+REFRESH_TOP_K = int(os.getenv("REFRESH_TOP_K", "100"))
+REFRESH_MIN_HITS = float(os.getenv("REFRESH_MIN_HITS", "2"))
+REFRESH_MAX_PER_TICK = int(os.getenv("REFRESH_MAX_PER_TICK", "20"))
+REFRESH_MIN_HEADROOM = float(os.getenv("REFRESH_MIN_HEADROOM", "0.5"))
+REFRESH_DECAY = float(os.getenv("REFRESH_DECAY", "0.8"))
+
+# Guard (and thus quota) each platform's lookups go through
+_GUARDS = {"taobao": "daji_taobao", "1688": "daji_1688", "weidian": "weidian"}
+
+Refresh = Callable[[ProductLink], Awaitable[Optional[Product]]]
+
+############################################################
+# Frequency tracking
+############################################################
+
+
+class SpaceSaving:
+    """Approximate top-k counter over a stream (Metwally et al.'s Space-Saving).
+
+    Keeps at most *capacity* keys. A new key arriving when full replaces the
+    key with the smallest count and inherits that count, so counts are upper
+    bounds that overestimate by at most the evicted minimum.
+    """
+
+    def __init__(self, capacity: int = REFRESH_TRACK_SIZE) -> None:
+        self.capacity = max(1, capacity)
+        self.counts: Dict[Hashable, float] = {}
+        # (count, key) min-heap; entries go stale when a count grows and are
+        # fixed up lazily on eviction.
+        self._heap: List[Tuple[float, Hashable]] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, key: Hashable, weight: float = 1.0) -> None:
+        counts = self.counts
+        if key in counts:
+            counts[key] += weight
+            return
+        if len(counts) < self.capacity:
+            counts[key] = weight
+            heapq.heappush(self._heap, (weight, key))
+            return
+        while True:
+            count, victim = self._heap[0]
+            current = counts[victim]
+            if current == count:
+                break
+            heapq.heapreplace(self._heap, (current, victim))
+        del counts[victim]
+        counts[key] = count + weight
+        heapq.heapreplace(self._heap, (count + weight, key))
+
+    def top(self, n: int) -> List[Tuple[Hashable, float]]:
+        """The *n* keys with the highest counts, highest first."""
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+    def decay(self, factor: float) -> None:
+        """Multiply every count by *factor*, forgetting keys that drop below 0.5."""
+        self.counts = {k: c * factor for k, c in self.counts.items() if c * factor >= 0.5}
+        self._heap = [(c, k) for k, c in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def clear(self) -> None:
+        self.counts.clear()
+        self._heap.clear()
+
+
+tracker = SpaceSaving()
+
+
+def record(platform: str, product_id: str) -> None:
+    """Count one request for a product."""
+    if REFRESH_ENABLED and product_id:
+        tracker.add((platform, product_id))
+
+############################################################
+# Refresh
+############################################################
+
+
+def _refresher(platform: str) -> Optional[Refresh]:
+    # Resolved at call time so the service functions can be swapped in tests.
+    if platform in ("taobao", "1688"):
+        return daji_service.refresh_product
+    if platform == "weidian":
+        return weidian_service.refresh_product
+    return None
+
+
+async def _reload(key: Tuple[str, str]) -> bool:
+    product = await asyncio.to_thread(product_store.store.get, *key)
+    if product is None:
+        return False
+    product_cache.set(key, product)
+    return True
+
+
+async def refresh_once() -> Dict[str, int]:
+    """Run one refresh pass; returns counts of refreshed / reloaded / skipped products."""
+    stats = {"refreshed": 0, "reloaded": 0, "skipped": 0, "failed": 0}
+    for key, count in tracker.top(REFRESH_TOP_K):
+        if count < REFRESH_MIN_HITS:
+            break
+        platform, product_id = key
+        link = product_link(platform, product_id)
+        refresh = _refresher(platform)
+        if link is None or refresh is None:
+            continue
+
+        cached_left = product_cache.expires_in(key)
+        if product_store.PRODUCT_STORE_ENABLED:
+            fresh_for = await asyncio.to_thread(product_store.store.expires_in, platform, product_id)
+        else:
+            fresh_for = cached_left
+        if fresh_for is not None and fresh_for > REFRESH_AHEAD:
+            if (cached_left is None or cached_left <= REFRESH_AHEAD) and await _reload(key):
+                stats["reloaded"] += 1
+            continue
+
+        if (
+            stats["refreshed"] + stats["failed"] >= REFRESH_MAX_PER_TICK
+            or upstream_budget_headroom(_GUARDS[platform]) < REFRESH_MIN_HEADROOM
+        ):
+            stats["skipped"] += 1
+            continue
+        async with product_store.lease(f"product:{platform}:{product_id}") as held:
+            if not held:
+                stats["skipped"] += 1  # another worker is fetching it right now
+                continue
+            try:
+                product = await refresh(link)
+            except Exception:  # noqa: BLE001
+                # Open circuit, spent quota, upstream error: the request path copes.
+                stats["failed"] += 1
+                continue
+        stats["refreshed" if product is not None else "skipped"] += 1
+    tracker.decay(REFRESH_DECAY)
+    return stats
+
+
+async def _refresh_forever(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stats = await refresh_once()
+            logger.debug("background refresh: %s", stats)
+        except Exception:  # noqa: BLE001
+            logger.warning("background refresh failed", exc_info=True)
+
+
+_task: Optional[asyncio.Task] = None
+
+
+async def startup() -> None:
+    """Start the refresh loop (no-op when REFRESH_ENABLED=0)."""
+    global _task  # noqa: PLW0603
+    if REFRESH_ENABLED and REFRESH_INTERVAL > 0 and _task is None:
+        _task = asyncio.create_task(_refresh_forever(REFRESH_INTERVAL))
+
+
+async def shutdown() -> None:
+    global _task  # noqa: PLW0603
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
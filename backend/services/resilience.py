@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+"""Circuit breakers and adaptive timeouts for upstream calls.
+
+Each upstream (Daji taobao, Daji 1688, Weidian RapidAPI, OpenRouter) gets an
+`UpstreamGuard` that
+
+- times out calls after a deadline derived from recently observed latency
+  (UPSTREAM_TIMEOUT_PERCENTILE × UPSTREAM_TIMEOUT_MULTIPLIER, clamped to
+  [UPSTREAM_TIMEOUT_MIN, UPSTREAM_TIMEOUT_MAX]; the max is used until
+  UPSTREAM_TIMEOUT_MIN_SAMPLES successes have been seen), and
+- opens its circuit after CIRCUIT_FAILURE_THRESHOLD consecutive failures,
+  failing fast with `CircuitOpenError` until CIRCUIT_RESET_TIMEOUT seconds
+  have passed, then lets a single probe through (half-open).
+
+Client errors (HTTP 4xx other than 429, or anything carrying such a
+``status_code`` like `UnrecognisedPayloadError` for delisted items) don't
+count as upstream failures.
+
+Idempotent calls made through `call_hedged` may also be hedged
+(HEDGE_ENABLED=1): if the first attempt hasn't returned after the upstream's
+observed HEDGE_PERCENTILE latency, an identical second attempt is started and
+the first successful one wins; the other is cancelled. Hedges draw from a
+global budget that refills by HEDGE_BUDGET_RATIO per eligible call, capping
+the extra load (5% by default).
+
+Every call also draws from its provider's quota budget (see `admission`);
+a spent budget raises `QuotaExceededError` without touching the upstream.
+"""
+
+from collections import deque
+from dataclasses import replace
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import math
+import os
+import time
+
+from ..metrics import UPSTREAM_SECONDS
+from .admission import QuotaExceededError, spend_upstream_budget
+from .product_model import Product
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+UPSTREAM_TIMEOUT_MIN = float(os.getenv("UPSTREAM_TIMEOUT_MIN", "1"))
+UPSTREAM_TIMEOUT_MAX = float(os.getenv("UPSTREAM_TIMEOUT_MAX", "20"))
+UPSTREAM_TIMEOUT_PERCENTILE = float(os.getenv("UPSTREAM_TIMEOUT_PERCENTILE", "99"))
+UPSTREAM_TIMEOUT_MULTIPLIER = float(os.getenv("UPSTREAM_TIMEOUT_MULTIPLIER", "3"))
+UPSTREAM_TIMEOUT_MIN_SAMPLES = int(os.getenv("UPSTREAM_TIMEOUT_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.getenv("UPSTREAM_LATENCY_WINDOW", "256"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "5"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies (seconds)."""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[idx]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Return True if a call may go through right now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """Forget an in-flight probe that ended without a verdict."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = self._clock()
+
+
+class HedgeBudget:
+    """Token bucket limiting hedged attempts to a fraction of eligible calls."""
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST) -> None:
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+hedge_budget = HedgeBudget()
+
+
+def _counts_as_failure(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return True
+
+
+class UpstreamGuard:
+    """Circuit breaker plus latency-derived timeout for one upstream."""
+
+    def __init__(self, name: str, breaker: CircuitBreaker | None = None) -> None:
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def timeout(self) -> float:
+        """Current per-call timeout in seconds."""
+        if len(self.latency) < UPSTREAM_TIMEOUT_MIN_SAMPLES:
+            return UPSTREAM_TIMEOUT_MAX
+        observed = self.latency.percentile(UPSTREAM_TIMEOUT_PERCENTILE) or 0.0
+        return min(UPSTREAM_TIMEOUT_MAX, max(UPSTREAM_TIMEOUT_MIN, observed * UPSTREAM_TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None without enough samples."""
+        if len(self.latency) < UPSTREAM_TIMEOUT_MIN_SAMPLES:
+            return None
+        return self.latency.percentile(HEDGE_PERCENTILE)
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` under the breaker and adaptive timeout."""
+        return await self._run(fn, args, kwargs, hedge=False)
+
+    async def call_hedged(self, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """Like `call`, hedging slow attempts when enabled. Idempotent *fn* only."""
+        return await self._run(fn, args, kwargs, hedge=HEDGE_ENABLED)
+
+    async def _run(self, fn: Callable[..., Awaitable[Any]], args: Any, kwargs: Any, hedge: bool) -> Any:
+        if not self.breaker.allow():
+            UPSTREAM_SECONDS.observe(0.0, self.name, "circuit_open")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            spend_upstream_budget(self.name)
+        except QuotaExceededError:
+            self.breaker.release_probe()
+            UPSTREAM_SECONDS.observe(0.0, self.name, "quota_exceeded")
+            raise
+        start = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            result = await self._guarded(fn, args, kwargs, hedge)
+            outcome = "ok"
+            return result
+        except Exception as exc:
+            outcome = "timeout" if isinstance(exc, asyncio.TimeoutError) else "error"
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, self.name, outcome)
+
+    async def _guarded(self, fn: Callable[..., Awaitable[Any]], args: Any, kwargs: Any, hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        try:
+            if delay is None:
+                start = time.perf_counter()
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout=self.timeout())
+                self.latency.record(time.perf_counter() - start)
+            else:
+                hedge_budget.deposit()
+                result = await asyncio.wait_for(self._hedged(fn, args, kwargs, delay), timeout=self.timeout())
+        except asyncio.CancelledError:
+            # Caller went away; say nothing about upstream health.
+            self.breaker.release_probe()
+            raise
+        except Exception as exc:
+            if _counts_as_failure(exc):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _attempt(self, fn: Callable[..., Awaitable[Any]], args: Any, kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = await fn(*args, **kwargs)
+        self.latency.record(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, fn: Callable[..., Awaitable[Any]], args: Any, kwargs: Any, delay: float) -> Any:
+        primary = asyncio.ensure_future(self._attempt(fn, args, kwargs))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and hedge_budget.try_acquire():
+                self.hedges += 1
+                pending.add(asyncio.ensure_future(self._attempt(fn, args, kwargs)))
+            error: Optional[BaseException] = None
+            while pending or done:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "timeout": self.timeout(),
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+            "p99": self.latency.percentile(99),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+
+
+def get_guard(name: str) -> UpstreamGuard:
+    """Return the guard for upstream *name*, creating it on first use."""
+    guard = _guards.get(name)
+    if guard is None:
+        guard = _guards[name] = UpstreamGuard(name)
+    return guard
+
+
+def guard_snapshots() -> Dict[str, Dict[str, Any]]:
+    """`UpstreamGuard.snapshot` for every guard created so far."""
+    return {name: guard.snapshot() for name, guard in _guards.items()}
+
+
+def reset_guards() -> None:
+    _guards.clear()
+    hedge_budget.tokens = 0.0
+
+
+def mark_fallback(product: Product, reason: str) -> Product:
+    """Return a copy of *product* flagged as substitute data."""
+    return replace(product, fallback=True, fallback_reason=reason)
+
+
+def fallback_reason(exc: BaseException) -> str:
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, QuotaExceededError):
+        return "quota_exceeded"
+    if isinstance(exc, asyncio.TimeoutError):
+        return "timeout"
+    return "upstream_error"
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+"""Resolver for Taobao share short links (tb.cn / m.tb.cn).
+
+Short links carry no product ID, so they are followed to the item page
+first. Redirects are followed on a pooled client (HEAD, then a bounded GET);
+m.tb.cn answers some links with an HTML page whose script holds the item URL,
+which is picked out of the first SHORT_LINK_MAX_BODY bytes.
+
+Resolutions are cached short → canonical for SHORT_LINK_TTL seconds and
+concurrent resolutions of the same link share one request.
+"""
+
+from typing import Optional
+import os
+import re
+
+import httpx
+
+from . import http_clients
+from .cache import AsyncCache
+from .preprocessor import ProductLink, parse_product_url
+
+SHORT_LINK_HOSTS = ("tb.cn",)
+SHORT_LINK_TTL = float(os.getenv("SHORT_LINK_TTL", "86400"))
+SHORT_LINK_CACHE_SIZE = int(os.getenv("SHORT_LINK_CACHE_SIZE", "8192"))
+SHORT_LINK_MAX_REDIRECTS = int(os.getenv("SHORT_LINK_MAX_REDIRECTS", "5"))
+SHORT_LINK_MAX_BODY = int(os.getenv("SHORT_LINK_MAX_BODY", "65536"))
+
+http_clients.register("shortlink", "https://m.tb.cn/", max_redirects=SHORT_LINK_MAX_REDIRECTS)
+
+# Canonical URL (or None when the link leads nowhere useful) per short URL
+short_link_cache = AsyncCache(maxsize=SHORT_LINK_CACHE_SIZE, ttl=SHORT_LINK_TTL)
+
+_EMBEDDED_ITEM_URL = re.compile(
+    r"https?://(?:[\w-]+\.)*(?:taobao|tmall)\.com/[^\s'\"<>]*?[?&]id=\d+"
+)
+
+
+def is_short_link(link: ProductLink) -> bool:
+    """True for Taobao links without a product ID on a short-link host."""
+    if link.platform != "taobao" or link.product_id:
+        return False
+    host = (httpx.URL(link.url).host or "").lower()
+    return any(host == h or host.endswith(f".{h}") for h in SHORT_LINK_HOSTS)
+
+
+def _as_product(url: str) -> Optional[ProductLink]:
+    link = parse_product_url(url)
+    return link if link is not None and link.product_id else None
+
+
+async def _follow(url: str) -> Optional[str]:
+    client = http_clients.get_client("shortlink")
+
+    try:
+        resp = await client.head(url, follow_redirects=True)
+        found = _as_product(str(resp.url))
+        if found:
+            return found.canonical_url
+    except httpx.TooManyRedirects:
+        return None
+
+    async with client.stream("GET", url, follow_redirects=True) as resp:
+        found = _as_product(str(resp.url))
+        if found:
+            return found.canonical_url
+        body = b""
+        async for chunk in resp.aiter_bytes():
+            body += chunk
+            if len(body) >= SHORT_LINK_MAX_BODY:
+                break
+
+    m = _EMBEDDED_ITEM_URL.search(body[:SHORT_LINK_MAX_BODY].decode("utf-8", errors="ignore"))
+    found = _as_product(m.group(0)) if m else None
+    return found.canonical_url if found else None
+
+
+async def resolve(link: ProductLink) -> Optional[ProductLink]:
+    """Return the product link behind short link *link*, or None if unresolvable.
+
+    Network errors propagate (and are not cached); a link that resolves to no
+    product is cached as None.
+    """
+    canonical = await short_link_cache.get_or_load(link.canonical_url, lambda: _follow(link.url))
+    return parse_product_url(canonical) if canonical else None
@@ -4,59 +4,96 @@ from __future__ import annotations
 Falls back to static data if RAPIDAPI_KEY missing or request fails.
 """
 
-from typing import Any, Dict
-import os
+from typing import Any, Optional
 import asyncio
-import random
-import re
 
-import httpx
-from dotenv import load_dotenv
+from ..config import settings
+from ..fastjson import loads
+from . import http_clients, product_store
+from .cache import product_cache
+from .preprocessor import ProductLink, parse_product_url
+from .product_model import Product, normalize
+from .resilience import fallback_reason, get_guard, mark_fallback
 
-load_dotenv()
+RAPIDAPI_KEY = settings.rapidapi_key
+WEIDIAN_API_BASE_URL = settings.weidian_api_base_url
 
-RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
-WEIDIAN_API_BASE_URL = "https://weidian-api2.p.rapidapi.com/"
+http_clients.register("weidian", WEIDIAN_API_BASE_URL, warmup=bool(RAPIDAPI_KEY))
 
-_FAKE_PRODUCT = {
-    "platform": "weidian",
-    "productId": "w123",
-    "title": "卫衣纯棉连帽上衣",
-    "price": 199.0,
-    "url": "https://weidian.com/item.html?itemID=w123",
+_FAKE_PRODUCT = Product(
+    platform="weidian",
+    product_id="w123",
+    title="卫衣纯棉连帽上衣",
+    price=199.0,
+    url="https://weidian.com/item.html?itemID=w123",
+)
+
+_PATHS = (("result", "item"), ("result",), ("data",), ())
+_KEYS = {
+    "title": ("itemName", "item_name", "title"),
+    "price": ("price", "itemPrice", "originalPrice"),
+    "image": ("itemMainPic", "imgHead", "img"),
+    "images": ("imgs", "images", "itemImages"),
+    "shop": ("shopName", "sellerName"),
+    "sales": ("sold", "soldCount", "sales"),
 }
 
 
-def _parse_weidian_id(url: str) -> str | None:
-    m = re.search(r"itemID=([\w\d]+)", url)
-    return m.group(1) if m else None
+def normalize_weidian(raw: Any, link: ProductLink) -> Product:
+    """Reduce a RapidAPI weidian detail payload to a `Product`."""
+    return normalize(raw, link, _PATHS, _KEYS)
 
 
-async def _api_get_product(product_id: str) -> Dict[str, Any]:
+async def _api_get_product(link: ProductLink) -> Product:
     endpoint_path = "weidian/detail/v5"
     url = f"{WEIDIAN_API_BASE_URL}{endpoint_path}"
     headers = {
         "x-rapidapi-key": RAPIDAPI_KEY,
         "x-rapidapi-host": "weidian-api2.p.rapidapi.com",
     }
-    params = {"itemId": product_id}
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.get(url, headers=headers, params=params)
-        resp.raise_for_status()
-        return resp.json()
+    params = {"itemId": link.product_id}
+    resp = await http_clients.get_client("weidian").get(url, headers=headers, params=params)
+    resp.raise_for_status()
+    return normalize_weidian(loads(resp.content), link)
+
 
+async def fetch_product_detail(url: str) -> Product:
+    """Return product detail for Weidian URL with graceful fallback.
 
-async def fetch_product_detail(url: str) -> Dict[str, Any]:
-    """Return product detail for Weidian URL with graceful fallback."""
-    product_id = _parse_weidian_id(url)
-    if not product_id:
-        return _FAKE_PRODUCT
+    Upstream payloads are normalized to a compact `Product` before they are
+    cached in `product_cache` and the persistent `product_store`; calls go
+    through the "weidian" circuit breaker and are hedged when HEDGE_ENABLED=1.
+    Fallback data is flagged with ``fallback`` and a ``fallback_reason``.
+    """
+    link = parse_product_url(url)
+    if link is None or link.platform != "weidian" or not link.product_id:
+        return mark_fallback(_FAKE_PRODUCT, "unparsed_url")
 
     if not RAPIDAPI_KEY:
         await asyncio.sleep(0.05)
-        return _FAKE_PRODUCT
+        return mark_fallback(_FAKE_PRODUCT, "no_credentials")
 
+    guard = get_guard("weidian")
     try:
-        return await _api_get_product(product_id)
-    except Exception:  # pragma: no cover
-        return _FAKE_PRODUCT 
\ No newline at end of file
+        return await product_cache.get_or_load(
+            ("weidian", link.product_id),
+            lambda: product_store.read_through(
+                "weidian", link.product_id, lambda: guard.call_hedged(_api_get_product, link)
+            ),
+        )
+    except Exception as exc:  # noqa: BLE001
+        return mark_fallback(_FAKE_PRODUCT, fallback_reason(exc))
+
+
+async def refresh_product(link: ProductLink) -> Optional[Product]:
+    """Re-fetch *link* upstream, bypassing the caches, and update them.
+
+    Used by the background refresher; returns None without credentials and
+    lets upstream errors (including spent quotas) propagate.
+    """
+    if not RAPIDAPI_KEY or link.platform != "weidian":
+        return None
+    product = await get_guard("weidian").call(_api_get_product, link)
+    await product_store.save(product)
+    product_cache.set(link.key, product)
+    return product
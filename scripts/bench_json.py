@@ -0,0 +1,126 @@
+"""Micro-benchmark for JSON work on the request path.
+
+Compares the stdlib path (``r.json()`` on upstream bodies, FastAPI's
+``jsonable_encoder`` + ``json.dumps`` for responses) with `backend.fastjson`
+on synthetic Daji-sized item payloads (SKU tree, props, HTML description,
+Chinese titles) and prints a JSON report.
+
+Usage: python scripts/bench_json.py [--skus N ...] [--products N] [--repeat N]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from backend import fastjson  # noqa: E402
+from backend.services.daji_service import normalize_taobao  # noqa: E402
+from backend.services.preprocessor import parse_product_url  # noqa: E402
+
+_LINK = parse_product_url("https://item.taobao.com/item.htm?id=123456")
+
+
+def make_daji_payload(skus: int) -> bytes:
+    colors = ["黑色", "白色", "灰色", "藏青色", "酒红色"]
+    sizes = ["S", "M", "L", "XL", "XXL", "3XL"]
+    item = {
+        "itemId": "123456",
+        "title": "耐克 Air Zoom Pegasus 40 男子公路跑步鞋 缓震透气 官方正品",
+        "price": "699.00",
+        "promotionPrice": "599.00",
+        "mainImageUrl": "//img.alicdn.com/imgextra/i1/123456/main.jpg",
+        "images": [f"//img.alicdn.com/imgextra/i{i}/123456/{i}.jpg" for i in range(12)],
+        "shopName": "耐克官方旗舰店",
+        "soldQuantity": 10234,
+        "description": "<div>" + "<p>商品详情 透气网面 缓震中底</p><img src='//img/x.jpg'/>" * 200 + "</div>",
+        "props": [{"name": f"属性{i}", "value": f"值{i}"} for i in range(40)],
+        "skuList": [
+            {
+                "skuId": str(9000000 + i),
+                "price": f"{599 + i % 7}.00",
+                "quantity": 100 + i,
+                "properties": [
+                    {"propId": 1627207, "valueId": i % 5, "name": "颜色", "value": colors[i % 5]},
+                    {"propId": 20509, "valueId": i % 6, "name": "尺码", "value": sizes[i % 6]},
+                ],
+                "image": f"//img.alicdn.com/sku/{i}.jpg",
+            }
+            for i in range(skus)
+        ],
+    }
+    return json.dumps({"code": 200, "msg": "success", "data": item}, ensure_ascii=False).encode()
+
+
+def make_response(products: int) -> Dict[str, Any]:
+    product = normalize_taobao(json.loads(make_daji_payload(1)), _LINK).to_dict()
+    return {
+        "hasUrls": True,
+        "urls": [product["url"]] * products,
+        "platform_map": {"taobao": [product["url"]] * products},
+        "products": [product] * products,
+        "llmAnalysis": None,
+    }
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def _stdlib_render(content: Any) -> bytes:
+    # What starlette's JSONResponse does after FastAPI's serialize_response
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def run(sku_counts: List[int], products: int, repeat: int) -> Dict[str, Any]:
+    decode = []
+    for n in sku_counts:
+        raw = make_daji_payload(n)
+        decode.append(
+            {
+                "skus": n,
+                "bytes": len(raw),
+                "stdlib_decode_us": round(_time(lambda: json.loads(raw), repeat), 1),
+                "fast_decode_us": round(_time(lambda: fastjson.loads(raw), repeat), 1),
+                "fast_decode_normalize_us": round(
+                    _time(lambda: normalize_taobao(fastjson.loads(raw), _LINK), repeat), 1
+                ),
+            }
+        )
+    response = make_response(products)
+    body = fastjson.dumps(response)
+    return {
+        "benchmark": "json",
+        "backend": fastjson.BACKEND,
+        "repeat": repeat,
+        "upstream_decode": decode,
+        "response_render": {
+            "products": products,
+            "bytes": len(body),
+            "stdlib_us": round(_time(lambda: _stdlib_render(response), repeat), 1),
+            "fast_us": round(_time(lambda: fastjson.dumps(response), repeat), 1),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skus", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.skus, args.products, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark the response-envelope middleware against the legacy version.
+
+Drives each app directly over ASGI (no sockets) and prints a JSON report with
+per-request latency for the legacy ``@app.middleware("http")`` implementation
+and the pure-ASGI ``StandardJSONResponseMiddleware``.
+
+Usage: python scripts/bench_middleware.py [--requests N] [--products N]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from backend.middleware import StandardJSONResponseMiddleware  # noqa: E402
+
+
+def _payload(n_products: int) -> Dict[str, Any]:
+    product = {
+        "platform": "taobao",
+        "productId": "123456",
+        "title": "耐克 Air Zoom Pegasus 40 跑鞋",
+        "price": 699.0,
+        "url": "https://item.taobao.com/item.htm?id=123456",
+    }
+    return {"hasUrls": True, "urls": [product["url"]] * n_products, "products": [product] * n_products}
+
+
+def legacy_app(payload: Dict[str, Any]) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def standard_json_response(request: Request, call_next):
+        response = await call_next(request)
+        body = None
+        if response.body_iterator:
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        return JSONResponse(
+            status_code=response.status_code,
+            content={
+                "status": "success" if response.status_code < 400 else "error",
+                "data": body.decode() if body else None,
+            },
+        )
+
+    @app.get("/bench")
+    async def bench():
+        return payload
+
+    return app
+
+
+def asgi_app(payload: Dict[str, Any]) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(StandardJSONResponseMiddleware)
+
+    @app.get("/bench")
+    async def bench():
+        return payload
+
+    return app
+
+
+async def _call(app: FastAPI) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/bench",
+        "raw_path": b"/bench",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    sent = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return sent
+
+
+async def measure(app: FastAPI, requests: int) -> Dict[str, Any]:
+    for _ in range(min(50, requests)):
+        await _call(app)
+    samples: List[float] = []
+    size = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        size = await _call(app)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "requests": requests,
+        "response_bytes": size,
+        "mean_us": round(statistics.fmean(samples), 1),
+        "p50_us": round(samples[len(samples) // 2], 1),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1], 1),
+    }
+
+
+async def run(requests: int, products: int) -> Dict[str, Any]:
+    payload = _payload(products)
+    legacy = await measure(legacy_app(payload), requests)
+    current = await measure(asgi_app(payload), requests)
+    return {
+        "benchmark": "envelope_middleware",
+        "products": products,
+        "legacy": legacy,
+        "asgi": current,
+        "speedup": round(legacy["mean_us"] / current["mean_us"], 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests, args.products)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Micro-benchmark for `preprocess_input` on large pasted messages.
+
+Compares the single-pass scanner with the previous pipeline (URL regex, then a
+regex loop over platforms per URL, then per-service product-ID regexes) and
+prints a JSON report.
+
+Usage: python scripts/bench_preprocess.py [--links N ...] [--repeat N]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.services import preprocessor  # noqa: E402
+
+_LEGACY_URL = re.compile(r"https?://[^\s]+", re.IGNORECASE)
+_LEGACY_RULES = {
+    "taobao": re.compile(r"(taobao\.com|tb\.cn)", re.IGNORECASE),
+    "1688": re.compile(r"(1688\.com)", re.IGNORECASE),
+    "weidian": re.compile(r"(weidian\.com)", re.IGNORECASE),
+}
+_LEGACY_IDS = {
+    "taobao": re.compile(r"[?&]id=(\d+)"),
+    "1688": re.compile(r"offer/(\d+)"),
+    "weidian": re.compile(r"itemID=([\w\d]+)"),
+}
+
+
+def legacy_preprocess(text: str) -> Dict[str, Any]:
+    urls = _LEGACY_URL.findall(text.strip())
+    platform_map: Dict[str, List[str]] = {}
+    ids = []
+    for u in urls:
+        for name, pattern in _LEGACY_RULES.items():
+            if pattern.search(u):
+                platform_map.setdefault(name, []).append(u)
+                m = _LEGACY_IDS[name].search(u)
+                ids.append(m.group(1) if m else None)
+                break
+    return {"urls": urls, "platform_map": platform_map, "ids": ids}
+
+
+def make_message(links: int) -> str:
+    templates = [
+        "帮我看看这个 https://item.taobao.com/item.htm?spm=a21n57.1.0.0&id={i}&ns=1。",
+        "还有 https://detail.1688.com/offer/{i}.html?spm=a26352.13672862 这个，",
+        "微店的 https://weidian.com/item.html?itemID={i}&wfr=wx 也要！",
+        "随便一个链接 https://example.com/p/{i} 不用管",
+    ]
+    return " ".join(templates[i % len(templates)].format(i=100000 + i) for i in range(links))
+
+
+def _time(fn, text: str, repeat: int) -> float:
+    fn(text)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(link_counts: List[int], repeat: int) -> Dict[str, Any]:
+    cases = []
+    for n in link_counts:
+        text = make_message(n)
+        preprocessor.parse_product_url.cache_clear()
+        cold = _time(preprocessor.preprocess_input, text, 1)
+        cases.append(
+            {
+                "links": n,
+                "chars": len(text),
+                "legacy_us": round(_time(legacy_preprocess, text, repeat), 1),
+                "scanner_cold_us": round(cold, 1),
+                "scanner_us": round(_time(preprocessor.preprocess_input, text, repeat), 1),
+            }
+        )
+    return {"benchmark": "preprocess_input", "repeat": repeat, "cases": cases}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, nargs="+", default=[1, 8, 50, 200])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.links, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Micro-benchmark for `backend.services.ranking`.
+
+Ranks synthetic multi-platform candidate sets of growing size and prints a
+JSON report of the per-request latency (scoring + top-k), split into the
+attribute gather and the vectorised scoring.
+
+Usage: python scripts/bench_ranking.py [--candidates N ...] [--k N] [--repeat N]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.services import ranking  # noqa: E402
+from backend.services.product_model import Product  # noqa: E402
+
+_PLATFORMS = ("taobao", "1688", "weidian")
+
+
+def make_candidates(n: int, seed: int = 0) -> List[Product]:
+    rng = np.random.default_rng(seed)
+    return [
+        Product(
+            platform=_PLATFORMS[i % 3],
+            product_id=str(i),
+            title=f"item {i}",
+            price=None if i % 17 == 0 else round(float(rng.lognormal(4, 1)), 2),
+            url=f"https://item.taobao.com/item.htm?id={i}",
+            shop_name=None if i % 5 == 0 else f"shop {i % 50}",
+            sales=None if i % 7 == 0 else int(rng.integers(0, 20000)),
+            fallback=i % 29 == 0,
+        )
+        for i in range(n)
+    ]
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(sizes: List[int], k: int, repeat: int) -> Dict[str, Any]:
+    profile = ranking.get_profile()
+    rows = []
+    for n in sizes:
+        products = make_candidates(n)
+        similarity = np.random.default_rng(n).random(n)
+        final = ranking.score(products, similarity, profile)["final"]
+        rows.append(
+            {
+                "candidates": n,
+                "rank_us": round(_time(lambda: ranking.rank(products, similarity, k, profile), repeat), 1),
+                "score_us": round(_time(lambda: ranking.score(products, similarity, profile), repeat), 1),
+                "top_k_us": round(_time(lambda: ranking.top_k(final, k), repeat), 1),
+                "full_sort_us": round(_time(lambda: np.argsort(-final, kind="stable"), repeat), 1),
+            }
+        )
+    return {"benchmark": "ranking", "numpy": np.__version__, "k": k, "repeat": repeat, "results": rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 200, 500, 2000])
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.candidates, args.k, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Cold-start benchmark: import time, lifespan startup and first requests.
+
+Every sample is a fresh interpreter that imports `backend.main`, runs the
+app lifespan (pool setup, store warm-up; the fast-path model trains in a
+background thread) and sends
+a first product-link request and a first free-text request. Upstream
+credentials are cleared so nothing leaves the machine (product lookups
+answer with fallback data) and on-disk state lives in a temporary directory.
+Prints a JSON report with the per-phase medians, whether importing the app
+loaded numpy and whether the `openai` SDK was loaded before the first text
+request.
+
+Usage: python scripts/bench_startup.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from backend.main import app
+t1 = time.perf_counter()
+numpy_at_import = "numpy" in sys.modules
+from starlette.testclient import TestClient
+with TestClient(app) as client:
+    t2 = time.perf_counter()
+    client.post("/api/v1/intent/parse", json={"userInput": "https://item.taobao.com/item.htm?id=1"})
+    t3 = time.perf_counter()
+    openai_after_url = "openai" in sys.modules
+    client.post("/api/v1/intent/parse", json={"userInput": "我想买一双跑步鞋"})
+    t4 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "lifespan_ms": (t2 - t1) * 1000,
+    "first_url_request_ms": (t3 - t2) * 1000,
+    "first_text_request_ms": (t4 - t3) * 1000,
+    "numpy_loaded_at_import": numpy_at_import,
+    "openai_loaded_after_url": openai_after_url,
+}))
+"""
+
+_CLEARED = (
+    "OPENROUTER_API_KEY", "DAJI_API_KEY", "DAJI_API_SECRET", "RAPIDAPI_KEY",
+)  # fmt: skip
+
+
+def sample(tmp: str) -> Dict[str, Any]:
+    env = {k: v for k, v in os.environ.items() if k not in _CLEARED}
+    env.update(
+        {
+            "PRODUCT_STORE_DB": str(Path(tmp) / "products.sqlite3"),
+            "QC_GALLERY_DB": str(Path(tmp) / "qc.sqlite3"),
+            "IMAGE_INDEX_PATH": str(Path(tmp) / "image_index.npz"),
+            "REFRESH_ENABLED": "0",
+            "RATE_LIMIT_ENABLED": "0",
+        }
+    )
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def run(runs: int) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            samples.append(sample(tmp))
+    phases = [k for k, v in samples[0].items() if k.endswith("_ms")]
+    return {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "median": {k: round(statistics.median(s[k] for s in samples), 1) for k in phases},
+        "numpy_loaded_at_import": any(s["numpy_loaded_at_import"] for s in samples),
+        "openai_loaded_after_url": any(s["openai_loaded_after_url"] for s in samples),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
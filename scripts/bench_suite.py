@@ -0,0 +1,261 @@
+"""Reproducible offline benchmark suite.
+
+Starts `fake_upstreams.py` and the backend (`backend.serve`, --workers
+processes) pointed at it, runs load scenarios through
+`test_intent_parse.run_load`, then the
+micro-benchmarks (preprocess, middleware, JSON, ranking) and the cold-start
+benchmark, and writes one JSON report. Nothing leaves the machine: Daji,
+Weidian RapidAPI and OpenRouter are all served by the fakes, with the latency
+distributions and error rates given on the command line.
+
+With ``--baseline previous.json`` every latency (``*_us``, ``*_ms``, ``p50``
+...) that got more than ``--tolerance`` slower and every throughput that
+dropped by as much is listed under ``regressions`` and the exit status is 1.
+
+Usage: python scripts/bench_suite.py [--output report.json] [--baseline old.json]
+       [--requests N] [--concurrency N] [--workers N] [--fastpath on|off|shadow]
+       [--skip-load] [--skip-micro]
+       [--daji-latency SPEC] [--daji-error-rate P] [--openrouter-latency SPEC] ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ROOT / "scripts"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(SCRIPTS))
+
+import fake_upstreams  # noqa: E402
+import test_intent_parse  # noqa: E402
+
+SCENARIOS = {
+    # name: (url_ratio, distinct products / texts)
+    "url_cold": (1.0, 100_000),
+    "url_hot": (1.0, 20),
+    "text": (0.0, 200),
+    "mixed": (0.7, 50),
+}
+
+LOWER_IS_BETTER = ("_us", "_ms", "p50", "p95", "p99", "max", "mean")
+HIGHER_IS_BETTER = ("throughput_rps", "speedup")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url}: process exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+@contextmanager
+def _process(cmd: List[str], env: Dict[str, str], ready_url: str) -> Iterator[subprocess.Popen]:
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    try:
+        _wait_ready(ready_url, proc)
+        yield proc
+    except RuntimeError:
+        proc.kill()
+        log.seek(0)
+        sys.stderr.write(log.read().decode(errors="replace"))
+        raise
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+
+def run_load_scenarios(args: argparse.Namespace) -> Dict[str, Any]:
+    fake_port, api_port = _free_port(), _free_port()
+    fake = f"http://127.0.0.1:{fake_port}"
+    fake_cmd = [sys.executable, str(SCRIPTS / "fake_upstreams.py"), "--port", str(fake_port), "--seed", str(args.seed)]
+    for name in fake_upstreams.UPSTREAMS:
+        fake_cmd += [f"--{name}-latency", getattr(args, f"{name}_latency")]
+        fake_cmd += [f"--{name}-error-rate", str(getattr(args, f"{name}_error_rate"))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DAJI_API_KEY": "bench",
+            "DAJI_API_SECRET": "bench",
+            "DAJI_API_BASE_URL": f"{fake}/",
+            "RAPIDAPI_KEY": "bench",
+            "WEIDIAN_API_BASE_URL": f"{fake}/",
+            "OPENROUTER_API_KEY": "bench",
+            "OPENAI_API_BASE": f"{fake}/v1",
+            # Reproducibility: fresh on-disk state, no rate limits, no background refresh
+            "PRODUCT_STORE_DB": str(Path(tmp) / "products.sqlite3"),
+            "QC_GALLERY_DB": str(Path(tmp) / "qc.sqlite3"),
+            "IMAGE_INDEX_PATH": str(Path(tmp) / "image_index.npz"),
+            "RATE_LIMIT_ENABLED": "0",
+            "REFRESH_ENABLED": "0",
+            "INTENT_FASTPATH_MODE": args.fastpath,
+            "WEB_CONCURRENCY": str(args.workers),
+            "HOST": "127.0.0.1",
+            "PORT": str(api_port),
+            "LOG_LEVEL": "warning",
+        }
+        api_cmd = [sys.executable, "-m", "backend.serve"]
+        api_url = f"http://127.0.0.1:{api_port}/api/v1/intent/parse"
+        fake_env = {k: v for k, v in env.items() if k != "WEB_CONCURRENCY"}  # uvicorn reads it too
+        with _process(fake_cmd, fake_env, f"{fake}/_stats"), _process(api_cmd, env, f"http://127.0.0.1:{api_port}/healthz"):
+            scenarios = {}
+            for name, (url_ratio, distinct) in SCENARIOS.items():
+                scenarios[name] = asyncio.run(
+                    test_intent_parse.run_load(
+                        api_url, args.concurrency, args.requests, None, url_ratio, distinct, args.seed
+                    )
+                )
+            upstream_calls = httpx.get(f"{fake}/_stats").json()
+    return {"scenarios": scenarios, "upstream_calls": upstream_calls}
+
+
+def run_micro(args: argparse.Namespace) -> Dict[str, Any]:
+    import bench_json
+    import bench_middleware
+    import bench_preprocess
+    import bench_ranking
+    import bench_startup
+
+    repeat = args.micro_repeat
+    return {
+        "preprocess": bench_preprocess.run([1, 8, 50], repeat),
+        "middleware": asyncio.run(bench_middleware.run(repeat * 5, 8)),
+        "json": bench_json.run([10, 100], 20, repeat),
+        "ranking": bench_ranking.run([50, 500], 20, repeat),
+        "startup": bench_startup.run(3),
+    }
+
+############################################################
+# Regression check
+############################################################
+
+
+def flatten(obj: Any, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of *obj* keyed by dotted path (list items by index)."""
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = enumerate(obj)
+    else:
+        return {prefix: float(obj)} if isinstance(obj, (int, float)) and not isinstance(obj, bool) else {}
+    out: Dict[str, float] = {}
+    for key, value in items:
+        out.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return out
+
+
+def regressions(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    now, before = flatten(current), flatten(baseline)
+    found = []
+    for path, old in before.items():
+        new = now.get(path)
+        if new is None or old <= 0 or path.startswith(("meta.", "regressions.")):
+            continue
+        leaf = path.rsplit(".", 1)[-1]
+        if leaf.endswith(LOWER_IS_BETTER) and new > old * (1 + tolerance):
+            found.append({"metric": path, "baseline": old, "current": new, "change": round(new / old - 1, 3)})
+        elif leaf in HIGHER_IS_BETTER and new < old * (1 - tolerance):
+            found.append({"metric": path, "baseline": old, "current": new, "change": round(new / old - 1, 3)})
+    return found
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="Write the report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per load scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", default="1", help="Backend worker processes (WEB_CONCURRENCY)")
+    parser.add_argument("--micro-repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--fastpath", default="on", choices=("on", "off", "shadow"),
+        help="INTENT_FASTPATH_MODE for the backend; 'off' sends every text to the fake LLM",
+    )  # fmt: skip
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    for name in fake_upstreams.UPSTREAMS:
+        parser.add_argument(f"--{name}-latency", default=fake_upstreams.DEFAULT_LATENCY[name])
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {
+        "suite": "backend",
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "fastpath": args.fastpath,
+            "workers": args.workers,
+            "upstreams": {
+                name: {
+                    "latency": getattr(args, f"{name}_latency"),
+                    "error_rate": getattr(args, f"{name}_error_rate"),
+                }
+                for name in fake_upstreams.UPSTREAMS
+            },
+        },
+    }
+    if not args.skip_load:
+        report["load"] = run_load_scenarios(args)
+    if not args.skip_micro:
+        report["micro"] = run_micro(args)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            report["regressions"] = regressions(report, json.load(fh), args.tolerance)
+        failed = bool(report["regressions"])
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Build the perceptual-hash image index used by /api/v1/search/image.
+
+Reads JSON Lines with one product image per line::
+
+    {"platform": "taobao", "product_id": "123", "title": "...", "price": 9.9, "image": "https://..."}
+
+downloads each image, hashes it in the decode pool and saves the index to
+IMAGE_INDEX_PATH (or --out), appending to an existing index unless --fresh.
+Prints a JSON summary.
+
+Usage: python scripts/build_image_index.py FILE [--out PATH] [--concurrency N] [--fresh]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.services import image_search  # noqa: E402
+from backend.services.preprocessor import product_link  # noqa: E402
+from backend.services.product_model import Product  # noqa: E402
+
+
+async def _index_row(client: httpx.AsyncClient, sem: asyncio.Semaphore, row: Dict[str, Any], errors: List[str]) -> None:
+    link = product_link(row.get("platform", ""), str(row.get("product_id", "")))
+    if link is None or not row.get("image"):
+        errors.append(f"skipped: {row}")
+        return
+    async with sem:
+        try:
+            resp = await client.get(row["image"])
+            resp.raise_for_status()
+            hashes = await image_search.hash_upload(resp.content)
+        except (httpx.HTTPError, image_search.ImageDecodeError) as exc:
+            errors.append(f"{row['image']}: {exc}")
+            return
+    product = Product(
+        platform=link.platform,
+        product_id=link.product_id,
+        title=row.get("title", ""),
+        price=row.get("price"),
+        url=link.canonical_url,
+        image=row["image"],
+    )
+    image_search.index.add(product, hashes[0])
+
+
+async def run(path: Path, out: str, concurrency: int, fresh: bool) -> Dict[str, Any]:
+    if not fresh:
+        image_search.load_index(out)
+    before = len(image_search.index)
+    errors: List[str] = []
+    rows = [json.loads(line) for line in path.open(encoding="utf-8") if line.strip()]
+    sem = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=20, follow_redirects=True) as client:
+        await asyncio.gather(*(_index_row(client, sem, row, errors) for row in rows))
+    image_search.index.save(out)
+    image_search.shutdown()
+    return {
+        "index": out,
+        "added": len(image_search.index) - before,
+        "total": len(image_search.index),
+        "errors": errors[:20],
+        "error_count": len(errors),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", type=Path)
+    parser.add_argument("--out", default=image_search.IMAGE_INDEX_PATH)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--fresh", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.file, args.out, args.concurrency, args.fresh)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Local stand-ins for the upstream APIs, for benchmarks and load tests.
+
+Serves, on one port:
+
+- Daji: ``GET /taobao/traffic/item/get`` and
+  ``GET /alibaba/product/queryProductDetail``
+- Weidian RapidAPI: ``GET /weidian/detail/v5``
+- OpenRouter: ``POST /v1/chat/completions`` (single and batched intent prompts)
+
+Each upstream gets a latency distribution and an error rate; errors are
+HTTP 500 (429 for OpenRouter). Latencies and errors come from a seeded RNG
+per upstream, so a run is reproducible for a given request order.
+``GET /_stats`` returns request / error counts per upstream.
+
+Point the backend at it with::
+
+    DAJI_API_BASE_URL=http://127.0.0.1:9100/
+    WEIDIAN_API_BASE_URL=http://127.0.0.1:9100/
+    OPENAI_API_BASE=http://127.0.0.1:9100/v1
+
+Latency specs: ``fixed:S``, ``uniform:LO,HI`` or ``lognormal:MEDIAN,SIGMA``
+(seconds).
+
+Usage: python scripts/fake_upstreams.py [--port N] [--daji-latency SPEC]
+       [--daji-error-rate P] [--weidian-...] [--openrouter-...] [--skus N] [--seed N]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+UPSTREAMS = ("daji", "weidian", "openrouter")
+DEFAULT_LATENCY = {
+    "daji": "lognormal:0.25,0.5",
+    "weidian": "lognormal:0.35,0.6",
+    "openrouter": "lognormal:0.6,0.4",
+}
+
+
+@dataclass
+class Latency:
+    kind: str
+    params: List[float]
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, raw = spec.partition(":")
+        params = [float(p) for p in raw.split(",") if p]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Bad latency spec {spec!r}; use fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+@dataclass
+class Profile:
+    latency: Latency
+    error_rate: float = 0.0
+    seed: int = 0
+    requests: int = 0
+    errors: int = 0
+    rng: random.Random = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.seed)
+
+    async def respond(self) -> bool:
+        """Sleep for a sampled latency; return False when this call should fail."""
+        self.requests += 1
+        delay = self.latency.sample(self.rng)
+        failed = self.rng.random() < self.error_rate
+        await asyncio.sleep(delay)
+        self.errors += failed
+        return not failed
+
+
+def _taobao_item(item_id: str, skus: int) -> Dict[str, Any]:
+    return {
+        "code": 200,
+        "msg": "success",
+        "data": {
+            "item": {
+                "itemId": item_id,
+                "title": f"耐克 Air Zoom Pegasus 40 男子跑步鞋 {item_id}",
+                "price": "699.00",
+                "promotionPrice": "599.00",
+                "mainImageUrl": f"//img.alicdn.com/imgextra/{item_id}/main.jpg",
+                "images": [f"//img.alicdn.com/imgextra/{item_id}/{i}.jpg" for i in range(8)],
+                "shopName": "耐克官方旗舰店",
+                "soldQuantity": 10234,
+                "skuList": [
+                    {"skuId": str(9000000 + i), "price": f"{599 + i % 7}.00", "quantity": 100 + i}
+                    for i in range(skus)
+                ],
+            }
+        },
+    }
+
+
+def _1688_offer(offer_id: str, skus: int) -> Dict[str, Any]:
+    return {
+        "code": 200,
+        "data": {
+            "productInfo": {
+                "offerId": offer_id,
+                "subject": f"厂家直销 纯棉T恤 {offer_id}",
+                "price": "12.50",
+                "mainImage": f"https://cbu01.alicdn.com/img/{offer_id}.jpg",
+                "companyName": "义乌市某服饰有限公司",
+                "soldOut": 5321,
+                "skuInfos": [{"skuId": str(i), "price": "12.50"} for i in range(skus)],
+            }
+        },
+    }
+
+
+def _weidian_item(item_id: str) -> Dict[str, Any]:
+    return {
+        "result": {
+            "item": {
+                "itemId": item_id,
+                "itemName": f"卫衣纯棉连帽上衣 {item_id}",
+                "price": "199.00",
+                "itemMainPic": f"https://si.geilicdn.com/{item_id}.jpg",
+                "shopName": "微店小铺",
+                "sold": 88,
+            }
+        }
+    }
+
+
+def _completion(content: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "bench",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def _has_intent(text: str) -> bool:
+    return any(word in text for word in ("买", "代购", "buy", "order", "想要"))
+
+
+def create_app(profiles: Dict[str, Profile], skus: int = 50) -> FastAPI:
+    app = FastAPI(title="Fake upstreams")
+
+    def _error(status: int = 500) -> Response:
+        return JSONResponse({"code": status, "msg": "injected error"}, status_code=status)
+
+    @app.get("/taobao/traffic/item/get")
+    async def taobao(item_id: str = "0"):
+        if not await profiles["daji"].respond():
+            return _error()
+        return _taobao_item(item_id, skus)
+
+    @app.get("/alibaba/product/queryProductDetail")
+    async def alibaba(offerId: str = "0"):  # noqa: N803
+        if not await profiles["daji"].respond():
+            return _error()
+        return _1688_offer(offerId, skus)
+
+    @app.get("/weidian/detail/v5")
+    async def weidian(itemId: str = "0"):  # noqa: N803
+        if not await profiles["weidian"].respond():
+            return _error()
+        return _weidian_item(itemId)
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        if not await profiles["openrouter"].respond():
+            return _error(429)
+        user = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+        schema = body.get("response_format", {}).get("json_schema", {}).get("name", "")
+        if schema == "get_shopping_intents":
+            texts = json.loads(user)
+            return _completion({"results": [_has_intent(t) for t in texts]})
+        return _completion({"shopping_intent": _has_intent(user)})
+
+    @app.get("/_stats")
+    async def stats():
+        return {name: {"requests": p.requests, "errors": p.errors} for name, p in profiles.items()}
+
+    return app
+
+
+def build_profiles(latency: Dict[str, str], error_rate: Dict[str, float], seed: int) -> Dict[str, Profile]:
+    return {
+        name: Profile(Latency.parse(latency[name]), error_rate[name], seed=seed + i)
+        for i, name in enumerate(UPSTREAMS)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--skus", type=int, default=50, help="SKUs per Daji item (payload size)")
+    parser.add_argument("--seed", type=int, default=0)
+    for name in UPSTREAMS:
+        parser.add_argument(f"--{name}-latency", default=DEFAULT_LATENCY[name])
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    profiles = build_profiles(
+        {name: getattr(args, f"{name}_latency") for name in UPSTREAMS},
+        {name: getattr(args, f"{name}_error_rate") for name in UPSTREAMS},
+        args.seed,
+    )
+    uvicorn.run(create_app(profiles, args.skus), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
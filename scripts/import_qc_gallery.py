@@ -0,0 +1,66 @@
+"""Bulk-import QC galleries into the QC gallery index.
+
+Reads JSON Lines with one gallery per line::
+
+    {"platform": "taobao", "product_id": "123456", "images": ["https://...", ...]}
+
+and writes them to QC_GALLERY_DB in batches, printing a JSON summary.
+
+Usage: python scripts/import_qc_gallery.py FILE [FILE ...] [--batch N]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.services import qc_gallery  # noqa: E402
+
+
+def read_rows(path: Path, errors: List[str]) -> Iterator[Tuple[str, str, Any]]:
+    with path.open("r", encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                yield row["platform"], str(row["product_id"]), row["images"]
+            except (ValueError, KeyError, TypeError) as exc:
+                errors.append(f"{path}:{lineno}: {exc}")
+
+
+def run(paths: List[Path], batch: int) -> Dict[str, Any]:
+    errors: List[str] = []
+    written = 0
+    start = time.perf_counter()
+    for path in paths:
+        pending: List[Tuple[str, str, Any]] = []
+        for row in read_rows(path, errors):
+            pending.append(row)
+            if len(pending) >= batch:
+                written += qc_gallery.import_galleries(pending)
+                pending = []
+        written += qc_gallery.import_galleries(pending)
+    return {
+        "db": qc_gallery.store.path,
+        "written": written,
+        "total": qc_gallery.store.count(),
+        "errors": errors[:20],
+        "error_count": len(errors),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", type=Path, nargs="+")
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.files, args.batch), indent=2))
+
+
+if __name__ == "__main__":
+    main()
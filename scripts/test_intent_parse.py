@@ -1,40 +1,204 @@
-import sys
+"""Call /api/v1/intent/parse once, or load-test it.
+
+Single call (prints the JSON response):
+
+    python scripts/test_intent_parse.py <text>
+
+Load test (prints a JSON report with throughput and p50/p95/p99 latency):
+
+    python scripts/test_intent_parse.py --load [--concurrency N] [--requests N | --duration S]
+        [--url-ratio R] [--distinct N] [--seed N] [--api-url URL]
+
+Load inputs are a seeded mix of product links (Taobao / 1688 / Weidian drawn
+from *--distinct* product IDs, so repeat requests exercise the caches) and
+free-text messages for the LLM path.
+"""
+import argparse
+import asyncio
 import json
-from typing import Any, Dict
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
 
 import httpx
 
 API_URL = "http://127.0.0.1:8000/api/v1/intent/parse"
 
+_LINKS = (
+    "帮我看看这个 https://item.taobao.com/item.htm?id={id}",
+    "https://detail.1688.com/offer/{id}.html 这个多少钱",
+    "微店 https://weidian.com/item.html?itemID={id}",
+)
+_TEXTS = (
+    "我想买一双跑步鞋，预算五百左右",
+    "代购一件羽绒服",
+    "今天天气怎么样",
+    "你好，请问你们几点下班",
+    "Can you help me buy a phone case?",
+)
 
-def call_intent_parse(user_input: str) -> Dict[str, Any]:
+
+def call_intent_parse(user_input: str, api_url: str = API_URL) -> Dict[str, Any]:
     """Call the local intent/parse endpoint and return JSON response."""
     payload = {"userInput": user_input}
     headers = {"Content-Type": "application/json"}
     with httpx.Client() as client:
-        resp = client.post(API_URL, headers=headers, json=payload, timeout=30)
+        resp = client.post(api_url, headers=headers, json=payload, timeout=30)
         resp.raise_for_status()
         return resp.json()
 
+############################################################
+# Load generation
+############################################################
+
+
+def make_inputs(count: int, url_ratio: float = 0.7, distinct: int = 50, seed: int = 0) -> List[str]:
+    """*count* reproducible user inputs: links to *distinct* products and free text."""
+    rng = random.Random(seed)
+    inputs = []
+    for _ in range(count):
+        if rng.random() < url_ratio:
+            inputs.append(rng.choice(_LINKS).format(id=100000 + rng.randrange(distinct)))
+        else:
+            inputs.append(f"{rng.choice(_TEXTS)} #{rng.randrange(distinct)}")
+    return inputs
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], elapsed: float, statuses: Dict[str, int], fallbacks: int) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 2)  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+            "mean": ms(sum(latencies) / len(latencies) if latencies else None),
+        },
+        "status": statuses,
+        "fallback_products": fallbacks,
+    }
+
+
+def _count_fallbacks(body: Any) -> int:
+    data = body.get("data", body) if isinstance(body, dict) else {}
+    products = data.get("products") if isinstance(data, dict) else None
+    return sum(1 for p in products or () if isinstance(p, dict) and p.get("fallback"))
+
+
+async def run_load(
+    api_url: str = API_URL,
+    concurrency: int = 16,
+    requests: Optional[int] = 500,
+    duration: Optional[float] = None,
+    url_ratio: float = 0.7,
+    distinct: int = 50,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Closed-loop load: *concurrency* workers send requests back to back.
+
+    Stops after *requests* requests or, if *duration* is given, after that
+    many seconds.
+    """
+    inputs = make_inputs(requests or 100_000, url_ratio, distinct, seed)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    fallbacks = 0
+    next_index = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        deadline = start + duration if duration else None
+
+        async def worker() -> None:
+            nonlocal next_index, fallbacks
+            while next_index < len(inputs) and (deadline is None or time.perf_counter() < deadline):
+                text = inputs[next_index]
+                next_index += 1
+                sent = time.perf_counter()
+                try:
+                    resp = await client.post(api_url, json={"userInput": text})
+                    status = str(resp.status_code)
+                    if resp.status_code == 200:
+                        fallbacks += _count_fallbacks(resp.json())
+                except httpx.HTTPError as exc:
+                    status = type(exc).__name__
+                latencies.append(time.perf_counter() - sent)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    report = summarize(latencies, elapsed, statuses, fallbacks)
+    report.update(
+        {"concurrency": concurrency, "url_ratio": url_ratio, "distinct": distinct, "seed": seed}
+    )
+    return report
+
+############################################################
+# CLI
+############################################################
+
 
 def main() -> None:
-    if len(sys.argv) < 2:
-        print("Usage: python scripts/test_intent_parse.py <text>")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("text", nargs="*", help="Input for a single call")
+    parser.add_argument("--api-url", default=API_URL)
+    parser.add_argument("--load", action="store_true", help="Run a load test instead of a single call")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=None, help="Seconds; overrides --requests")
+    parser.add_argument("--url-ratio", type=float, default=0.7)
+    parser.add_argument("--distinct", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.load:
+        report = asyncio.run(
+            run_load(
+                args.api_url,
+                args.concurrency,
+                None if args.duration else args.requests,
+                args.duration,
+                args.url_ratio,
+                args.distinct,
+                args.seed,
+            )
+        )
+        print(json.dumps({"benchmark": "intent_parse_load", **report}, indent=2))
+        return
+
+    if not args.text:
+        print("Usage: python scripts/test_intent_parse.py <text>  (or --load)")
         sys.exit(1)
 
-    text = " ".join(sys.argv[1:])
+    text = " ".join(args.text)
     try:
-        data = call_intent_parse(text)
+        data = call_intent_parse(text, args.api_url)
         print(json.dumps(data, ensure_ascii=False, indent=2))
     except httpx.HTTPError as exc:
         print(f"Request failed: {exc}")
-        if exc.response is not None:
+        response = getattr(exc, "response", None)
+        if response is not None:
             try:
-                print("Server response:", exc.response.text)
+                print("Server response:", response.text)
             except Exception:  # noqa: BLE001
                 pass
         sys.exit(2)
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,7 +1,25 @@
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 
-from backend.main import app
+# Tests patch llm_service.client; give it a (fake) key to be built with.
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
+
+from backend.main import app  # noqa: E402
+from backend.services import (  # noqa: E402
+    admission,
+    cache,
+    http_clients,
+    llm_service,
+    product_store,
+    qc_gallery,
+    refresher,
+    resilience,
+    short_links,
+)
 
 
 @pytest_asyncio.fixture()
@@ -11,4 +29,44 @@ async def async_client():
     async with AsyncClient(transport=transport, base_url="http://testserver") as client:
         app.state.testing = True
         yield client
-        app.state.testing = False 
\ No newline at end of file
+        app.state.testing = False
+
+
+@pytest.fixture()
+def mock_client(monkeypatch):
+    """Replace the shared upstream HTTP clients with a single mock."""
+    client = MagicMock()
+    client.get = AsyncMock()
+    monkeypatch.setattr(http_clients, "get_client", lambda name: client)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def isolated_product_store(monkeypatch):
+    """Give every test an empty in-memory product store instead of the on-disk one."""
+    store = product_store.ProductStore(":memory:")
+    monkeypatch.setattr(product_store, "store", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Start every test with empty in-process caches, closed circuits and fresh limits."""
+    caches = (
+        cache.product_cache,
+        llm_service.intent_cache,
+        short_links.short_link_cache,
+        qc_gallery.gallery_cache,
+    )
+    for c in caches:
+        c.clear()
+    resilience.reset_guards()
+    admission.reset()
+    refresher.tracker.clear()
+    yield
+    for c in caches:
+        c.clear()
+    resilience.reset_guards()
+    admission.reset()
+    refresher.tracker.clear()
@@ -0,0 +1,119 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from backend.main import app
+from backend.services import admission, resilience
+from backend.services.admission import (
+    ClientRateLimiter,
+    LoadShedder,
+    OverloadedError,
+    QuotaExceededError,
+    RateLimitedError,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_client_limiter_refills_per_key():
+    clock = FakeClock()
+    limiter = ClientRateLimiter(rate=1, burst=2, clock=clock)
+
+    limiter.check("ip:a")
+    limiter.check("ip:a")
+    with pytest.raises(RateLimitedError) as info:
+        limiter.check("ip:a")
+    assert info.value.retry_after == pytest.approx(1.0)
+    limiter.check("ip:b")  # other clients are unaffected
+
+    clock.now = 1.0
+    limiter.check("ip:a")
+
+
+@pytest.mark.asyncio
+async def test_upstream_budget_is_shared_per_provider():
+    """daji_taobao and daji_1688 spend the same quota; the upstream isn't called."""
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return "ok"
+
+    admission.set_upstream_budget("daji", TokenBucket(rate=0.01, burst=1))
+
+    assert await resilience.get_guard("daji_taobao").call(fetch) == "ok"
+    with pytest.raises(QuotaExceededError) as info:
+        await resilience.get_guard("daji_1688").call(fetch)
+
+    assert len(calls) == 1
+    assert resilience.fallback_reason(info.value) == "quota_exceeded"
+    assert resilience.get_guard("daji_1688").breaker.failures == 0
+
+
+def test_upstream_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.setenv("UPSTREAM_BUDGET_RPS_DAJI", "8")
+    monkeypatch.setenv("UPSTREAM_BUDGET_BURST_DAJI", "20")
+    monkeypatch.setattr(admission, "settings", replace(admission.settings, workers=4))
+
+    bucket = admission._budget_from_env("daji")
+
+    assert (bucket.rate, bucket.burst) == (2.0, 5.0)
+
+
+@pytest.mark.asyncio
+async def test_shedder_queues_then_sheds_past_latency_target():
+    shedder = LoadShedder(max_inflight=1, latency_target=0.05)
+    await shedder.acquire()
+
+    waiter = asyncio.ensure_future(shedder.acquire())
+    await asyncio.sleep(0)
+    shedder.release(0.01)
+    await waiter  # slot handed over in FIFO order
+    assert shedder.inflight == 1
+
+    with pytest.raises(OverloadedError):
+        await shedder.acquire()  # nobody releases within the target
+
+    shedder.release(1.0)  # slow requests: expected wait now exceeds the target
+    await shedder.acquire()
+    with pytest.raises(OverloadedError):
+        await asyncio.wait_for(shedder.acquire(), timeout=0.01)  # rejected without waiting
+    assert shedder.shed == 2
+
+
+@pytest.mark.asyncio
+async def test_parse_rejects_with_retry_after(monkeypatch, async_client):
+    monkeypatch.setattr(admission, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(admission, "client_limiter", ClientRateLimiter(rate=0.5, burst=1))
+    app.state.testing = False  # exercise the envelope too
+    payload = {"userInput": "https://item.taobao.com/item.htm?id=1"}
+
+    assert (await async_client.post("/api/v1/intent/parse", json=payload)).status_code == 200
+    resp = await async_client.post("/api/v1/intent/parse", json=payload)
+
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "2"
+    assert resp.json()["status"] == "error"
+    assert (await async_client.get("/healthz")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_parse_llm_quota_is_429(monkeypatch, async_client):
+    async def spent(text):
+        raise QuotaExceededError("openrouter quota exceeded", 7.2)
+
+    monkeypatch.setattr("backend.services.llm_service.get_shopping_intent", spent)
+    monkeypatch.setattr("backend.services.intent_classifier.INTENT_FASTPATH_MODE", "off")
+
+    resp = await async_client.post("/api/v1/intent/parse", json={"userInput": "hello"})
+
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "8"
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from backend.services.cache import AsyncCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    """Entries are served until their TTL elapses."""
+    clock = FakeClock()
+    c = TTLCache(maxsize=10, ttl=5, clock=clock)
+    c.set("a", 1)
+    assert c.get("a") == 1
+    clock.now = 5
+    assert c.get("a") is None
+    assert c.stats() == {"size": 0, "hits": 1, "misses": 1}
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """The least recently used entry goes first when the cache is full."""
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert "a" in c and "c" in c
+    assert "b" not in c
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_coalesces_concurrent_misses():
+    """Concurrent misses for one key trigger a single loader call."""
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    c = AsyncCache(maxsize=10, ttl=60)
+    results = await asyncio.gather(*(c.get_or_load("k", loader) for _ in range(5)))
+
+    assert results == ["value"] * 5
+    assert calls == 1
+    assert await c.get_or_load("k", loader) == "value"
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_serves_stale_and_refreshes():
+    """Within the stale window the old value is returned and refreshed in the background."""
+    clock = FakeClock()
+    c = AsyncCache(maxsize=10, ttl=5, stale_ttl=60, clock=clock)
+    values = iter(["v1", "v2"])
+
+    async def loader():
+        return next(values)
+
+    assert await c.get_or_load("k", loader) == "v1"
+    clock.now = 10
+    assert await c.get_or_load("k", loader) == "v1"
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert await c.get_or_load("k", loader) == "v2"
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_does_not_cache_failures():
+    """A failing loader propagates its error and leaves nothing cached."""
+    c = AsyncCache(maxsize=10, ttl=60)
+
+    async def boom():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        await c.get_or_load("k", boom)
+    assert "k" not in c
@@ -1,5 +1,3 @@
-from unittest.mock import AsyncMock, patch
-
 import pytest
 from httpx import HTTPStatusError, Request, Response
 
@@ -7,14 +5,15 @@ from backend.services import daji_service
 
 
 @pytest.mark.asyncio
-@patch("backend.services.daji_service.httpx.AsyncClient")
-async def test_fetch_product_detail_success(MockAsyncClient, monkeypatch):
+async def test_fetch_product_detail_success(mock_client, monkeypatch):
     """Test successful fetch from real API with credentials."""
     # Mock the successful API response
-    mock_api_response = {"data": {"item": {"title": "Real Taobao Item"}}}
+    mock_api_response = {
+        "data": {"item": {"title": "Real Taobao Item", "price": "88.50", "skuList": [{}] * 50}}
+    }
     mock_response = Response(200, json=mock_api_response)
     mock_response.request = Request("GET", "https://anyurl.com")  # Attach dummy request
-    instance = MockAsyncClient.return_value.__aenter__.return_value
+    instance = mock_client
     instance.get.return_value = mock_response
 
     # Patch credentials
@@ -24,7 +23,9 @@ async def test_fetch_product_detail_success(MockAsyncClient, monkeypatch):
     url = "https://item.taobao.com/item.htm?id=12345"
     result = await daji_service.fetch_product_detail(url)
 
-    assert result["data"]["item"]["title"] == "Real Taobao Item"
+    assert result.title == "Real Taobao Item"
+    assert result.price == 88.5
+    assert result.url == "https://item.taobao.com/item.htm?id=12345"
     instance.get.assert_called_once()
 
 
@@ -37,16 +38,15 @@ async def test_fetch_product_detail_no_credentials(monkeypatch):
     url = "https://item.taobao.com/item.htm?id=12345"
     result = await daji_service.fetch_product_detail(url)
 
-    assert result["platform"] == "taobao"
-    assert "耐克" in result["title"]  # Check for default fake product
+    assert result.platform == "taobao"
+    assert "耐克" in result.title  # Check for default fake product
 
 
 @pytest.mark.asyncio
-@patch("backend.services.daji_service.httpx.AsyncClient")
-async def test_fetch_product_detail_api_failure(MockAsyncClient, monkeypatch):
+async def test_fetch_product_detail_api_failure(mock_client, monkeypatch):
     """Test fallback to fake data on API error (e.g., 500)."""
     # Mock a server error
-    instance = MockAsyncClient.return_value.__aenter__.return_value
+    instance = mock_client
     request = Request("GET", "https://someurl")
     instance.get.side_effect = HTTPStatusError(
         "Server Error", request=request, response=Response(500)
@@ -59,8 +59,8 @@ async def test_fetch_product_detail_api_failure(MockAsyncClient, monkeypatch):
     url = "https://detail.1688.com/offer/890123.html"
     result = await daji_service.fetch_product_detail(url)
 
-    assert result["platform"] == "1688"
-    assert "阿迪达斯" in result["title"]
+    assert result.platform == "1688"
+    assert "阿迪达斯" in result.title
 
 
 @pytest.mark.asyncio
@@ -70,5 +70,40 @@ async def test_fetch_product_detail_invalid_url():
     result = await daji_service.fetch_product_detail(url)
 
     # Should return one of the random fake products
-    assert "platform" in result
-    assert "productId" in result 
\ No newline at end of file
+    assert result.platform in ("taobao", "1688")
+    assert result.fallback_reason == "unparsed_url"
+
+@pytest.mark.asyncio
+async def test_fetch_product_detail_cached(mock_client, monkeypatch):
+    """Repeated lookups of the same product hit the upstream once."""
+    mock_response = Response(200, json={"data": {"item": {"title": "Cached Item"}}})
+    mock_response.request = Request("GET", "https://anyurl.com")
+    mock_client.get.return_value = mock_response
+
+    monkeypatch.setattr(daji_service, "DAJI_API_KEY", "fake_key")
+    monkeypatch.setattr(daji_service, "DAJI_API_SECRET", "fake_secret")
+
+    first = await daji_service.fetch_product_detail("https://item.taobao.com/item.htm?id=777")
+    second = await daji_service.fetch_product_detail("https://item.taobao.com/item.htm?spm=x&id=777")
+
+    assert first == second
+    mock_client.get.assert_called_once()
+
+
+def test_parse_image_search_keeps_rank_order():
+    raw = {
+        "code": 200,
+        "data": {
+            "items": [
+                {"itemId": 22, "title": "Second", "price": "19.9", "picUrl": "//img/22.jpg"},
+                {"title": "No id"},
+                {"num_iid": "11", "title": "Third", "price": 5},
+            ]
+        },
+    }
+
+    products = daji_service.parse_image_search(raw, "taobao")
+
+    assert [(p.product_id, p.title) for p in products] == [("22", "Second"), ("11", "Third")]
+    assert products[0].image == "https://img/22.jpg"
+    assert products[1].url == "https://item.taobao.com/item.htm?id=11"
@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from backend import fastjson
+
+
+def test_roundtrip_keeps_non_ascii_compact():
+    obj = {"title": "耐克 Air Zoom 跑鞋", "price": 699.0, "ok": True, "none": None}
+
+    body = fastjson.dumps(obj)
+
+    assert "耐克".encode("utf-8") in body and b"\\u" not in body and b", " not in body
+    assert fastjson.loads(body) == obj == json.loads(body)
+    assert fastjson.loads(body.decode("utf-8")) == obj
+
+
+def test_decode_error_is_stdlib_compatible():
+    with pytest.raises(json.JSONDecodeError):
+        fastjson.loads(b'{"title": ')
+
+
+def test_response_renders_utf8():
+    response = fastjson.FastJSONResponse({"title": "卫衣"})
+    assert response.body == '{"title":"卫衣"}'.encode("utf-8")
+    assert response.headers["content-type"] == "application/json"
@@ -0,0 +1,47 @@
+import pytest
+
+from backend.services import http_clients
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    monkeypatch.setattr(http_clients, "_upstreams", {})
+    monkeypatch.setattr(http_clients, "_clients", {})
+
+
+@pytest.mark.asyncio
+async def test_get_client_is_shared_per_upstream():
+    """Repeated lookups reuse one pooled client per upstream."""
+    http_clients.register("daji", "https://daji.example/")
+    http_clients.register("weidian", "https://weidian.example/")
+
+    daji = http_clients.get_client("daji")
+    assert http_clients.get_client("daji") is daji
+    assert http_clients.get_client("weidian") is not daji
+
+    await http_clients.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_closes_clients_and_recreates_lazily():
+    """After shutdown, clients are closed and rebuilt on next use."""
+    http_clients.register("daji", "https://daji.example/")
+    await http_clients.startup()
+    client = http_clients.get_client("daji")
+
+    await http_clients.shutdown()
+    assert client.is_closed
+
+    fresh = http_clients.get_client("daji")
+    assert fresh is not client and not fresh.is_closed
+    await http_clients.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_startup_warmup_failure_is_ignored(monkeypatch):
+    """An unreachable upstream must not prevent the app from starting."""
+    monkeypatch.setattr(http_clients, "HTTP_WARMUP_TIMEOUT", 1.0)
+    http_clients.register("dead", "http://127.0.0.1:9/", warmup=True)
+
+    await http_clients.startup()
+    await http_clients.shutdown()
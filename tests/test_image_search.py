@@ -0,0 +1,126 @@
+import io
+
+import numpy as np
+import pytest
+
+from backend.services import image_search
+from backend.services.image_search import ImageIndex, phash
+from backend.services.product_model import Product
+
+
+def _product(pid: str, platform: str = "taobao") -> Product:
+    return Product(platform, pid, f"item {pid}", 10.0, f"https://item.taobao.com/item.htm?id={pid}")
+
+
+def _pattern(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random((32, 32), dtype=np.float32) * 255
+
+
+@pytest.fixture()
+def local_index(monkeypatch):
+    index = ImageIndex(capacity=2)
+    monkeypatch.setattr(image_search, "index", index)
+    monkeypatch.setattr(image_search, "_loaded", True)
+    return index
+
+
+def test_phash_is_robust_to_small_changes():
+    img = _pattern(1)
+    noisy = img + np.random.default_rng(2).normal(0, 4, img.shape).astype(np.float32)
+    index = ImageIndex()
+    index.add(_product("1"), phash(img))
+
+    assert index.distances([phash(noisy)])[0, 0] <= 6
+    assert index.distances([phash(_pattern(3))])[0, 0] > 16
+
+
+def test_index_returns_best_image_per_product(tmp_path):
+    index = ImageIndex(capacity=2)  # grows on demand
+    index.add(_product("1"), 0b1111)
+    index.add(_product("1"), 0b0001)
+    index.add(_product("2"), 0b0011)
+    index.add(_product("3"), (1 << 64) - 1)
+
+    hits = index.search([0, 1 << 63], k=5, max_distance=8)
+    assert [(p.product_id, d) for p, d in hits] == [("1", 1), ("2", 2)]
+    assert index.search([0], k=1, max_distance=8)[0][0].product_id == "1"
+
+    index.save(str(tmp_path / "idx.npz"))
+    loaded = ImageIndex.load(str(tmp_path / "idx.npz"))
+    assert len(loaded) == 4
+    assert loaded.search([0], k=5, max_distance=8) == hits
+
+
+def test_popcount_matches_python():
+    values = np.array([0, 1, 0xFF, (1 << 64) - 1, 0x8000000000000001], dtype=np.uint64)
+    expected = [bin(int(v)).count("1") for v in values]
+    assert image_search._popcount(values).tolist() == expected
+    assert image_search._popcount_lut(values[None, :]).tolist() == [expected]
+
+
+@pytest.mark.asyncio
+async def test_search_fans_out_only_for_gaps(local_index, monkeypatch):
+    remote_calls = []
+
+    async def fake_hash(data):
+        return (0, 0)
+
+    async def fake_remote(image, platform="taobao"):
+        remote_calls.append(platform)
+        return [_product("1"), _product("9", platform)]
+
+    monkeypatch.setattr(image_search, "hash_upload", fake_hash)
+    monkeypatch.setattr("backend.services.daji_service.search_by_image", fake_remote)
+    local_index.add(_product("1"), 0b1)
+
+    hits = await image_search.search(b"img", limit=3)
+
+    assert remote_calls == ["taobao", "1688"]
+    assert [(h.product.product_id, h.source) for h in hits] == [("1", "local"), ("9", "remote"), ("9", "remote")]
+    assert hits[0].similarity == pytest.approx(1 - 1 / 64, abs=1e-4)
+
+    remote_calls.clear()
+    monkeypatch.setattr(image_search, "IMAGE_SEARCH_MIN_LOCAL", 1)
+    await image_search.search(b"img", limit=3)
+    assert remote_calls == []
+
+
+@pytest.mark.asyncio
+async def test_search_endpoint(local_index, monkeypatch, async_client):
+    async def fake_hash(data):
+        return (0b11, 0b11)
+
+    monkeypatch.setattr(image_search, "hash_upload", fake_hash)
+    monkeypatch.setattr(image_search, "IMAGE_SEARCH_MIN_LOCAL", 1)
+    local_index.add(_product("5"), 0b10)
+
+    resp = await async_client.post(
+        "/api/v1/search/image", content=b"\x89PNG...", headers={"content-type": "image/png"}
+    )
+    assert resp.status_code == 200
+    result = resp.json()["results"][0]
+    assert result["productId"] == "5" and result["similarityScore"] == pytest.approx(63 / 64, abs=1e-4)
+    assert 0 < result["finalScore"] <= 1 and 0 < result["reliabilityScore"] <= 1
+
+    unknown = await async_client.post(
+        "/api/v1/search/image?profile=nope", content=b"\x89PNG...", headers={"content-type": "image/png"}
+    )
+    assert unknown.status_code == 422
+
+    bad = await async_client.post("/api/v1/search/image", content=b"x", headers={"content-type": "text/plain"})
+    assert bad.status_code == 400
+    monkeypatch.setattr(image_search, "IMAGE_MAX_BYTES", 4)
+    big = await async_client.post("/api/v1/search/image", content=b"x" * 5, headers={"content-type": "image/png"})
+    assert big.status_code == 413
+
+
+def test_image_hashes_decodes_real_images():
+    Image = pytest.importorskip("PIL.Image")
+    buf = io.BytesIO()
+    Image.fromarray(_pattern(1).astype(np.uint8)).save(buf, format="PNG")
+
+    plain, mirrored = image_search.image_hashes(buf.getvalue())
+
+    assert plain != mirrored
+    with pytest.raises(image_search.ImageDecodeError):
+        image_search.image_hashes(b"not an image")
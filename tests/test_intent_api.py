@@ -1,4 +1,5 @@
 import asyncio
+import json
 from typing import Any, Dict
 
 import pytest
@@ -66,4 +67,189 @@ async def test_parse_url_product(monkeypatch, async_client):
     assert resp.status_code == 200
     data = resp.json()
     assert data["hasUrls"] is True
-    assert data["products"] and data["products"][0]["productId"] == "123456" 
\ No newline at end of file
+    assert data["products"] and data["products"][0]["productId"] == "123456" 
+
+@pytest.mark.asyncio
+async def test_parse_stream_emits_products_as_they_complete(monkeypatch, async_client):
+    """Streaming parse sends preprocess, one event per product, then a summary."""
+
+    async def fake_fetch(url: str):  # noqa: D401
+        await asyncio.sleep(0.05 if "id=1" in url else 0)
+        return {"platform": "taobao", "url": url}
+
+    monkeypatch.setattr(
+        "backend.services.daji_service.fetch_product_detail", fake_fetch, raising=True
+    )
+
+    payload = {
+        "userInput": "https://item.taobao.com/item.htm?id=1 https://item.taobao.com/item.htm?id=2"
+    }
+    resp = await async_client.post("/api/v1/intent/parse:stream", json=payload)
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert [e["event"] for e in events] == ["preprocess", "product", "product", "summary"]
+    assert events[0]["hasUrls"] is True and len(events[0]["urls"]) == 2
+    # The faster second link arrives first and is tagged with its input position.
+    assert [e["index"] for e in events[1:3]] == [1, 0]
+    assert events[-1]["productCount"] == 2
+
+
+@pytest.mark.asyncio
+async def test_parse_stream_sse_text_intent(monkeypatch, async_client):
+    """Text input over SSE yields an intent event."""
+
+    async def fake_get_intent(text: str) -> Dict[str, Any]:  # noqa: D401
+        return {"shopping_intent": False}
+
+    monkeypatch.setattr(
+        "backend.services.llm_service.get_shopping_intent", fake_get_intent, raising=True
+    )
+    monkeypatch.setattr("backend.services.intent_classifier.INTENT_FASTPATH_MODE", "off")
+
+    resp = await async_client.post(
+        "/api/v1/intent/parse:stream",
+        json={"userInput": "随便聊聊"},
+        headers={"Accept": "text/event-stream"},
+    )
+
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    blocks = [b for b in resp.text.split("\n\n") if b]
+    assert [b.splitlines()[0] for b in blocks] == ["event: preprocess", "event: intent", "event: summary"]
+    intent = json.loads(blocks[1].splitlines()[1][len("data: "):])
+    assert intent["shopping_intent"] is False
+
+
+@pytest.mark.asyncio
+async def test_parse_batch_shares_lookups_and_keeps_order(monkeypatch, async_client):
+    """Batch results follow item order; shared links and texts are resolved once."""
+    fetched = []
+    classified = []
+
+    async def fake_fetch(url: str):  # noqa: D401
+        fetched.append(url)
+        return {"platform": "taobao", "url": url}
+
+    async def fake_get_intent(text: str) -> Dict[str, Any]:  # noqa: D401
+        classified.append(text)
+        return {"shopping_intent": True}
+
+    monkeypatch.setattr(
+        "backend.services.daji_service.fetch_product_detail", fake_fetch, raising=True
+    )
+    monkeypatch.setattr(
+        "backend.services.llm_service.get_shopping_intent", fake_get_intent, raising=True
+    )
+    monkeypatch.setattr("backend.services.intent_classifier.INTENT_FASTPATH_MODE", "off")
+
+    shared = "https://item.taobao.com/item.htm?id=1"
+    payload = {
+        "items": [
+            {"userInput": shared},
+            {"userInput": "随便看看"},
+            {"userInput": f"{shared} https://item.taobao.com/item.htm?id=2"},
+            {"userInput": "随便看看！"},
+        ]
+    }
+    resp = await async_client.post("/api/v1/intent/parse:batch", json=payload)
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "success"
+    results = body["data"]["results"]
+    assert [r["hasUrls"] for r in results] == [True, False, True, False]
+    assert len(results[2]["products"]) == 2 and results[2]["products"][0]["url"] == shared
+    assert len(fetched) == 2
+    assert classified == ["随便看看"]
+
+
+@pytest.mark.asyncio
+async def test_parse_batch_degrades_per_item_when_llm_quota_runs_out(monkeypatch, async_client):
+    """A spent LLM quota fails only the affected texts, not the whole batch."""
+    from backend.services.admission import QuotaExceededError
+
+    running = 0
+    peak = 0
+
+    async def fake_get_intent(text: str) -> Dict[str, Any]:  # noqa: D401
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if text.endswith(("5", "6", "7", "8", "9")):
+            raise QuotaExceededError("openrouter quota exceeded", 2.5)
+        return {"shopping_intent": True}
+
+    async def fake_fetch(url: str):  # noqa: D401
+        return {"platform": "taobao", "url": url}
+
+    monkeypatch.setattr("backend.services.llm_service.get_shopping_intent", fake_get_intent)
+    monkeypatch.setattr("backend.services.daji_service.fetch_product_detail", fake_fetch)
+    monkeypatch.setattr("backend.services.intent_classifier.INTENT_FASTPATH_MODE", "off")
+    monkeypatch.setattr("backend.main.PARSE_BATCH_LLM_CONCURRENCY", 3)
+
+    items = [{"userInput": f"想买东西 {i}"} for i in range(10)]
+    items.append({"userInput": "https://item.taobao.com/item.htm?id=1"})
+    resp = await async_client.post("/api/v1/intent/parse:batch", json={"items": items})
+
+    assert resp.status_code == 200
+    results = resp.json()["data"]["results"]
+    assert [r["shopping_intent"] for r in results[:5]] == [True] * 5
+    assert all(r["fallback"] and r["error"]["status"] == 429 for r in results[5:10])
+    assert results[5]["error"]["retryAfter"] == 3
+    assert len(results[10]["products"]) == 1
+    assert peak <= 3
+
+
+@pytest.mark.asyncio
+async def test_parse_batch_flags_open_llm_circuit_per_item(monkeypatch, async_client):
+    """Texts that hit an open "openrouter" circuit get a 503 error entry."""
+    from backend.services import resilience
+
+    breaker = resilience.get_guard("openrouter").breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    monkeypatch.setattr("backend.services.intent_classifier.INTENT_FASTPATH_MODE", "off")
+
+    items = [{"userInput": "想买东西"}, {"userInput": "hello"}]
+    resp = await async_client.post("/api/v1/intent/parse:batch", json={"items": items})
+
+    assert resp.status_code == 200
+    results = resp.json()["data"]["results"]
+    assert all(r["fallback"] and r["error"]["status"] == 503 for r in results)
+    assert "retryAfter" not in results[0]["error"]
+
+
+@pytest.mark.asyncio
+async def test_parse_batch_rejects_oversized_batch(monkeypatch, async_client):
+    monkeypatch.setattr("backend.main.PARSE_BATCH_MAX_ITEMS", 2)
+    payload = {"items": [{"userInput": "a"}] * 3}
+    resp = await async_client.post("/api/v1/intent/parse:batch", json=payload)
+    assert resp.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_parse_fields_projection(monkeypatch, async_client):
+    """Products carry the contract fields; ``fields=`` opts into extras."""
+    from backend.services.product_model import Product
+
+    async def fake_fetch(url: str):  # noqa: D401
+        return Product("taobao", "1", "Item", 9.9, url, image="https://img/1.jpg", sales=12)
+
+    monkeypatch.setattr(
+        "backend.services.daji_service.fetch_product_detail", fake_fetch, raising=True
+    )
+    payload = {"items": [{"userInput": "https://item.taobao.com/item.htm?id=1"}]}
+
+    resp = await async_client.post("/api/v1/intent/parse:batch", json=payload)
+    product = resp.json()["data"]["results"][0]["products"][0]
+    assert set(product) == {"platform", "productId", "title", "price", "url"}
+
+    resp = await async_client.post("/api/v1/intent/parse:batch?fields=image,sales", json=payload)
+    product = resp.json()["data"]["results"][0]["products"][0]
+    assert product["image"] == "https://img/1.jpg" and product["sales"] == 12
+
+    resp = await async_client.post("/api/v1/intent/parse:batch?fields=skuList", json=payload)
+    assert resp.status_code == 422
@@ -0,0 +1,131 @@
+from typing import Any, Dict
+
+import pytest
+
+from backend.services import intent_classifier
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    intent_classifier.reset_stats()
+    yield
+    intent_classifier.reset_stats()
+
+
+def _fake_llm(answer: bool, calls: list):
+    async def fake_get_intent(text: str) -> Dict[str, Any]:
+        calls.append(text)
+        return {"shopping_intent": answer}
+
+    return fake_get_intent
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("代购", True),
+        ("buy", True),
+        ("这双鞋多少钱？", True),
+        ("I want to buy new shoes", True),
+        ("hello", False),
+        ("今天天气怎么样", False),
+    ],
+)
+def test_classify_obvious_inputs(text, expected):
+    """Obvious inputs are decided locally with high confidence."""
+    decision, _ = intent_classifier.classify(text)
+    assert decision is expected
+
+
+def test_classify_defers_ambiguous_input():
+    """Inputs without clear signal are left to the LLM."""
+    decision, prob = intent_classifier.classify("nike shoes")
+    assert decision is None
+    assert 0.0 < prob < 1.0
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["我不要买东西，只是聊天", "我不想买", "I do not want to buy anything", "I don't want to buy shoes"],
+)
+def test_classify_defers_negated_input(text):
+    """Negations flip the meaning without changing the n-grams much; the LLM decides."""
+    decision, _ = intent_classifier.classify(text)
+    assert decision is None
+
+
+@pytest.mark.asyncio
+async def test_default_mode_asks_llm(monkeypatch):
+    """Out of the box the fast path only shadows the LLM."""
+    calls = []
+    monkeypatch.setattr("backend.services.llm_service.get_shopping_intent", _fake_llm(False, calls))
+
+    result = await intent_classifier.detect_shopping_intent("how much do you love me")
+
+    assert intent_classifier.INTENT_FASTPATH_MODE == "shadow"
+    assert result == {"shopping_intent": False}
+    assert calls == ["how much do you love me"]
+
+
+@pytest.mark.asyncio
+async def test_detect_shopping_intent_short_circuits_llm(monkeypatch):
+    """Confident local decisions don't call the LLM."""
+    calls = []
+    monkeypatch.setattr(intent_classifier, "INTENT_FASTPATH_MODE", "on")
+    monkeypatch.setattr("backend.services.llm_service.get_shopping_intent", _fake_llm(False, calls))
+
+    result = await intent_classifier.detect_shopping_intent("多少钱")
+
+    assert result["shopping_intent"] is True
+    assert result["source"] == "local"
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_shadow_mode_reports_agreement_and_logs(monkeypatch, tmp_path):
+    """Shadow mode returns the LLM answer and records it as training data."""
+    calls = []
+    log = tmp_path / "intent.jsonl"
+    monkeypatch.setattr("backend.services.llm_service.get_shopping_intent", _fake_llm(True, calls))
+    monkeypatch.setattr(intent_classifier, "INTENT_FASTPATH_MODE", "shadow")
+    monkeypatch.setattr(intent_classifier, "INTENT_TRAINING_FILE", str(log))
+
+    assert (await intent_classifier.detect_shopping_intent("buy"))["shopping_intent"] is True
+    assert (await intent_classifier.detect_shopping_intent("hello"))["shopping_intent"] is True
+
+    stats = intent_classifier.shadow_stats()
+    assert calls == ["buy", "hello"]
+    assert stats["compared"] == 2 and stats["agreed"] == 1
+    assert stats["agreement_rate"] == 0.5
+    assert len(log.read_text(encoding="utf-8").splitlines()) == 2
+    assert ("hello", True) in intent_classifier._load_training_file()
+
+
+@pytest.mark.asyncio
+async def test_repeated_texts_are_recorded_once(monkeypatch, tmp_path):
+    """Intent-cache hits are neither logged as training data nor compared again."""
+    calls = []
+    log = tmp_path / "intent.jsonl"
+
+    async def fake_complete(text: str) -> Dict[str, Any]:
+        calls.append(text)
+        return {"shopping_intent": True}
+
+    monkeypatch.setattr("backend.services.llm_service._complete_single", fake_complete)
+    monkeypatch.setattr(intent_classifier, "INTENT_TRAINING_FILE", str(log))
+
+    for _ in range(3):
+        assert (await intent_classifier.detect_shopping_intent("buy"))["shopping_intent"] is True
+
+    assert calls == ["buy"]
+    assert intent_classifier.shadow_stats()["compared"] == 1
+    assert len(log.read_text(encoding="utf-8").splitlines()) == 1
+
+
+def test_long_input_is_deferred_without_featurizing(monkeypatch):
+    """Oversized inputs skip the n-gram hashing that would block the event loop."""
+    monkeypatch.setattr(intent_classifier, "featurize", None)  # would fail if called
+
+    decision, prob = intent_classifier.classify("我想买" * 10_000)
+
+    assert (decision, prob) == (None, 0.5)
@@ -1,8 +1,14 @@
+import asyncio
 import json
+import os
+import subprocess
+import sys
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
-from backend.services.llm_service import get_shopping_intent
+from backend.services import llm_service, product_store
+from backend.services.llm_service import get_shopping_intent, intent_cache, normalize_text
 
 
 @pytest.mark.asyncio
@@ -55,4 +61,125 @@ async def test_get_shopping_intent_empty_input():
     """Test that empty input is handled correctly without calling the API."""
     result = await get_shopping_intent(" ")
     assert result["shopping_intent"] is False
-    assert "Input text is empty" in result["reason"] 
\ No newline at end of file
+    assert "Input text is empty" in result["reason"] 
+
+def test_normalize_text_folds_trivial_differences():
+    """Width, case, punctuation and spacing variations share one key."""
+    assert normalize_text("  想买  鞋！") == normalize_text("想买 鞋")
+    assert normalize_text("ＢＵＹ shoes?") == normalize_text("buy   SHOES")
+    assert normalize_text("???") == "???"
+
+
+@pytest.mark.asyncio
+async def test_get_shopping_intent_cached(monkeypatch):
+    """Equivalent inputs are answered from the cache after the first call."""
+    mock_choice = MagicMock()
+    mock_choice.message.content = json.dumps({"shopping_intent": True})
+    mock_completion = MagicMock()
+    mock_completion.choices = [mock_choice]
+    mock_create = AsyncMock(return_value=mock_completion)
+    monkeypatch.setattr("backend.services.llm_service.client.chat.completions.create", mock_create)
+
+    assert await get_shopping_intent("I want to buy shoes") == {"shopping_intent": True}
+    assert await get_shopping_intent("  i want to BUY shoes!! ") == {"shopping_intent": True, "cached": True}
+
+    mock_create.assert_called_once()
+    assert intent_cache.hits == 1 and intent_cache.misses == 1
+
+
+def _completion(content: str) -> MagicMock:
+    choice = MagicMock()
+    choice.message.content = content
+    completion = MagicMock()
+    completion.choices = [choice]
+    return completion
+
+
+@pytest.mark.asyncio
+async def test_get_shopping_intent_batches_concurrent_calls(monkeypatch):
+    """Concurrent misses are classified in a single batched completion."""
+    mock_create = AsyncMock(return_value=_completion(json.dumps({"results": [True, False, True]})))
+    monkeypatch.setattr("backend.services.llm_service.client.chat.completions.create", mock_create)
+    monkeypatch.setattr(llm_service, "LLM_BATCH_ENABLED", True)
+    monkeypatch.setattr(llm_service, "_batcher", llm_service.IntentBatcher(max_size=3, max_wait=1.0))
+
+    results = await asyncio.gather(
+        get_shopping_intent("buy shoes"),
+        get_shopping_intent("hello"),
+        get_shopping_intent("price of this"),
+    )
+
+    assert [r["shopping_intent"] for r in results] == [True, False, True]
+    mock_create.assert_called_once()
+    sent = mock_create.call_args.kwargs["messages"][1]["content"]
+    assert json.loads(sent) == ["buy shoes", "hello", "price of this"]
+
+
+@pytest.mark.asyncio
+async def test_batcher_falls_back_to_single_calls(monkeypatch):
+    """A malformed batch answer falls back to one call per text."""
+    mock_create = AsyncMock(
+        side_effect=[
+            _completion(json.dumps({"results": [True]})),  # wrong length
+            _completion(json.dumps({"shopping_intent": True})),
+            _completion(json.dumps({"shopping_intent": False})),
+        ]
+    )
+    monkeypatch.setattr("backend.services.llm_service.client.chat.completions.create", mock_create)
+    monkeypatch.setattr(llm_service, "LLM_BATCH_ENABLED", True)
+    # Flushed by size, not by a timer that a slow first caller could miss
+    monkeypatch.setattr(llm_service, "_batcher", llm_service.IntentBatcher(max_size=2, max_wait=1.0))
+
+    results = await asyncio.gather(get_shopping_intent("a"), get_shopping_intent("b"))
+
+    assert [r["shopping_intent"] for r in results] == [True, False]
+    assert mock_create.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_missing_api_key_falls_back(monkeypatch):
+    """Without OPENROUTER_API_KEY the intent falls back instead of failing at import."""
+    monkeypatch.setattr(llm_service, "OPENROUTER_API_KEY", None)
+    monkeypatch.setattr(llm_service, "_client", None)
+
+    result = await get_shopping_intent("I want to buy shoes")
+
+    assert result["fallback"] is True
+    assert "OPENROUTER_API_KEY" in result["reason"]
+
+
+def test_openai_sdk_imported_lazily():
+    """Importing the app (no key set) does not load the openai SDK."""
+    env = {k: v for k, v in os.environ.items() if k != "OPENROUTER_API_KEY"}
+    code = "import sys, backend.main; print('openai' in sys.modules)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True,
+        cwd=Path(__file__).resolve().parent.parent,
+    )  # fmt: skip
+    assert out.stdout.strip() == "False"
+
+
+def test_numpy_backed_services_imported_lazily():
+    """Importing the app does not load numpy (intent classifier, image search, ranking)."""
+    code = "import sys, backend.main; print('numpy' in sys.modules)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        cwd=Path(__file__).resolve().parent.parent,
+    )  # fmt: skip
+    assert out.stdout.strip() == "False"
+
+
+@pytest.mark.asyncio
+async def test_intent_answers_are_shared_between_workers(monkeypatch, isolated_product_store):
+    """An answer stored by another worker process is used without calling the LLM."""
+    monkeypatch.setattr(product_store, "PRODUCT_STORE_SHARE_INTENTS", True)
+    mock_create = AsyncMock(return_value=_completion(json.dumps({"shopping_intent": False})))
+    monkeypatch.setattr("backend.services.llm_service.client.chat.completions.create", mock_create)
+    isolated_product_store.put_intent(normalize_text("Buy shoes"), {"shopping_intent": True}, ttl=60)
+
+    assert await get_shopping_intent("buy shoes!") == {"shopping_intent": True, "cached": True}
+    mock_create.assert_not_called()
+
+    # ...and answers from this worker are stored for the others.
+    await get_shopping_intent("hello there")
+    assert isolated_product_store.get_intent("hello there") == {"shopping_intent": False}
@@ -0,0 +1,100 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from backend import metrics
+from backend.main import app
+from backend.services import daji_service, resilience
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+    metrics.REGISTRY.remove(h)
+    h.observe(0.05, "a")
+    h.observe(0.5, "a")
+    h.observe(5.0, "a")
+
+    text = metrics.render([h])
+
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 't_seconds_sum{stage="a"} 5.55' in text
+    assert 't_seconds_count{stage="a"} 3' in text
+    assert "# TYPE t_seconds histogram" in text
+
+
+def test_series_are_capped(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_MAX_SERIES", 2)
+    c = metrics.Counter("t_events", "Test.", ("path",))
+    metrics.REGISTRY.remove(c)
+    for path in ("/a", "/b", "/c", "/d"):
+        c.inc(path)
+
+    assert c.value("/a") == 1 and c.value("other") == 2
+    assert 't_events_total{path="other"} 2' in metrics.render([c])
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    h = metrics.Histogram("t_off", "Test.")
+    metrics.REGISTRY.remove(h)
+    with h.time():
+        pass
+    assert h.count() == 0
+
+
+def test_observe_cost_is_small():
+    # Bounded overhead: a timed observation must stay far below a request's cost.
+    assert metrics.measure_observe_cost(2000) < 50e-6
+
+
+@pytest.mark.asyncio
+async def test_parse_records_stages_and_fetch_outcomes(async_client, monkeypatch):
+    monkeypatch.setattr(daji_service, "DAJI_API_KEY", None)
+    before = metrics.PRODUCT_FETCH_SECONDS.count("taobao", "fallback")
+    route = metrics.HTTP_REQUEST_SECONDS.count("/api/v1/intent/parse", "POST", "200")
+
+    resp = await async_client.post(
+        "/api/v1/intent/parse", json={"userInput": "https://item.taobao.com/item.htm?id=1"}
+    )
+
+    assert resp.status_code == 200
+    assert metrics.PRODUCT_FETCH_SECONDS.count("taobao", "fallback") == before + 1
+    assert metrics.HTTP_REQUEST_SECONDS.count("/api/v1/intent/parse", "POST", "200") == route + 1
+    assert metrics.STAGE_SECONDS.count("preprocess", "ok") >= 1
+
+
+@pytest.mark.asyncio
+async def test_guard_records_upstream_outcomes():
+    async def ok():
+        return 1
+
+    async def boom():
+        raise RuntimeError("down")
+
+    guard = resilience.get_guard("metrics_test")
+    before_ok = metrics.UPSTREAM_SECONDS.count("metrics_test", "ok")
+    before_err = metrics.UPSTREAM_SECONDS.count("metrics_test", "error")
+    await guard.call(ok)
+    with pytest.raises(RuntimeError):
+        await guard.call(boom)
+
+    assert metrics.UPSTREAM_SECONDS.count("metrics_test", "ok") == before_ok + 1
+    assert metrics.UPSTREAM_SECONDS.count("metrics_test", "error") == before_err + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_is_plain_prometheus_text():
+    # Without the testing flag, so the envelope middleware is active.
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        await client.get("/healthz")
+        resp = await client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = resp.text
+    assert body.startswith("# HELP")
+    assert 'shopping_http_request_seconds_count{route="/healthz",method="GET",status="200"}' in body
+    assert "shopping_metrics_observe_seconds " in body
+    assert 'shopping_middleware_seconds_count{middleware="envelope"}' in body
+    assert 'shopping_cache_entries{cache="product"}' in body
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from httpx import ASGITransport, AsyncClient
+
+from backend.middleware import StandardJSONResponseMiddleware, build_envelope
+
+demo = FastAPI()
+demo.add_middleware(StandardJSONResponseMiddleware)
+
+
+@demo.get("/json")
+async def json_route():
+    return {"title": "耐克跑鞋", "price": 699.0}
+
+
+@demo.get("/text")
+async def text_route():
+    return PlainTextResponse('say "hi"')
+
+
+@demo.get("/missing")
+async def missing_route():
+    return Response(status_code=404, content=b'{"detail":"nope"}', media_type="application/json")
+
+
+@demo.get("/empty")
+async def empty_route():
+    return Response(status_code=204)
+
+
+@demo.get("/stream")
+async def stream_route():
+    async def gen():
+        yield b'{"n":1}\n'
+        yield b'{"n":2}\n'
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+
+@pytest_asyncio.fixture()
+async def client():
+    transport = ASGITransport(app=demo)
+    async with AsyncClient(transport=transport, base_url="http://testserver") as c:
+        yield c
+
+
+def test_build_envelope_splices_json_verbatim():
+    """JSON bodies are embedded without a decode/re-encode round-trip."""
+    body = '{"a":"淘宝"}'.encode()
+    assert build_envelope(200, body, b"application/json") == b'{"status":"success","data":' + body + b"}"
+    assert build_envelope(500, b"", b"application/json") == b'{"status":"error","data":null}'
+
+
+@pytest.mark.asyncio
+async def test_json_response_is_enveloped(client):
+    resp = await client.get("/json")
+    assert resp.status_code == 200
+    assert resp.headers["content-length"] == str(len(resp.content))
+    assert resp.json() == {"status": "success", "data": {"title": "耐克跑鞋", "price": 699.0}}
+
+
+@pytest.mark.asyncio
+async def test_non_json_and_error_responses(client):
+    text = await client.get("/text")
+    assert text.json() == {"status": "success", "data": 'say "hi"'}
+
+    missing = await client.get("/missing")
+    assert missing.status_code == 404
+    assert missing.json() == {"status": "error", "data": {"detail": "nope"}}
+
+    empty = await client.get("/empty")
+    assert empty.status_code == 204 and empty.content == b""
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_passes_through(client):
+    resp = await client.get("/stream")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert lines == [{"n": 1}, {"n": 2}]
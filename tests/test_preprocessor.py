@@ -1,5 +1,6 @@
 import pytest
-from backend.services.preprocessor import preprocess_input
+from backend.services import preprocessor
+from backend.services.preprocessor import parse_product_url, preprocess_input
 
 
 @pytest.mark.parametrize(
@@ -59,4 +60,58 @@ def test_preprocess_input_extracts_multiple_platforms():
     assert "weidian" in result["platform_map"]
     assert len(result["platform_map"]["taobao"]) == 1
     assert len(result["platform_map"]["1688"]) == 1
-    assert len(result["platform_map"]["weidian"]) == 1 
\ No newline at end of file
+    assert len(result["platform_map"]["weidian"]) == 1 
+
+def test_scan_strips_trailing_punctuation_and_canonicalizes():
+    """Links glued to Chinese punctuation/text are cut cleanly and canonicalized."""
+    text = (
+        "这个https://item.taobao.com/item.htm?spm=a21n57.1&id=123&ali_trackid=x。还有"
+        "(https://detail.1688.com/offer/456.html?spm=b)，以及 "
+        "https://weidian.com/item.html?itemId=w9&wfr=c."
+    )
+    result = preprocess_input(text)
+
+    assert result["urls"][0] == "https://item.taobao.com/item.htm?spm=a21n57.1&id=123&ali_trackid=x"
+    assert [(l.platform, l.product_id) for l in result["links"]] == [
+        ("taobao", "123"),
+        ("1688", "456"),
+        ("weidian", "w9"),
+    ]
+    assert [l.canonical_url for l in result["links"]] == [
+        "https://item.taobao.com/item.htm?id=123",
+        "https://detail.1688.com/offer/456.html",
+        "https://weidian.com/item.html?itemID=w9",
+    ]
+
+
+def test_scan_deduplicates_links_by_product():
+    """The same product under different URLs yields one link."""
+    text = (
+        "https://item.taobao.com/item.htm?id=1 "
+        "https://m.taobao.com/item.htm?spm=x&id=1 "
+        "https://m.tb.cn/h.abc?sm=1&spm=y https://m.tb.cn/h.abc?sm=1"
+    )
+    result = preprocess_input(text)
+    assert len(result["urls"]) == 4
+    assert len(result["platform_map"]["taobao"]) == 4
+    assert [l.key for l in result["links"]] == [
+        ("taobao", "1"),
+        ("taobao", "https://m.tb.cn/h.abc?sm=1"),
+    ]
+
+
+def test_platform_detection_uses_host():
+    """A platform name in the query string of another site is not a match."""
+    result = preprocess_input("https://example.com/?ref=taobao.com")
+    assert result["type"] == "text"
+    assert parse_product_url("https://world.taobao.com/item/1.htm").platform == "taobao"
+    assert parse_product_url("https://detail.tmall.com/item.htm?id=7").key == ("taobao", "7")
+
+
+def test_preprocess_input_bounds_pathological_input(monkeypatch):
+    """Huge pastes are truncated and the number of product links is capped."""
+    monkeypatch.setattr(preprocessor, "PREPROCESS_MAX_LINKS", 3)
+    text = " ".join(f"https://item.taobao.com/item.htm?id={i}" for i in range(5000))
+    result = preprocess_input(text)
+    assert len(result["content"]) == preprocessor.PREPROCESS_MAX_CHARS
+    assert len(result["links"]) == 3
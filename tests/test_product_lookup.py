@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from backend.services import product_lookup
+from backend.services.preprocessor import preprocess_input
+
+
+def _fake_fetch(platform, delay=0.0, calls=None):
+    async def fetch(url: str):
+        if calls is not None:
+            calls.append(url)
+        await asyncio.sleep(delay)
+        return {"platform": platform, "url": url}
+
+    return fetch
+
+
+@pytest.mark.asyncio
+async def test_fetch_products_preserves_input_order(monkeypatch):
+    """Products come back in the order the links appear in the text."""
+    monkeypatch.setattr(
+        "backend.services.daji_service.fetch_product_detail", _fake_fetch("taobao", 0.05)
+    )
+    monkeypatch.setattr(
+        "backend.services.weidian_service.fetch_product_detail", _fake_fetch("weidian")
+    )
+
+    text = (
+        "https://item.taobao.com/item.htm?id=1 "
+        "https://weidian.com/item.html?itemID=2 "
+        "https://detail.1688.com/offer/3.html"
+    )
+    pre = preprocess_input(text)
+    products = await product_lookup.fetch_products(pre["links"])
+
+    assert [p["url"] for p in products] == pre["urls"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_products_deduplicates_by_product_id(monkeypatch):
+    """The same product linked twice is fetched once."""
+    calls = []
+    monkeypatch.setattr(
+        "backend.services.daji_service.fetch_product_detail", _fake_fetch("taobao", calls=calls)
+    )
+
+    text = (
+        "https://item.taobao.com/item.htm?id=1 "
+        "https://item.taobao.com/item.htm?spm=a.b&id=1 "
+        "https://item.taobao.com/item.htm?id=1"
+    )
+    pre = preprocess_input(text)
+    products = await product_lookup.fetch_products(pre["links"])
+
+    assert len(calls) == 1
+    assert len(products) == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_products_respects_platform_concurrency(monkeypatch):
+    """No more than the configured number of lookups run per platform."""
+    in_flight = 0
+    peak = 0
+
+    async def fetch(url: str):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"url": url}
+
+    monkeypatch.setattr("backend.services.daji_service.fetch_product_detail", fetch)
+    monkeypatch.setitem(product_lookup.PLATFORM_CONCURRENCY, "taobao", 2)
+    product_lookup._semaphores.clear()
+    product_lookup._semaphore_loop = None
+
+    pre = preprocess_input(" ".join(f"https://item.taobao.com/item.htm?id={i}" for i in range(6)))
+    products = await product_lookup.fetch_products(pre["links"])
+
+    assert len(products) == 6
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_products_drops_lookups_past_deadline(monkeypatch):
+    """Slow lookups are cancelled at the deadline; finished ones are kept."""
+    monkeypatch.setattr(
+        "backend.services.daji_service.fetch_product_detail", _fake_fetch("taobao")
+    )
+    monkeypatch.setattr(
+        "backend.services.weidian_service.fetch_product_detail", _fake_fetch("weidian", 5)
+    )
+
+    text = "https://item.taobao.com/item.htm?id=1 https://weidian.com/item.html?itemID=2"
+    pre = preprocess_input(text)
+    products = await product_lookup.fetch_products(pre["links"], deadline=0.1)
+
+    assert [p["platform"] for p in products] == ["taobao"]
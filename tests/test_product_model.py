@@ -0,0 +1,62 @@
+import pytest
+
+from backend.services.daji_service import normalize_1688
+from backend.services.preprocessor import parse_product_url
+from backend.services.product_model import Product, UnrecognisedPayloadError, parse_fields
+
+
+def test_normalize_picks_needed_fields_only():
+    link = parse_product_url("https://detail.1688.com/offer/890123.html?spm=x")
+    raw = {
+        "code": 200,
+        "data": {
+            "subjectTrans": "Sports shirt",
+            "priceInfo": {"price": "12.50-20"},
+            "productImage": {"images": ["//img/a.jpg", "//img/b.jpg"]},
+            "companyName": "Factory Ltd",
+            "description": "<p>" + "x" * 10000 + "</p>",
+            "productSkuInfos": [{"skuId": i} for i in range(200)],
+        },
+    }
+
+    product = normalize_1688(raw, link)
+
+    assert product == Product(
+        platform="1688",
+        product_id="890123",
+        title="Sports shirt",
+        price=12.5,
+        url="https://detail.1688.com/offer/890123.html",
+        image="https://img/a.jpg",
+        images=("https://img/a.jpg", "https://img/b.jpg"),
+        shop_name="Factory Ltd",
+    )
+    assert not hasattr(product, "__dict__")
+
+
+def test_normalize_rejects_unrecognised_payload():
+    link = parse_product_url("https://detail.1688.com/offer/890123.html")
+    with pytest.raises(UnrecognisedPayloadError):
+        normalize_1688({"code": 500, "message": "busy"}, link)
+
+
+def test_to_dict_projection():
+    product = Product(
+        "weidian", "w1", "Hoodie", 199.0, "https://weidian.com/item.html?itemID=w1",
+        images=("https://img/1.jpg",), fallback=True, fallback_reason="timeout",
+    )
+
+    assert product.to_dict() == {
+        "platform": "weidian",
+        "productId": "w1",
+        "title": "Hoodie",
+        "price": 199.0,
+        "url": "https://weidian.com/item.html?itemID=w1",
+        "fallback": True,
+        "fallbackReason": "timeout",
+    }
+    extra = product.to_dict(parse_fields("images, shopName"))
+    assert extra["images"] == ["https://img/1.jpg"] and "shopName" not in extra
+
+    with pytest.raises(ValueError):
+        parse_fields("image,description")
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from httpx import Request, Response
+
+from backend.services import cache, daji_service, product_store
+from backend.services.product_model import Product
+from backend.services.product_store import ProductStore
+
+
+def _product(pid: str, **kwargs) -> Product:
+    return Product("taobao", pid, f"item {pid}", 9.5, f"https://item.taobao.com/item.htm?id={pid}", **kwargs)
+
+
+def test_round_trip_and_expiry(tmp_path):
+    store = ProductStore(str(tmp_path / "p.sqlite3"), ttl=60)
+    product = _product("1", image="https://img/1.jpg", images=("https://img/1.jpg",), shop_name="s", sales=3)
+    store.put(product)
+    assert store.get("taobao", "1") == product
+    assert store.get("taobao", "2") is None
+
+    store.ttl = -1
+    store.put(_product("1"))
+    assert store.get("taobao", "1") is None
+    store.close()
+
+
+def test_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "p.sqlite3")
+    writer, reader = ProductStore(path), ProductStore(path)
+    writer.put(_product("1"))
+    assert reader.get("taobao", "1") == _product("1")
+    writer.close()
+    reader.close()
+
+
+def test_reads_tally_hits_in_memory_until_flushed(isolated_product_store):
+    store = isolated_product_store
+    store.put(_product("1"))
+    for _ in range(3):
+        store.get("taobao", "1")
+    store.get("taobao", "1", False)
+
+    def stored_hits():
+        return store._connect().execute("SELECT hits FROM product").fetchone()[0]
+
+    assert stored_hits() == 1  # reads haven't written anything
+    store.flush_hits()
+    assert stored_hits() == 4
+
+
+def test_store_ttl_defaults_to_cache_ttl():
+    """A stale cache entry's refresh must not be answered by a longer-lived stored row."""
+    assert product_store.PRODUCT_STORE_TTL == cache.PRODUCT_CACHE_TTL
+
+
+def test_default_lease_outlasts_slowest_upstream_call():
+    """Waiters don't give up and call upstream while the holder is within its timeout."""
+    env = {**os.environ, "WEB_CONCURRENCY": "4", "UPSTREAM_TIMEOUT_MAX": "20"}
+    env.pop("PRODUCT_STORE_LEASE_TTL", None)
+    code = "from backend.services import product_store as s; print(s.PRODUCT_STORE_LEASE_TTL)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True,
+        cwd=Path(__file__).resolve().parent.parent,
+    )  # fmt: skip
+    assert float(out.stdout) > 2 * 20
+
+
+def test_lease_is_exclusive_across_connections(tmp_path):
+    path = str(tmp_path / "p.sqlite3")
+    worker_a, worker_b = ProductStore(path), ProductStore(path)
+
+    assert worker_a.claim("product:taobao:1", "a", ttl=30)
+    assert not worker_b.claim("product:taobao:1", "b", ttl=30)
+    worker_b.release("product:taobao:1", "b")  # not the holder: no effect
+    assert not worker_b.claim("product:taobao:1", "b", ttl=30)
+    worker_a.release("product:taobao:1", "a")
+    assert worker_b.claim("product:taobao:1", "b", ttl=-1)  # expires at once...
+    assert worker_a.claim("product:taobao:1", "a", ttl=30)  # ...so it can be taken over
+    worker_a.close()
+    worker_b.close()
+
+
+def test_compact_drops_expired_then_coldest(isolated_product_store):
+    store = isolated_product_store
+    for pid in "abc":
+        store.put(_product(pid))
+    for _ in range(3):
+        store.get("taobao", "a")
+    store.get("taobao", "c")
+    store.ttl = -1
+    store.put(_product("expired"))
+
+    assert store.compact(max_rows=2) == 2
+    assert store.get("taobao", "b") is None and store.get("taobao", "expired") is None
+    assert store.count() == 2
+
+
+def test_warm_loads_hottest_entries(isolated_product_store):
+    store = isolated_product_store
+    for pid in "abc":
+        store.put(_product(pid))
+    store.get("taobao", "b")
+    store.get("taobao", "c")
+    store.get("taobao", "c")
+    target = cache.TTLCache(maxsize=10, ttl=600)
+
+    assert product_store.warm(target, limit=2) == 2
+    assert ("taobao", "c") in target and ("taobao", "b") in target
+    assert ("taobao", "a") not in target
+
+
+@pytest.mark.asyncio
+async def test_read_through_fetches_once_and_skips_fallbacks(isolated_product_store):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return _product("1")
+
+    assert await product_store.read_through("taobao", "1", fetch) == _product("1")
+    assert await product_store.read_through("taobao", "1", fetch) == _product("1")
+    assert len(calls) == 1
+
+    async def fallback():
+        return _product("2", fallback=True)
+
+    await product_store.read_through("taobao", "2", fallback)
+    assert isolated_product_store.get("taobao", "2") is None
+
+
+@pytest.mark.asyncio
+async def test_read_through_survives_store_errors(monkeypatch):
+    class Broken(ProductStore):
+        def get(self, *args):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(product_store, "store", Broken(":memory:"))
+
+    async def fetch():
+        return _product("1")
+
+    assert await product_store.read_through("taobao", "1", fetch) == _product("1")
+
+
+@pytest.mark.asyncio
+async def test_restart_serves_from_store_without_upstream(mock_client, monkeypatch):
+    response = Response(200, json={"data": {"item": {"title": "Stored", "price": "5"}}})
+    response.request = Request("GET", "https://x")
+    mock_client.get.return_value = response
+    monkeypatch.setattr(daji_service, "DAJI_API_KEY", "k")
+    monkeypatch.setattr(daji_service, "DAJI_API_SECRET", "s")
+    url = "https://item.taobao.com/item.htm?id=777"
+
+    await daji_service.fetch_product_detail(url)
+    cache.product_cache.clear()  # a restart loses the in-process tier
+    again = await daji_service.fetch_product_detail(url)
+
+    assert again.title == "Stored" and not again.fallback
+    assert mock_client.get.call_count == 1
+
+
+@pytest.fixture()
+def leases(monkeypatch):
+    monkeypatch.setattr(product_store, "PRODUCT_STORE_LEASE_TTL", 5.0)
+    monkeypatch.setattr(product_store, "PRODUCT_STORE_LEASE_POLL", 0.01)
+
+
+@pytest.mark.asyncio
+async def test_read_through_waits_for_fetch_in_other_worker(isolated_product_store, leases):
+    """A miss whose product another process is fetching waits for its result."""
+    isolated_product_store.claim("product:taobao:1", "other-worker", ttl=5)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return _product("1", sales=42)
+
+    waiter = asyncio.ensure_future(product_store.read_through("taobao", "1", fetch))
+    await asyncio.sleep(0.05)
+    isolated_product_store.put(_product("1"))
+    isolated_product_store.release("product:taobao:1", "other-worker")
+
+    assert await waiter == _product("1")
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_coalesce_rechecks_after_holder_stores_and_releases(isolated_product_store, leases):
+    """The holder finishing between a poll and the next claim is not a reason to fetch again."""
+    isolated_product_store.claim("key", "other-worker", ttl=5)
+    stored = []
+
+    async def lookup():
+        if stored:
+            return stored[0]
+        stored.append("theirs")  # the other worker stores and releases right after our poll
+        isolated_product_store.release("key", "other-worker")
+        return None
+
+    async def fetch():
+        return "ours"
+
+    assert await product_store.coalesce("key", lookup, fetch) == "theirs"
+
+
+@pytest.mark.asyncio
+async def test_read_through_fetches_when_other_worker_stores_nothing(isolated_product_store, leases):
+    isolated_product_store.claim("product:taobao:1", "other-worker", ttl=5)
+
+    async def fetch():
+        return _product("1", sales=42)
+
+    waiter = asyncio.ensure_future(product_store.read_through("taobao", "1", fetch))
+    await asyncio.sleep(0.05)
+    isolated_product_store.release("product:taobao:1", "other-worker")  # e.g. it got fallback data
+
+    assert (await waiter).sales == 42
+    assert isolated_product_store.claim("product:taobao:1", "next", ttl=5)  # lease released again
+
+
+def test_intents_round_trip_and_expire(isolated_product_store):
+    isolated_product_store.put_intent("buy shoes", {"shopping_intent": True}, ttl=60)
+    isolated_product_store.put_intent("old", {"shopping_intent": False}, ttl=-1)
+
+    assert isolated_product_store.get_intent("buy shoes") == {"shopping_intent": True}
+    assert isolated_product_store.get_intent("old") is None
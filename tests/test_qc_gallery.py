@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from httpx import Request, Response
+
+from backend.services import qc_gallery
+
+
+@pytest.fixture()
+def qc_store(tmp_path, monkeypatch):
+    store = qc_gallery.GalleryStore(str(tmp_path / "qc.sqlite3"))
+    monkeypatch.setattr(qc_gallery, "store", store)
+    yield store
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_import_then_serve_from_memory(qc_store, monkeypatch):
+    written = qc_gallery.import_galleries(
+        [
+            ("taobao", "1", ["//img/a.jpg", "https://img/b.jpg", "//img/a.jpg"]),
+            ("weidian", "w1", [{"url": "https://img/w.jpg"}]),
+            ("1688", "2", []),  # nothing to index
+        ]
+    )
+    assert written == 2 and qc_store.count() == 2
+
+    reads = []
+    real_get = qc_store.get
+    monkeypatch.setattr(qc_store, "get", lambda *key: reads.append(key) or real_get(*key))
+
+    first = await qc_gallery.get_gallery("taobao", "1")
+    second = await qc_gallery.get_gallery("taobao", "1")
+
+    assert first == second == ("https://img/a.jpg", "https://img/b.jpg")
+    assert reads == [("taobao", "1")]  # second lookup never left memory
+
+
+@pytest.mark.asyncio
+async def test_miss_fetches_remote_once_and_fills_store(qc_store, mock_client, monkeypatch):
+    monkeypatch.setattr(qc_gallery, "QC_SOURCE_URL", "https://qc.test/g?p={platform}&id={product_id}")
+    found = Response(200, json={"data": ["https://img/1.jpg", "https://img/2.jpg"]})
+    found.request = Request("GET", "https://qc.test/g")
+
+    async def slow_get(url):
+        await asyncio.sleep(0.01)
+        return found
+
+    mock_client.get.side_effect = slow_get
+
+    results = await asyncio.gather(*(qc_gallery.get_gallery("1688", "9") for _ in range(5)))
+
+    assert set(results) == {("https://img/1.jpg", "https://img/2.jpg")}
+    mock_client.get.assert_called_once_with("https://qc.test/g?p=1688&id=9")
+    assert qc_store.get("1688", "9") == results[0]
+
+    missing = Response(404)
+    missing.request = Request("GET", "https://qc.test/g")
+    mock_client.get.side_effect = None
+    mock_client.get.return_value = missing
+    assert await qc_gallery.get_gallery("1688", "10") == ()
+    assert qc_store.get("1688", "10") is None
+
+
+@pytest.mark.asyncio
+async def test_qc_endpoint(qc_store, async_client):
+    qc_gallery.import_galleries([("taobao", "123456", ["https://img/qc1.jpg"])])
+
+    resp = await async_client.get("/api/v1/products/qc", params={"platform": "taobao", "product_id": "123456"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["images"] == ["https://img/qc1.jpg"]
+    assert body["product"]["platform"] == "taobao"
+
+    for params in (
+        {"platform": "taobao", "product_id": "999"},
+        {"platform": "tencent", "product_id": "1"},
+        {"platform": "taobao", "product_id": "../etc"},
+    ):
+        assert (await async_client.get("/api/v1/products/qc", params=params)).status_code == 404
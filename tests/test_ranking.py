@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from backend.services import ranking
+from backend.services.product_model import Product
+from backend.services.ranking import WeightProfile
+
+
+def _product(pid: str, price=10.0, sales=None, platform="taobao", fallback=False, shop=None) -> Product:
+    return Product(
+        platform, pid, f"item {pid}", price, f"https://x/{pid}", shop_name=shop, sales=sales, fallback=fallback
+    )
+
+
+def test_price_scores_prefer_cheaper_and_neutral_for_unknown():
+    scores = ranking.price_scores(np.array([10.0, 100.0, np.nan, 0.0, 1000.0]))
+    assert scores.tolist() == pytest.approx([1.0, 0.5, 0.5, 0.5, 0.0])
+    assert ranking.price_scores(np.array([5.0, 5.0])).tolist() == [1.0, 1.0]
+
+
+def test_reliability_rewards_sales_and_zeroes_fallbacks():
+    products = [
+        _product("a", sales=10_000, shop="s"),
+        _product("b", sales=0),
+        _product("c"),
+        _product("d", sales=10_000, fallback=True),
+    ]
+    rel = ranking.score(products, [1.0] * 4, WeightProfile())["reliability"]
+    assert rel[0] > rel[2] > rel[1] and rel[0] <= 1.0
+    assert rel[3] == 0.0
+
+
+def test_rank_orders_by_profile():
+    products = [_product("similar", price=100.0), _product("cheap", price=10.0)]
+    similarity = [0.95, 0.7]
+
+    visual = ranking.rank(products, similarity, k=2, profile=ranking.get_profile("visual"))
+    cheapest = ranking.rank(products, similarity, k=2, profile=ranking.get_profile("cheapest"))
+
+    assert [r.product.product_id for r in visual] == ["similar", "cheap"]
+    assert [r.product.product_id for r in cheapest] == ["cheap", "similar"]
+    assert visual[0].similarity_score == 0.95
+
+
+def test_platform_weight_breaks_ties():
+    products = [_product("w", platform="weidian"), _product("t", platform="taobao")]
+    ranked = ranking.rank(products, [0.8, 0.8], k=2)
+    assert [r.product.product_id for r in ranked] == ["t", "w"]
+
+
+def test_top_k_matches_full_sort():
+    scores = np.random.default_rng(0).random(1000)
+    scores[[3, 7]] = 2.0  # tie keeps input order
+    assert ranking.top_k(scores, 10).tolist() == sorted(range(1000), key=lambda i: -scores[i])[:10]
+    assert ranking.top_k(scores, 0).tolist() == []
+    assert len(ranking.top_k(scores, 5000)) == 1000
+
+
+def test_unknown_profile_and_profiles_file(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        ranking.get_profile("nope")
+
+    path = tmp_path / "profiles.json"
+    path.write_text('{"custom": {"price": 1.0, "platforms": {"weidian": 1.2}}, "default": {"similarity": 0.9}}')
+    monkeypatch.setattr(ranking, "PROFILES", dict(ranking.PROFILES))
+    ranking._load_profiles(str(path))
+
+    assert ranking.get_profile("custom").price == 1.0
+    assert ranking.get_profile("custom").platforms == {"weidian": 1.2}
+    assert ranking.get_profile("default").similarity == 0.9
+    assert ranking.get_profile("default").reliability == 0.25
+
+
+def test_ranking_hundreds_of_candidates_keeps_best_k():
+    """Latency is covered by scripts/bench_ranking.py; here only the top-k result."""
+    rng = np.random.default_rng(1)
+    products = [_product(str(i), price=float(rng.uniform(1, 500)), sales=int(rng.integers(0, 5000))) for i in range(500)]
+    similarity = rng.random(500)
+
+    ranked = ranking.rank(products, similarity, k=20)
+    everything = ranking.rank(products, similarity, k=500)
+
+    assert len(ranked) == 20
+    assert ranked == everything[:20]
+    assert [r.final_score for r in ranked] == sorted((r.final_score for r in ranked), reverse=True)
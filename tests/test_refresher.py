@@ -0,0 +1,121 @@
+import pytest
+
+from backend.services import admission, product_store, refresher
+from backend.services.admission import TokenBucket
+from backend.services.cache import product_cache
+from backend.services.product_model import Product
+from backend.services.refresher import SpaceSaving
+
+
+def _product(pid: str, title: str = "item") -> Product:
+    return Product("taobao", pid, title, 1.0, f"https://item.taobao.com/item.htm?id={pid}")
+
+
+def test_space_saving_keeps_heavy_hitters():
+    counter = SpaceSaving(capacity=10)
+    for i in range(200):
+        counter.add("hot")
+        if i % 2 == 0:
+            counter.add("warm")
+        counter.add(f"cold{i}")  # a long tail of one-off keys
+
+    assert len(counter) == 10
+    assert [key for key, _ in counter.top(2)] == ["hot", "warm"]
+    assert counter.counts["hot"] >= 200
+
+
+def test_space_saving_decay_forgets_stale_keys():
+    counter = SpaceSaving(capacity=10)
+    counter.add("a", 10)
+    counter.add("b")
+    counter.decay(0.4)
+    assert counter.counts == {"a": 4.0}
+    counter.add("c")  # heap is consistent after the rebuild
+    assert set(counter.counts) == {"a", "c"}
+
+
+@pytest.fixture()
+def calls(monkeypatch):
+    calls = []
+
+    async def refresh(link):
+        calls.append(link.product_id)
+        product = _product(link.product_id, "fresh")
+        await product_store.save(product)
+        product_cache.set(link.key, product)
+        return product
+
+    monkeypatch.setattr(refresher.daji_service, "refresh_product", refresh)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_refreshes_hot_products_near_expiry(calls, isolated_product_store):
+    for _ in range(5):
+        refresher.record("taobao", "1")
+    refresher.record("taobao", "2")  # below REFRESH_MIN_HITS
+    for _ in range(3):
+        refresher.record("taobao", "3")
+    isolated_product_store.put(_product("3"))  # stored and fresh, not in process cache
+
+    stats = await refresher.refresh_once()
+
+    assert calls == ["1"]
+    assert stats == {"refreshed": 1, "reloaded": 1, "skipped": 0, "failed": 0}
+    assert product_cache.get(("taobao", "1")).title == "fresh"
+    assert product_cache.get(("taobao", "3")) == _product("3")
+
+    # Both are fresh now: a second pass has nothing to do.
+    assert (await refresher.refresh_once())["refreshed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_respects_upstream_budget(calls):
+    for _ in range(5):
+        refresher.record("taobao", "1")
+    bucket = TokenBucket(rate=0.001, burst=10)
+    bucket.tokens = 2  # 20% headroom left
+    admission.set_upstream_budget("daji", bucket)
+
+    stats = await refresher.refresh_once()
+
+    assert calls == [] and stats["skipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_failures_are_contained(monkeypatch):
+    async def boom(link):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(refresher.daji_service, "refresh_product", boom)
+    for _ in range(5):
+        refresher.record("taobao", "1")
+
+    assert (await refresher.refresh_once())["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_recorded(monkeypatch):
+    from backend.services import product_lookup
+    from backend.services.preprocessor import parse_product_url
+
+    async def fetch(url):
+        return _product("9")
+
+    monkeypatch.setattr(product_lookup.daji_service, "fetch_product_detail", fetch)
+    await product_lookup.fetch_products([parse_product_url("https://item.taobao.com/item.htm?id=9")])
+
+    assert refresher.tracker.counts == {("taobao", "9"): 1}
+
+
+@pytest.mark.asyncio
+async def test_refresh_skips_products_another_worker_is_fetching(calls, isolated_product_store, monkeypatch):
+    monkeypatch.setattr(product_store, "PRODUCT_STORE_LEASE_TTL", 5.0)
+    for _ in range(5):
+        refresher.record("taobao", "1")
+    isolated_product_store.claim("product:taobao:1", "other-worker", ttl=5)
+
+    stats = await refresher.refresh_once()
+
+    assert calls == []
+    assert stats["skipped"] == 1
@@ -0,0 +1,184 @@
+import asyncio
+
+import pytest
+from httpx import HTTPStatusError, Request, Response
+
+from backend.services import daji_service, resilience
+from backend.services.resilience import CircuitBreaker, CircuitOpenError, UpstreamGuard
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _status_error(code: int) -> HTTPStatusError:
+    request = Request("GET", "https://upstream")
+    return HTTPStatusError("error", request=request, response=Response(code, request=request))
+
+
+def test_breaker_opens_and_probes_half_open():
+    """After the threshold the circuit opens, then admits a single probe."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()  # everyone else still fails fast
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == resilience.CLOSED and breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_guard_fails_fast_when_open():
+    """An open circuit raises without calling the upstream."""
+    guard = UpstreamGuard("test", CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    calls = 0
+
+    async def boom():
+        nonlocal calls
+        calls += 1
+        raise _status_error(503)
+
+    with pytest.raises(HTTPStatusError):
+        await guard.call(boom)
+    with pytest.raises(CircuitOpenError):
+        await guard.call(boom)
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_guard_ignores_client_errors():
+    """4xx answers mean the upstream is healthy."""
+    guard = UpstreamGuard("test", CircuitBreaker(failure_threshold=1))
+
+    async def not_found():
+        raise _status_error(404)
+
+    for _ in range(3):
+        with pytest.raises(HTTPStatusError):
+            await guard.call(not_found)
+    assert guard.breaker.state == resilience.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_guard_timeout_adapts_to_observed_latency(monkeypatch):
+    """Once enough samples exist the timeout follows the latency percentile."""
+    monkeypatch.setattr(resilience, "UPSTREAM_TIMEOUT_MIN", 0.01)
+    monkeypatch.setattr(resilience, "UPSTREAM_TIMEOUT_MIN_SAMPLES", 5)
+    guard = UpstreamGuard("test")
+    assert guard.timeout() == resilience.UPSTREAM_TIMEOUT_MAX
+
+    for _ in range(5):
+        guard.latency.record(0.02)
+    assert guard.timeout() == pytest.approx(0.02 * resilience.UPSTREAM_TIMEOUT_MULTIPLIER)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await guard.call(slow)
+    assert guard.breaker.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_service_flags_fallback_when_circuit_open(mock_client, monkeypatch):
+    """A sick upstream yields flagged fallback data without waiting on it."""
+    monkeypatch.setattr(daji_service, "DAJI_API_KEY", "fake_key")
+    monkeypatch.setattr(daji_service, "DAJI_API_SECRET", "fake_secret")
+    mock_client.get.side_effect = _status_error(502)
+    guard = resilience.get_guard("daji_taobao")
+    guard.breaker.failure_threshold = 1
+
+    first = await daji_service.fetch_product_detail("https://item.taobao.com/item.htm?id=1")
+    second = await daji_service.fetch_product_detail("https://item.taobao.com/item.htm?id=2")
+
+    assert first.fallback is True and first.fallback_reason == "upstream_error"
+    assert second.fallback_reason == "circuit_open"
+    mock_client.get.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_dead_items_leave_circuit_closed(mock_client, monkeypatch):
+    """"Item not found" payloads are the item's problem, not the upstream's."""
+    monkeypatch.setattr(daji_service, "DAJI_API_KEY", "fake_key")
+    monkeypatch.setattr(daji_service, "DAJI_API_SECRET", "fake_secret")
+    request = Request("GET", "https://upstream")
+    mock_client.get.return_value = Response(200, json={"code": 4004, "msg": "item not found"}, request=request)
+    guard = resilience.get_guard("daji_taobao")
+
+    for i in range(guard.breaker.failure_threshold + 2):
+        dead = await daji_service.fetch_product_detail(f"https://item.taobao.com/item.htm?id={i}")
+        assert dead.fallback_reason == "upstream_error"
+
+    assert guard.breaker.state == resilience.CLOSED and guard.breaker.failures == 0
+    mock_client.get.return_value = Response(200, json={"data": {"title": "Live"}}, request=request)
+    live = await daji_service.fetch_product_detail("https://item.taobao.com/item.htm?id=99")
+    assert live.title == "Live" and not live.fallback
+
+
+def _warm_guard(monkeypatch, latency: float) -> UpstreamGuard:
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(resilience, "UPSTREAM_TIMEOUT_MIN_SAMPLES", 5)
+    guard = UpstreamGuard("hedge")
+    for _ in range(5):
+        guard.latency.record(latency)
+    return guard
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_takes_faster_attempt_and_cancels_loser(monkeypatch):
+    """A slow first attempt is raced by a hedge; the loser is cancelled."""
+    guard = _warm_guard(monkeypatch, 0.01)
+    resilience.hedge_budget.tokens = 1.0
+    attempts = []
+    cancelled = []
+
+    async def fetch(product_id):
+        n = len(attempts)
+        attempts.append(product_id)
+        try:
+            await asyncio.sleep(1.0 if n == 0 else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return {"attempt": n}
+
+    result = await guard.call_hedged(fetch, "42")
+    await asyncio.sleep(0)
+
+    assert result == {"attempt": 1}
+    assert attempts == ["42", "42"]
+    assert cancelled == [0]
+    assert guard.hedges == 1 and guard.hedge_wins == 1
+
+
+@pytest.mark.asyncio
+async def test_hedging_respects_budget(monkeypatch):
+    """Without budget tokens the slow attempt is simply awaited."""
+    guard = _warm_guard(monkeypatch, 0.001)
+    resilience.hedge_budget.tokens = 0.0
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    assert await guard.call_hedged(fetch) == "ok"
+    assert calls == 1 and guard.hedges == 0
+    assert resilience.hedge_budget.tokens == pytest.approx(resilience.HEDGE_BUDGET_RATIO)
@@ -0,0 +1,101 @@
+import asyncio
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from backend.services import http_clients, product_lookup, short_links
+from backend.services.preprocessor import parse_product_url, preprocess_input
+
+ITEM = "https://item.taobao.com/item.htm?spm=x&id=4242"
+
+
+def _handler(requests):
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, str(request.url)))
+        if request.url.path == "/h.redirect":
+            return httpx.Response(302, headers={"Location": ITEM})
+        if request.url.path == "/h.tmall":
+            return httpx.Response(302, headers={"Location": "https://detail.tmall.com/item.htm?id=4242"})
+        if request.url.path == "/h.page":
+            return httpx.Response(200, text=f"<script>var url = '{ITEM}';</script>")
+        if request.url.path == "/h.loop":
+            return httpx.Response(302, headers={"Location": "https://m.tb.cn/h.loop"})
+        if request.url.host in ("item.taobao.com", "detail.tmall.com"):
+            return httpx.Response(200, text="item page")
+        return httpx.Response(200, text="<html>nothing here</html>")
+
+    return handle
+
+
+@pytest_asyncio.fixture()
+async def upstream(monkeypatch):
+    requests = []
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_handler(requests)), max_redirects=3)
+    monkeypatch.setattr(http_clients, "get_client", lambda name: client)
+    yield requests
+    await client.aclose()
+
+
+def test_is_short_link():
+    assert short_links.is_short_link(parse_product_url("https://m.tb.cn/h.abc?sm=1"))
+    assert not short_links.is_short_link(parse_product_url(ITEM))
+
+
+@pytest.mark.asyncio
+async def test_resolve_follows_redirect_and_caches(upstream):
+    """Redirects are followed once; repeats are served from the cache."""
+    link = parse_product_url("https://m.tb.cn/h.redirect?sm=1")
+
+    first = await short_links.resolve(link)
+    second = await short_links.resolve(link)
+
+    assert first.product_id == "4242"
+    assert first.canonical_url == "https://item.taobao.com/item.htm?id=4242"
+    assert second == first
+    assert [m for m, _ in upstream] == ["HEAD", "HEAD"]  # short link + item page
+
+
+@pytest.mark.asyncio
+async def test_resolve_reads_item_url_from_page(upstream):
+    """Item URLs embedded in the interstitial page are picked up."""
+    resolved = await short_links.resolve(parse_product_url("https://m.tb.cn/h.page"))
+    assert resolved.product_id == "4242"
+
+
+@pytest.mark.asyncio
+async def test_resolve_accepts_tmall_items(upstream):
+    """Short links to Tmall items resolve to the Taobao product of the same ID."""
+    resolved = await short_links.resolve(parse_product_url("https://m.tb.cn/h.tmall"))
+    assert resolved.platform == "taobao"
+    assert resolved.canonical_url == "https://item.taobao.com/item.htm?id=4242"
+
+
+@pytest.mark.asyncio
+async def test_resolve_coalesces_and_handles_dead_ends(upstream):
+    """Concurrent resolutions share one request; redirect loops yield None."""
+    link = parse_product_url("https://m.tb.cn/h.redirect")
+    results = await asyncio.gather(*(short_links.resolve(link) for _ in range(5)))
+    assert len({r.product_id for r in results}) == 1
+    assert len(upstream) == 2
+
+    assert await short_links.resolve(parse_product_url("https://m.tb.cn/h.loop")) is None
+    assert await short_links.resolve(parse_product_url("https://m.tb.cn/h.none")) is None
+
+
+@pytest.mark.asyncio
+async def test_product_lookup_uses_resolved_link(upstream, monkeypatch):
+    """Short links are looked up by their real product; dead ones are dropped."""
+    seen = []
+
+    async def fake_fetch(url: str):
+        seen.append(url)
+        return {"url": url}
+
+    monkeypatch.setattr("backend.services.daji_service.fetch_product_detail", fake_fetch)
+
+    pre = preprocess_input("https://m.tb.cn/h.redirect https://m.tb.cn/h.none")
+    products = await product_lookup.fetch_products(pre["links"])
+
+    assert seen == ["https://item.taobao.com/item.htm?id=4242"]
+    assert len(products) == 1
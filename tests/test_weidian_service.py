@@ -1,5 +1,3 @@
-from unittest.mock import patch
-
 import pytest
 from httpx import HTTPStatusError, Request, Response
 
@@ -7,13 +5,12 @@ from backend.services import weidian_service
 
 
 @pytest.mark.asyncio
-@patch("backend.services.weidian_service.httpx.AsyncClient")
-async def test_fetch_product_detail_success(MockAsyncClient, monkeypatch):
+async def test_fetch_product_detail_success(mock_client, monkeypatch):
     """Test successful fetch from the Weidian API."""
     mock_api_response = {"result": {"itemName": "Real Weidian Item"}}
     mock_response = Response(200, json=mock_api_response)
     mock_response.request = Request("GET", "https://anyurl.com")
-    instance = MockAsyncClient.return_value.__aenter__.return_value
+    instance = mock_client
     instance.get.return_value = mock_response
 
     monkeypatch.setattr(weidian_service, "RAPIDAPI_KEY", "fake_key")
@@ -21,7 +18,8 @@ async def test_fetch_product_detail_success(MockAsyncClient, monkeypatch):
     url = "https://weidian.com/item.html?itemID=w123"
     result = await weidian_service.fetch_product_detail(url)
 
-    assert result["result"]["itemName"] == "Real Weidian Item"
+    assert result.title == "Real Weidian Item"
+    assert result.product_id == "w123" and not result.fallback
     instance.get.assert_called_once()
 
 
@@ -31,15 +29,15 @@ async def test_fetch_product_detail_no_credentials(monkeypatch):
     monkeypatch.setattr(weidian_service, "RAPIDAPI_KEY", None)
     url = "https://weidian.com/item.html?itemID=w123"
     result = await weidian_service.fetch_product_detail(url)
-    assert result == weidian_service._FAKE_PRODUCT
+    assert result.product_id == weidian_service._FAKE_PRODUCT.product_id
+    assert result.fallback is True
 
 
 @pytest.mark.asyncio
-@patch("backend.services.weidian_service.httpx.AsyncClient")
-async def test_fetch_product_detail_api_failure(MockAsyncClient, monkeypatch):
+async def test_fetch_product_detail_api_failure(mock_client, monkeypatch):
     """Test fallback to fake data on API error."""
     request = Request("GET", "https://anyurl.com")
-    instance = MockAsyncClient.return_value.__aenter__.return_value
+    instance = mock_client
     instance.get.side_effect = HTTPStatusError(
         "Server Error", request=request, response=Response(500)
     )
@@ -47,11 +45,13 @@ async def test_fetch_product_detail_api_failure(MockAsyncClient, monkeypatch):
     monkeypatch.setattr(weidian_service, "RAPIDAPI_KEY", "fake_key")
     url = "https://weidian.com/item.html?itemID=w123"
     result = await weidian_service.fetch_product_detail(url)
-    assert result == weidian_service._FAKE_PRODUCT
+    assert result.product_id == weidian_service._FAKE_PRODUCT.product_id
+    assert result.fallback is True
 
 @pytest.mark.asyncio
 async def test_fetch_product_detail_invalid_url():
     """Test fallback for a URL where the product ID cannot be parsed."""
     url = "https://weidian.com/not-a-product-page/"
     result = await weidian_service.fetch_product_detail(url)
-    assert result == weidian_service._FAKE_PRODUCT 
\ No newline at end of file
+    assert result.product_id == weidian_service._FAKE_PRODUCT.product_id
+    assert result.fallback_reason == "unparsed_url"